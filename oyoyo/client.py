@@ -23,7 +23,7 @@ import time
 import traceback
 import os
 
-from oyoyo.parse import parse_raw_irc_command
+from oyoyo.parse import parse_message
 
 
 # Adapted from http://code.activestate.com/recipes/511490-implementation-of-the-token-bucket-algorithm/
@@ -206,22 +206,13 @@ class IRCClient:
                     buffer = data.pop()
 
                     for el in data:
-                        prefix, command, args = parse_raw_irc_command(el)
+                        msg = parse_message(el)
+                        if not msg.command:
+                            continue # blank line
+                        prefix, command, fargs = self.decode(msg)
 
                         try:
-                            enc = "utf8"
-                            fargs = [arg.decode(enc) for arg in args if isinstance(arg,bytes)]
-                        except UnicodeDecodeError:
-                            enc = "latin1"
-                            fargs = [arg.decode(enc) for arg in args if isinstance(arg,bytes)]
-
-                        try:
-                            largs = list(args)
-                            if prefix is not None:
-                                prefix = prefix.decode(enc)
                             self.stream_handler("<--- receive {0} {1} ({2})".format(prefix, command, ", ".join(fargs)), level="debug")
-                            # for i,arg in enumerate(largs):
-                                # if arg is not None: largs[i] = arg.decode(enc)
                             if command in self.command_handler:
                                 self.command_handler[command](self, prefix,*fargs)
                             elif "" in self.command_handler:
@@ -235,6 +226,16 @@ class IRCClient:
                 self.stream_handler('closing socket')
                 self.socket.close()
                 yield False
+
+    def decode(self, msg):
+        """ decode a parsed line, and return a tuple of (prefix, command, args)
+        with everything as str.
+
+        Lines are decoded as UTF-8, or as latin-1 if that fails.
+        """
+        msg.decode()
+        return msg.source, msg.command, msg.params
+
     def msg(self, user, msg):
         for line in msg.split('\n'):
             maxchars = 494 - len(self.nickname+self.ident+self.hostmask+user)
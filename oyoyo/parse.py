@@ -18,14 +18,118 @@
 from oyoyo.ircevents import numeric_events
 
 
+# commands are decoded, lowercased and looked up in numeric_events once
+_commands = {}
+_MAX_COMMANDS = 1024 # don't let garbage from the server grow the cache forever
+
+_tag_escapes = {b":": b";", b"s": b" ", b"\\": b"\\", b"r": b"\r", b"n": b"\n"}
+
+class Message:
+    """A parsed IRC line.
+
+    The parameters are kept as bytes in raw_params, and decoded on first
+    access of params (or source): as UTF-8 if possible, and as latin-1
+    otherwise. decode() can be called beforehand to pick other encodings.
+    The encoding that was used is then available as encoding.
+    IRCv3 message tags are parsed on first access of tags.
+    """
+
+    __slots__ = ("raw_tags", "prefix", "command", "raw_params", "encoding", "_params", "_source", "_tags")
+
+    def __init__(self, raw_tags, prefix, command, raw_params):
+        self.raw_tags = raw_tags
+        self.prefix = prefix
+        self.command = command
+        self.raw_params = raw_params
+        self.encoding = None
+        self._params = None
+        self._source = None
+        self._tags = None
+
+    def decode(self, encodings=("utf_8", "latin_1")):
+        """Decode the prefix and the parameters with the first of the given
+        encodings that works for all of them."""
+        for encoding in encodings:
+            try:
+                params = [arg.decode(encoding) for arg in self.raw_params]
+                source = None if self.prefix is None else self.prefix.decode(encoding)
+            except UnicodeDecodeError:
+                continue
+            break
+        else:
+            params = [arg.decode(encoding, "replace") for arg in self.raw_params]
+            source = None if self.prefix is None else self.prefix.decode(encoding, "replace")
+
+        self._params = params
+        self._source = source
+        self.encoding = encoding
+
+    @property
+    def params(self):
+        if self._params is None:
+            self.decode()
+        return self._params
+
+    @property
+    def source(self):
+        """The prefix, decoded with the same encoding as the parameters."""
+        if self._params is None:
+            self.decode()
+        return self._source
+
+    @property
+    def tags(self):
+        if self._tags is None:
+            self._tags = {}
+            if self.raw_tags:
+                for tag in self.raw_tags.split(b";"):
+                    key, _, value = tag.partition(b"=")
+                    if b"\\" in value:
+                        value = _unescape_tag(value)
+                    self._tags[key.decode("utf_8", "replace")] = value.decode("utf_8", "replace")
+        return self._tags
+
+    def __repr__(self):
+        return "Message({0!r}, {1!r}, {2!r}, {3!r})".format(self.raw_tags, self.prefix, self.command, self.raw_params)
+
+def _unescape_tag(value):
+    out = []
+    i = 0
+    while True:
+        j = value.find(b"\\", i)
+        if j == -1:
+            out.append(value[i:])
+            break
+        out.append(value[i:j])
+        char = value[j+1:j+2]
+        out.append(_tag_escapes.get(char, char)) # unknown escapes drop the backslash; a trailing one is dropped
+        i = j + 2
+    return b"".join(out)
+
+def _command(command):
+    try:
+        return _commands[command]
+    except KeyError:
+        pass
+    name = command
+    if command.isdigit():
+        name = numeric_events.get(command, command)
+    if isinstance(name, bytes):
+        name = name.decode("utf_8", "replace")
+    name = name.lower()
+    if len(_commands) < _MAX_COMMANDS:
+        _commands[command] = name
+    return name
+
 # avoiding regex
-def parse_raw_irc_command(element):
+def parse_message(element):
     """
-    This function parses a raw irc command and returns a tuple
-    of (prefix, command, args).
+    Parse a raw line from the server into a Message.
     The following is a psuedo BNF of the input text:
 
-    <message>  ::= [':' <prefix> <SPACE> ] <command> <params> <crlf>
+    <message>  ::= ['@' <tags> <SPACE>] [':' <prefix> <SPACE> ] <command> <params> <crlf>
+    <tags>     ::= <tag> [';' <tag>]*
+    <tag>      ::= <key> ['=' <escaped value>]
     <prefix>   ::= <servername> | <nick> [ '!' <user> ] [ '@' <host> ]
     <command>  ::= <letter> { <letter> } | <number> <number> <number>
     <SPACE>    ::= ' ' { ' ' }
@@ -38,33 +142,37 @@ def parse_raw_irc_command(element):
 
     <crlf>     ::= CR LF
     """
-    parts = element.strip().split(bytes(" ", "utf_8"))
-    if parts[0].startswith(bytes(':', 'utf_8')):
-        prefix = parts[0][1:]
-        command = parts[1]
-        args = parts[2:]
-    else:
-        prefix = None
-        command = parts[0]
-        args = parts[1:]
+    line = element.strip()
+    tags = None
+    prefix = None
+    if line[:1] == b"@":
+        tags, _, line = line[1:].partition(b" ")
+        line = line.lstrip(b" ")
+    if line[:1] == b":":
+        prefix, _, line = line[1:].partition(b" ")
+        line = line.lstrip(b" ")
 
-    if command.isdigit():
-        try:
-            command = numeric_events[command]
-        except KeyError:
-            pass
-    command = command.lower()
-    if isinstance(command, bytes): command = command.decode("utf_8")
-
-    if args[0].startswith(bytes(':', 'utf_8')):
-        args = [bytes(" ", "utf_8").join(args)[1:]]
+    command, _, rest = line.partition(b" ")
+    if rest[:1] == b":":
+        args = [rest[1:]]
     else:
-        for idx, arg in enumerate(args):
-            if arg.startswith(bytes(':', 'utf_8')):
-                args = args[:idx] + [bytes(" ", 'utf_8').join(args[idx:])[1:]]
-                break
+        idx = rest.find(b" :")
+        if idx == -1:
+            args = [arg for arg in rest.split(b" ") if arg]
+        else:
+            args = [arg for arg in rest[:idx].split(b" ") if arg]
+            args.append(rest[idx+2:])
+
+    return Message(tags, prefix, _command(command), args)
 
-    return (prefix, command, args)
+def parse_raw_irc_command(element):
+    """
+    Parse a raw line from the server and return a tuple of
+    (prefix, command, args), with prefix and args left as bytes.
+    See parse_message() for the details.
+    """
+    msg = parse_message(element)
+    return (msg.prefix, msg.command, msg.raw_params)
 
 
 def parse_nick(name):
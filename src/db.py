@@ -121,6 +121,14 @@ def init_vars():
                 host = irc_lower(host)
                 var.DENY[host].add(command)
 
+        _forget_preferences()
+
+def _forget_preferences():
+    # the user tracker caches whether people want notices and simple role messages
+    # var.USERS does not exist yet when this is first called, before the bot connects
+    if hasattr(var, "USERS"):
+        var.USERS.forget_preferences()
+
 def decrement_stasis(acc=None, hostmask=None):
     peid, plid = _get_ids(acc, hostmask)
     if (acc is not None or hostmask is not None) and peid is None:
@@ -237,9 +245,11 @@ def set_access(acc, hostmask, flags=None, tid=None):
 
 def toggle_simple(acc, hostmask):
     _toggle_thing("simple", acc, hostmask)
+    _forget_preferences()
 
 def toggle_notice(acc, hostmask):
     _toggle_thing("notice", acc, hostmask)
+    _forget_preferences()
 
 def toggle_deadchat(acc, hostmask):
     _toggle_thing("deadchat", acc, hostmask)
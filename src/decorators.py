@@ -16,7 +16,10 @@ from src.messages import messages
 adminlog = logger.logger("audit.log")
 
 COMMANDS = defaultdict(list)
-HOOKS = defaultdict(list)
+HOOKS = {} # command -> tuple of callers, rebuilt whenever a hook for it is added or removed
+
+_HOOKS = defaultdict(dict) # command -> {hook: None}, in the order they were added
+_HOOK_IDS = defaultdict(set) # hookid -> hooks
 
 # Error handler decorators
 
@@ -215,8 +218,7 @@ class hook:
         self.name = name
         self.hookid = hookid
         self.func = None
-
-        HOOKS[name].append(self)
+        self.caller = None
 
     def __call__(self, func):
         if isinstance(func, hook):
@@ -224,20 +226,26 @@ class hook:
         else:
             self.func = func
         self.__doc__ = self.func.__doc__
+        self.caller = handle_error(self.func)
+
+        _HOOKS[self.name][self] = None
+        _HOOK_IDS[self.hookid].add(self)
+        hook._update(self.name)
         return self
 
-    @handle_error
-    def caller(self, *args, **kwargs):
-        return self.func(*args, **kwargs)
+    @staticmethod
+    def _update(name):
+        if _HOOKS[name]:
+            HOOKS[name] = tuple(inner.caller for inner in _HOOKS[name])
+        else:
+            del _HOOKS[name]
+            HOOKS.pop(name, None)
 
     @staticmethod
     def unhook(hookid):
-        for each in list(HOOKS):
-            for inner in list(HOOKS[each]):
-                if inner.hookid == hookid:
-                    HOOKS[each].remove(inner)
-            if not HOOKS[each]:
-                del HOOKS[each]
+        for inner in _HOOK_IDS.pop(hookid, ()):
+            _HOOKS[inner.name].pop(inner, None)
+            hook._update(inner.name)
 
 class event_listener:
     def __init__(self, event, priority=5):
@@ -1,20 +1,124 @@
 import random
 import math
-import threading
 import copy
+import bisect
 from datetime import datetime
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
+from types import MappingProxyType
 
 import botconfig
 import src.settings as var
 from src.utilities import *
 from src.messages import messages
 from src.decorators import handle_error
-from src import events
+from src import events, timers, errlog
+
+class RoleTable:
+    """The roles of a game mode for every number of players it allows.
+
+    This is the ROLE_INDEX and ROLE_GUIDE of the mode, checked once and
+    turned into read-only columns, so that starting a game or listing
+    the roles only has to look up the right column. Every role needs a
+    count for each entry of the index; unless check_balance is false,
+    no column may hold more roles than players, or enough wolves to win
+    right away, and a mode with wolves needs them in every column.
+
+    """
+
+    def __init__(self, name, index, guide, check_balance=True):
+        index = tuple(index)
+        if not index or list(index) != sorted(set(index)):
+            raise InvalidModeException("The player counts of the {0} game mode are not in increasing order.".format(name))
+        for role, counts in guide.items():
+            if len(counts) != len(index):
+                raise InvalidModeException("The {0} game mode has {1} counts for {2}, but {3} player counts.".format(name, len(counts), role, len(index)))
+
+        self.name = name
+        self.index = index
+        self.guide = MappingProxyType(OrderedDict((role, tuple(counts)) for role, counts in guide.items()))
+        self.columns = tuple(MappingProxyType(OrderedDict((role, counts[i]) for role, counts in self.guide.items()))
+                             for i in range(len(index)))
+        self._listings = {}
+        if check_balance:
+            self._check_balance()
+
+    def _check_balance(self):
+        wolves = [sum(column.get(role, 0) for role in var.WOLFCHAT_ROLES) for column in self.columns]
+        for players, column, lwolves in zip(self.index, self.columns, wolves):
+            roles = sum(count for role, count in column.items() if role not in var.TEMPLATE_RESTRICTIONS)
+            if roles > players:
+                raise InvalidModeException("The {0} game mode has {1} roles for {2} players.".format(self.name, roles, players))
+            if lwolves > players / 2:
+                raise InvalidModeException("The {0} game mode has too many wolves for {1} players.".format(self.name, players))
+            if not lwolves and any(wolves):
+                raise InvalidModeException("The {0} game mode has no wolves for {1} players.".format(self.name, players))
+
+    def roles(self, players):
+        """Return the role counts for a game of that many players, or None if it is too small."""
+        i = bisect.bisect_right(self.index, players) - 1
+        if i < 0:
+            return None
+        return self.columns[i]
+
+    def listing(self, players=None):
+        """Return the columns of the table the way !roles shows them.
+
+        The result is a list of (player count, text, bold text) tuples,
+        the bold text being used once there are enough players for that
+        column. Without players, every column lists what changes from
+        the one before it; otherwise, only the column for that many
+        players is listed, with all of its roles. The table never
+        changes, so each listing is only put together once.
+
+        """
+
+        if players is not None:
+            i = bisect.bisect_right(self.index, players) - 1
+            if i < 0:
+                return []
+            players = self.index[i]
+        if players not in self._listings:
+            self._listings[players] = self._render(players)
+        return self._listings[players]
+
+    def _render(self, players):
+        old = defaultdict(int)
+        guide = [(role, self.guide[role]) for role in role_order()]
+        listing = []
+        for i, num in enumerate(self.index):
+            if players is not None and num != players:
+                continue
+            roles = []
+            for role, amount in guide:
+                direction = 1 if amount[i] > old[role] else -1
+                for j in range(old[role], amount[i], direction):
+                    temp = "{0}{1}".format("-" if direction == -1 else "", role)
+                    if direction == 1 and j+1 > 1:
+                        temp += "({0})".format(j+1)
+                    elif j > 1:
+                        temp += "({0})".format(j)
+                    roles.append(temp)
+                old[role] = amount[i]
+            text = ", ".join(roles)
+            listing.append((num, "[{0}] {1}".format(num, text), "\u0002[{0}]\u0002 {1}".format(num, text)))
+        return listing
 
 def game_mode(name, minp, maxp, likelihood = 0):
     def decor(c):
         c.name = name
+        # the table comes from the roles set on the class, so the mode itself isn't built
+        # until a game is played with it; modes whose roles depend on their arguments
+        # (e.g. roles) set them in __init__ and make their own table
+        if hasattr(c, "ROLE_GUIDE"):
+            try:
+                table = RoleTable(name, c.ROLE_INDEX, c.ROLE_GUIDE)
+                if table.index[0] > minp:
+                    raise InvalidModeException("The {0} game mode has no roles for {1} players.".format(name, minp))
+            except InvalidModeException as e:
+                # don't let a broken custom mode keep the bot from starting
+                errlog("Game mode {0} was not added: {1}".format(name, e))
+                return c
+            c.ROLE_TABLE = var.ROLE_TABLES[name] = table
         var.GAME_MODES[name] = (c, minp, maxp, likelihood)
         return c
     return decor
@@ -22,37 +126,7 @@ def game_mode(name, minp, maxp, likelihood = 0):
 reset_roles = lambda i: OrderedDict([(role, (0,) * len(i)) for role in var.ROLE_GUIDE])
 
 def get_lovers():
-    lovers = []
-    pl = list_players()
-    for lover in var.LOVERS:
-        done = None
-        for i, lset in enumerate(lovers):
-            if lover in pl and lover in lset:
-                if done is not None: # plot twist! two clusters turn out to be linked!
-                    done.update(lset)
-                    for lvr in var.LOVERS[lover]:
-                        if lvr in pl:
-                            done.add(lvr)
-
-                    lset.clear()
-                    continue
-
-                for lvr in var.LOVERS[lover]:
-                    if lvr in pl:
-                        lset.add(lvr)
-                done = lset
-
-        if done is None and lover in pl:
-            lovers.append(set())
-            lovers[-1].add(lover)
-            for lvr in var.LOVERS[lover]:
-                if lvr in pl:
-                    lovers[-1].add(lvr)
-
-    while set() in lovers:
-        lovers.remove(set())
-
-    return lovers
+    return var.LOVERS.clusters()
 
 class GameMode:
     def __init__(self, arg=""):
@@ -145,7 +219,7 @@ class ChangedRolesMode(GameMode):
                 if role.lower() in var.DISABLED_ROLES:
                     raise InvalidModeException(messages["role_disabled"].format(role))
                 elif role.lower() in self.ROLE_GUIDE:
-                    self.ROLE_GUIDE[role.lower()] = tuple([int(num)] * len(var.ROLE_INDEX))
+                    self.ROLE_GUIDE[role.lower()] = tuple([int(num)] * len(self.ROLE_INDEX))
                 elif role.lower() == "default" and num.lower() in self.ROLE_GUIDE:
                     self.DEFAULT_ROLE = num.lower()
                 elif role.lower() in ("role reveal", "reveal roles", "stats type", "stats", "abstain"):
@@ -156,31 +230,33 @@ class ChangedRolesMode(GameMode):
             except ValueError:
                 raise InvalidModeException(messages["bad_role_value"])
 
+        # start() tells the channel what is wrong with the numbers, if anything
+        self.ROLE_TABLE = RoleTable(self.name, self.ROLE_INDEX, self.ROLE_GUIDE, check_balance=False)
+
 @game_mode("default", minp = 4, maxp = 24, likelihood = 20)
 class DefaultMode(GameMode):
     """Default game mode."""
-    def __init__(self, arg="", role_index=var.ROLE_INDEX, role_guide=var.ROLE_GUIDE.copy()):
-        # No extra settings, just an explicit way to revert to default settings
-        super().__init__(arg)
-        self.ROLE_INDEX = role_index
-        self.ROLE_GUIDE = role_guide
+    # No extra settings, just an explicit way to revert to default settings
+    ROLE_INDEX = var.ROLE_INDEX
+    ROLE_GUIDE = var.ROLE_GUIDE.copy()
 
 @game_mode("villagergame", minp = 4, maxp = 9, likelihood = 0)
 class VillagergameMode(GameMode):
     """This mode definitely does not exist, now please go away."""
+    ROLE_INDEX =            (  4  ,  6  ,  7  ,  8  ,  9  )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({
+        "seer"            : (  1  ,  1  ,  1  ,  1  ,  1  ),
+        "shaman"          : (  0  ,  0  ,  1  ,  1  ,  1  ),
+        "harlot"          : (  0  ,  0  ,  0  ,  1  ,  1  ),
+        "crazed shaman"   : (  0  ,  0  ,  0  ,  0  ,  1  ),
+        "cursed villager" : (  0  ,  1  ,  1  ,  1  ,  1  ),
+        })
+
     def __init__(self, arg=""):
         super().__init__(arg)
         self.fake_index = var.ROLE_INDEX
         self.fake_guide = var.ROLE_GUIDE.copy()
-        self.ROLE_INDEX =       (  4  ,  6  ,  7  ,  8  ,  9  )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({
-            "seer"            : (  1  ,  1  ,  1  ,  1  ,  1  ),
-            "shaman"          : (  0  ,  0  ,  1  ,  1  ,  1  ),
-            "harlot"          : (  0  ,  0  ,  0  ,  1  ,  1  ),
-            "crazed shaman"   : (  0  ,  0  ,  0  ,  0  ,  1  ),
-            "cursed villager" : (  0  ,  1  ,  1  ,  1  ,  1  ),
-            })
 
     def startup(self):
         events.add_listener("chk_win", self.chk_win)
@@ -236,87 +312,87 @@ class VillagergameMode(GameMode):
 @game_mode("foolish", minp = 8, maxp = 24, likelihood = 8)
 class FoolishMode(GameMode):
     """Contains the fool, be careful not to lynch them!"""
-    def __init__(self, arg=""):
-        super().__init__(arg)
-        self.ROLE_INDEX =         (  8  ,  9  ,  10 , 11  , 12  , 15  , 17  , 20  , 21  , 22  , 24  )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({# village roles
-              "oracle"          : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "harlot"          : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ,  2  ,  2  ,  2  ,  2  ),
-              "bodyguard"       : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ),
-              "augur"           : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "hunter"          : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "shaman"          : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              # wolf roles
-              "wolf"            : (  1  ,  1  ,  2  ,  2  ,  2  ,  2  ,  3  ,  3  ,  3  ,  3  ,  4  ),
-              "traitor"         : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ,  2  ,  2  ),
-              "wolf cub"        : (  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "sorcerer"        : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              # neutral roles
-              "clone"           : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "fool"            : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              # templates
-              "cursed villager" : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "gunner"          : (  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ,  2  ),
-              "sharpshooter"    : (  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "mayor"           : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              })
+    ROLE_INDEX =              (  8  ,  9  ,  10 , 11  , 12  , 15  , 17  , 20  , 21  , 22  , 24  )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({# village roles
+          "oracle"          : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "harlot"          : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ,  2  ,  2  ,  2  ,  2  ),
+          "bodyguard"       : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ),
+          "augur"           : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "hunter"          : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "shaman"          : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          # wolf roles
+          "wolf"            : (  1  ,  1  ,  2  ,  2  ,  2  ,  2  ,  3  ,  3  ,  3  ,  3  ,  4  ),
+          "traitor"         : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ,  2  ,  2  ),
+          "wolf cub"        : (  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "sorcerer"        : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          # neutral roles
+          "clone"           : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "fool"            : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          # templates
+          "cursed villager" : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "gunner"          : (  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ,  2  ),
+          "sharpshooter"    : (  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "mayor"           : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          })
 
 @game_mode("mad", minp = 7, maxp = 22, likelihood = 4)
 class MadMode(GameMode):
     """This game mode has mad scientist and many things that may kill you."""
+    ROLE_INDEX =              (  7  ,  8  ,  10 , 12  , 14  , 15  , 17  , 18  , 20  )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({# village roles
+          "seer"            : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "mad scientist"   : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "detective"       : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "guardian angel"  : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ),
+          "hunter"          : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ),
+          "harlot"          : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ),
+          "village drunk"   : (  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          # wolf roles
+          "wolf"            : (  1  ,  1  ,  1  ,  1  ,  2  ,  2  ,  2  ,  2  ,  2  ),
+          "traitor"         : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "werecrow"        : (  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "wolf cub"        : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  2  ),
+          "cultist"         : (  1  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          # neutral roles
+          "vengeful ghost"  : (  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "jester"          : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ),
+          # templates
+          "cursed villager" : (  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "gunner"          : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "sharpshooter"    : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "assassin"        : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ),
+          })
+
     def __init__(self, arg=""):
         super().__init__(arg)
         # gunner and sharpshooter always get 1 bullet
         self.SHOTS_MULTIPLIER = 0.0001
         self.SHARPSHOOTER_MULTIPLIER = 0.0001
-        self.ROLE_INDEX =         (  7  ,  8  ,  10 , 12  , 14  , 15  , 17  , 18  , 20  )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({# village roles
-              "seer"            : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "mad scientist"   : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "detective"       : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "guardian angel"  : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ),
-              "hunter"          : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ),
-              "harlot"          : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ),
-              "village drunk"   : (  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              # wolf roles
-              "wolf"            : (  1  ,  1  ,  1  ,  1  ,  2  ,  2  ,  2  ,  2  ,  2  ),
-              "traitor"         : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "werecrow"        : (  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "wolf cub"        : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  2  ),
-              "cultist"         : (  1  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              # neutral roles
-              "vengeful ghost"  : (  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "jester"          : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ),
-              # templates
-              "cursed villager" : (  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "gunner"          : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "sharpshooter"    : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "assassin"        : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ),
-              })
 
 @game_mode("evilvillage", minp = 6, maxp = 18, likelihood = 1)
 class EvilVillageMode(GameMode):
     """Majority of the village is wolf aligned, safes must secretly try to kill the wolves."""
+    ROLE_INDEX =              (   6   ,   8   ,  10   ,  12   ,  15   )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({# village roles
+          "seer"            : (   0   ,   1   ,   1   ,   1   ,   1   ),
+          "guardian angel"  : (   0   ,   0   ,   1   ,   1   ,   1   ),
+          "shaman"          : (   0   ,   0   ,   0   ,   1   ,   1   ),
+          "hunter"          : (   1   ,   1   ,   1   ,   1   ,   2   ),
+          # wolf roles
+          "wolf"            : (   1   ,   1   ,   1   ,   1   ,   2   ),
+          "minion"          : (   0   ,   0   ,   1   ,   1   ,   1   ),
+          # neutral roles
+          "fool"            : (   0   ,   0   ,   1   ,   1   ,   1   ),
+          })
+
     def __init__(self, arg=""):
         self.ABSTAIN_ENABLED = False
         super().__init__(arg)
         self.DEFAULT_ROLE = "cultist"
         self.DEFAULT_SEEN_AS_VILL = False
-        self.ROLE_INDEX =         (   6   ,   8   ,  10   ,  12   ,  15   )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({# village roles
-              "seer"            : (   0   ,   1   ,   1   ,   1   ,   1   ),
-              "guardian angel"  : (   0   ,   0   ,   1   ,   1   ,   1   ),
-              "shaman"          : (   0   ,   0   ,   0   ,   1   ,   1   ),
-              "hunter"          : (   1   ,   1   ,   1   ,   1   ,   2   ),
-              # wolf roles
-              "wolf"            : (   1   ,   1   ,   1   ,   1   ,   2   ),
-              "minion"          : (   0   ,   0   ,   1   ,   1   ,   1   ),
-              # neutral roles
-              "fool"            : (   0   ,   0   ,   1   ,   1   ,   1   ),
-              })
 
     def startup(self):
         events.add_listener("chk_win", self.chk_win)
@@ -358,29 +434,53 @@ class EvilVillageMode(GameMode):
 @game_mode("classic", minp = 4, maxp = 21, likelihood = 0)
 class ClassicMode(GameMode):
     """Classic game mode from before all the changes."""
+    ROLE_INDEX =              (   4   ,   6   ,   8   ,  10   ,  12   ,  15   ,  17   ,  18   ,  20   )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({# village roles
+          "seer"            : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+          "village drunk"   : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+          "harlot"          : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+          "bodyguard"       : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
+          "detective"       : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+          # wolf roles
+          "wolf"            : (   1   ,   1   ,   1   ,   2   ,   2   ,   3   ,   3   ,   3   ,   4   ),
+          "traitor"         : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+          "werecrow"        : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+          # templates
+          "cursed villager" : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
+          "gunner"          : (   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+          })
+
     def __init__(self, arg=""):
         super().__init__(arg)
         self.ABSTAIN_ENABLED = False
-        self.ROLE_INDEX =         (   4   ,   6   ,   8   ,  10   ,  12   ,  15   ,  17   ,  18   ,  20   )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({# village roles
-              "seer"            : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-              "village drunk"   : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-              "harlot"          : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-              "bodyguard"       : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
-              "detective"       : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-              # wolf roles
-              "wolf"            : (   1   ,   1   ,   1   ,   2   ,   2   ,   3   ,   3   ,   3   ,   4   ),
-              "traitor"         : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-              "werecrow"        : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-              # templates
-              "cursed villager" : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
-              "gunner"          : (   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-              })
 
 @game_mode("rapidfire", minp = 6, maxp = 24, likelihood = 0)
 class RapidFireMode(GameMode):
     """Many roles that lead to multiple chain deaths."""
+    ROLE_INDEX =              (   6   ,   8   ,  10   ,  12   ,  15   ,  18   ,  22   )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({# village roles
+        "seer"              : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "mad scientist"     : (   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
+        "matchmaker"        : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   2   ),
+        "hunter"            : (   0   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
+        "augur"             : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
+        "time lord"         : (   0   ,   0   ,   1   ,   1   ,   1   ,   2   ,   2   ),
+        # wolf roles
+        "wolf"              : (   1   ,   1   ,   1   ,   2   ,   2   ,   3   ,   4   ),
+        "wolf cub"          : (   0   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ),
+        "traitor"           : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        # neutral roles
+        "vengeful ghost"    : (   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   2   ),
+        "amnesiac"          : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
+        # templates
+        "cursed villager"   : (   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
+        "assassin"          : (   0   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ),
+        "gunner"            : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "sharpshooter"      : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        })
+
     def __init__(self, arg=""):
         super().__init__(arg)
         self.SHARPSHOOTER_CHANCE = 1
@@ -389,28 +489,6 @@ class RapidFireMode(GameMode):
         self.SHORT_DAY_LIMIT = 240
         self.SHORT_DAY_WARN = 180
         self.MAD_SCIENTIST_SKIPS_DEAD_PLAYERS = 0
-        self.ROLE_INDEX =         (   6   ,   8   ,  10   ,  12   ,  15   ,  18   ,  22   )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({# village roles
-            "seer"              : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "mad scientist"     : (   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
-            "matchmaker"        : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   2   ),
-            "hunter"            : (   0   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
-            "augur"             : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
-            "time lord"         : (   0   ,   0   ,   1   ,   1   ,   1   ,   2   ,   2   ),
-            # wolf roles
-            "wolf"              : (   1   ,   1   ,   1   ,   2   ,   2   ,   3   ,   4   ),
-            "wolf cub"          : (   0   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ),
-            "traitor"           : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            # neutral roles
-            "vengeful ghost"    : (   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   2   ),
-            "amnesiac"          : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
-            # templates
-            "cursed villager"   : (   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
-            "assassin"          : (   0   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ),
-            "gunner"            : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "sharpshooter"      : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            })
 
     def startup(self):
         events.add_listener("chk_win", self.all_dead_chk_win)
@@ -421,6 +499,24 @@ class RapidFireMode(GameMode):
 @game_mode("drunkfire", minp = 8, maxp = 17, likelihood = 0)
 class DrunkFireMode(GameMode):
     """Most players get a gun, quickly shoot all the wolves!"""
+    ROLE_INDEX =              (   8   ,   10  ,  12   ,  14   ,  16   )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({# village roles
+        "seer"              : (   1   ,   1   ,   1   ,   2   ,   2   ),
+        "village drunk"     : (   2   ,   3   ,   4   ,   4   ,   5   ),
+        # wolf roles
+        "wolf"              : (   1   ,   2   ,   2   ,   3   ,   3   ),
+        "traitor"           : (   1   ,   1   ,   1   ,   1   ,   2   ),
+        "hag"               : (   0   ,   0   ,   1   ,   1   ,   1   ),
+        # neutral roles
+        "crazed shaman"     : (   0   ,   0   ,   1   ,   1   ,   1   ),
+        # templates
+        "cursed villager"   : (   1   ,   1   ,   1   ,   1   ,   1   ),
+        "assassin"          : (   0   ,   0   ,   0   ,   1   ,   1   ),
+        "gunner"            : (   5   ,   6   ,   7   ,   8   ,   9   ),
+        "sharpshooter"      : (   2   ,   2   ,   3   ,   3   ,   4   ),
+        })
+
     def __init__(self, arg=""):
         super().__init__(arg)
         self.SHARPSHOOTER_CHANCE = 1
@@ -432,23 +528,6 @@ class DrunkFireMode(GameMode):
         self.NIGHT_TIME_WARN = 40     #     HIT    MISS    SUICIDE   HEADSHOT
         self.GUN_CHANCES              = (   3/7  ,  3/7  ,   1/7   ,   4/5   )
         self.WOLF_GUN_CHANCES         = (   4/7  ,  3/7  ,   0/7   ,   1     )
-        self.ROLE_INDEX =         (   8   ,   10  ,  12   ,  14   ,  16   )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({# village roles
-            "seer"              : (   1   ,   1   ,   1   ,   2   ,   2   ),
-            "village drunk"     : (   2   ,   3   ,   4   ,   4   ,   5   ),
-            # wolf roles
-            "wolf"              : (   1   ,   2   ,   2   ,   3   ,   3   ),
-            "traitor"           : (   1   ,   1   ,   1   ,   1   ,   2   ),
-            "hag"               : (   0   ,   0   ,   1   ,   1   ,   1   ),
-            # neutral roles
-            "crazed shaman"     : (   0   ,   0   ,   1   ,   1   ,   1   ),
-            # templates
-            "cursed villager"   : (   1   ,   1   ,   1   ,   1   ,   1   ),
-            "assassin"          : (   0   ,   0   ,   0   ,   1   ,   1   ),
-            "gunner"            : (   5   ,   6   ,   7   ,   8   ,   9   ),
-            "sharpshooter"      : (   2   ,   2   ,   3   ,   3   ,   4   ),
-            })
 
     def startup(self):
         events.add_listener("chk_win", self.all_dead_chk_win)
@@ -459,72 +538,72 @@ class DrunkFireMode(GameMode):
 @game_mode("noreveal", minp = 4, maxp = 21, likelihood = 2)
 class NoRevealMode(GameMode):
     """Roles are not revealed when players die."""
+    ROLE_INDEX =              (   4   ,   6   ,   8   ,  10   ,  12   ,  15   ,  17   ,  19   )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({# village roles
+        "seer"              : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "guardian angel"    : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ),
+        "mystic"            : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "detective"         : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
+        "hunter"            : (   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        # wolf roles
+        "wolf"              : (   1   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ,   3   ),
+        "wolf mystic"       : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "traitor"           : (   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "werecrow"          : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
+        # neutral roles
+        "clone"             : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
+        "lycan"             : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ),
+        "amnesiac"          : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ),
+        # templates
+        "cursed villager"   : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
+        })
+
     def __init__(self, arg=""):
         self.ROLE_REVEAL = "off"
         self.STATS_TYPE = "disabled"
         super().__init__(arg)
-        self.ROLE_INDEX =         (   4   ,   6   ,   8   ,  10   ,  12   ,  15   ,  17   ,  19   )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({# village roles
-            "seer"              : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "guardian angel"    : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ),
-            "mystic"            : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "detective"         : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
-            "hunter"            : (   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            # wolf roles
-            "wolf"              : (   1   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ,   3   ),
-            "wolf mystic"       : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "traitor"           : (   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "werecrow"          : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
-            # neutral roles
-            "clone"             : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
-            "lycan"             : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ),
-            "amnesiac"          : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ),
-            # templates
-            "cursed villager"   : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
-            })
 
 @game_mode("lycan", minp = 7, maxp = 21, likelihood = 6)
 class LycanMode(GameMode):
     """Many lycans will turn into wolves. Hunt them down before the wolves overpower the village."""
-    def __init__(self, arg=""):
-        super().__init__(arg)
-        self.ROLE_INDEX =         (   7   ,   8  ,    9   ,   10  ,   11  ,   12  ,  15   ,  17   ,  19   ,  20   )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({# village roles
-            "seer"              : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
-            "bodyguard"         : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "matchmaker"        : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ),
-            "hunter"            : (   1   ,   1   ,   1   ,   2   ,   2   ,   2   ,   2   ,   2   ,   2   ,   2   ),
-            # wolf roles
-            "wolf"              : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "wolf shaman"       : (   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "traitor"           : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            # neutral roles
-            "clone"             : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ),
-            "lycan"             : (   1   ,   1   ,   1   ,   2   ,   2   ,   3   ,   4   ,   4   ,   4   ,   5   ),
-            # templates
-            "cursed villager"   : (   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ,   2   ,   2   ),
-            "gunner"            : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
-            "sharpshooter"      : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
-            "mayor"             : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            })
+    ROLE_INDEX =              (   7   ,   8  ,    9   ,   10  ,   11  ,   12  ,  15   ,  17   ,  19   ,  20   )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({# village roles
+        "seer"              : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
+        "bodyguard"         : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "matchmaker"        : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ),
+        "hunter"            : (   1   ,   1   ,   1   ,   2   ,   2   ,   2   ,   2   ,   2   ,   2   ,   2   ),
+        # wolf roles
+        "wolf"              : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "wolf shaman"       : (   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "traitor"           : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        # neutral roles
+        "clone"             : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ),
+        "lycan"             : (   1   ,   1   ,   1   ,   2   ,   2   ,   3   ,   4   ,   4   ,   4   ,   5   ),
+        # templates
+        "cursed villager"   : (   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ,   2   ,   2   ),
+        "gunner"            : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
+        "sharpshooter"      : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
+        "mayor"             : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        })
 
 @game_mode("valentines", minp = 8, maxp = 24, likelihood = 0)
 class MatchmakerMode(GameMode):
     """Love is in the air!"""
+    ROLE_INDEX = range(8, 25)
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({
+        "wolf"          : [math.ceil((i ** 1.4) * 0.06) for i in ROLE_INDEX],
+        "matchmaker"    : [i - math.ceil((i ** 1.4) * 0.06) - (i >= 12) - (i >= 18) for i in ROLE_INDEX],
+        "monster"       : [i >= 12 for i in ROLE_INDEX],
+        "mad scientist" : [i >= 18 for i in ROLE_INDEX],
+        })
+
     def __init__(self, arg=""):
         super().__init__(arg)
         self.NIGHT_TIME_LIMIT = 150
         self.NIGHT_TIME_WARN = 105
-        self.ROLE_INDEX = range(8, 25)
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({
-            "wolf"          : [math.ceil((i ** 1.4) * 0.06) for i in self.ROLE_INDEX],
-            "matchmaker"    : [i - math.ceil((i ** 1.4) * 0.06) - (i >= 12) - (i >= 18) for i in self.ROLE_INDEX],
-            "monster"       : [i >= 12 for i in self.ROLE_INDEX],
-            "mad scientist" : [i >= 18 for i in self.ROLE_INDEX],
-            })
 
     def startup(self):
         events.add_listener("chk_win", self.lovers_chk_win)
@@ -571,33 +650,43 @@ class RandomMode(GameMode):
         events.remove_listener("chk_win", self.lovers_chk_win)
 
     def role_attribution(self, evt, cli, chk_win_conditions, var, villagers):
-        lpl = len(villagers) - 1
         addroles = evt.data["addroles"]
-        for role in var.ROLE_GUIDE:
-            addroles[role] = 0
-
-        wolves = var.WOLF_ROLES - {"wolf cub"}
-        addroles[random.choice(list(wolves))] += 1 # make sure there's at least one wolf role
+        wolves = list(var.WOLF_ROLES - {"wolf cub"})
         roles = list(var.ROLE_GUIDE.keys() - var.TEMPLATE_RESTRICTIONS.keys() - {"villager", "cultist", "amnesiac"})
-        while lpl:
-            addroles[random.choice(roles)] += 1
-            lpl -= 1
+        lpl = len(villagers)
 
-        addroles["gunner"] = random.randrange(int(len(villagers) ** 1.2 / 4))
-        addroles["assassin"] = random.randrange(max(int(len(villagers) ** 1.2 / 8), 1))
+        # the game must not start with the wolves at parity, which would be an immediate win
+        # rather than drawing every role and trying again until it isn't, first pick how many of
+        # the other roles are in wolfchat, out of the counts that leave the wolves below parity,
+        # as likely as each would be if every role were drawn at random
+        wcroles = [role for role in roles if role in var.WOLFCHAT_ROLES]
+        others = [role for role in roles if role not in var.WOLFCHAT_ROLES]
+        draws = lpl - 1 # one wolf role is always there
+        weights = []
+        ways = 1 # number of ways to pick which draws are in wolfchat
+        for k in range(draws + 1):
+            if 1 + k >= lpl / 2:
+                break
+            weights.append(ways * len(wcroles) ** k * len(others) ** (draws - k))
+            ways = ways * (draws - k) // (k + 1)
+
+        pick = random.randrange(sum(weights))
+        for lwcroles, weight in enumerate(weights):
+            if pick < weight:
+                break
+            pick -= weight
 
-        lpl = len(villagers)
-        lwolves = sum(addroles[r] for r in var.WOLFCHAT_ROLES)
-        lcubs = addroles["wolf cub"]
-        lrealwolves = sum(addroles[r] for r in var.WOLF_ROLES - {"wolf cub"})
-        lmonsters = addroles["monster"]
-        ldemoniacs = addroles["demoniac"]
-        ltraitors = addroles["traitor"]
-        lpipers = addroles["piper"]
-        lsuccubi = addroles["succubus"]
+        for role in var.ROLE_GUIDE:
+            addroles[role] = 0
+
+        addroles[random.choice(wolves)] += 1 # make sure there's at least one wolf role
+        for i in range(lwcroles):
+            addroles[random.choice(wcroles)] += 1
+        for i in range(draws - lwcroles):
+            addroles[random.choice(others)] += 1
 
-        if chk_win_conditions(lpl, lwolves, lcubs, lrealwolves, lmonsters, ldemoniacs, ltraitors, lpipers, lsuccubi, 0, cli, end_game=False):
-            return self.role_attribution(evt, cli, chk_win_conditions, var, villagers)
+        addroles["gunner"] = random.randrange(int(lpl ** 1.2 / 4))
+        addroles["assassin"] = random.randrange(max(int(lpl ** 1.2 / 8), 1))
 
         evt.prevent_default = True
 
@@ -606,6 +695,33 @@ class RandomMode(GameMode):
 @game_mode("aleatoire", minp = 8, maxp = 24, likelihood = 4)
 class AleatoireMode(GameMode):
     """Game mode created by Metacity and balanced by woffle."""
+    ROLE_INDEX =              (   8   ,  10   ,  12   ,  13   ,  14   ,  15   ,  17   ,  18   ,  21   )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({ # village roles
+        "seer"              : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "shaman"            : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "matchmaker"        : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "hunter"            : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
+        "augur"             : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ),
+        "time lord"         : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ),
+        "guardian angel"    : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        # wolf roles
+        "wolf"              : (   1   ,   2   ,   2   ,   2   ,   2   ,   2   ,   3   ,   3   ,   3   ),
+        "wolf cub"          : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ),
+        "traitor"           : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "werecrow"          : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ),
+        "hag"               : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        # neutral roles
+        "vengeful ghost"    : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
+        "amnesiac"          : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "turncoat"          : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        # templates
+        "cursed villager"   : (   2   ,   2   ,   2   ,   2   ,   2   ,   2   ,   2   ,   2   ,   2   ),
+        "assassin"          : (   0   ,   1   ,   1   ,   2   ,   2   ,   2   ,   2   ,   2   ,   2   ),
+        "gunner"            : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "mayor"             : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ),
+        })
+
     def __init__(self, arg=""):
         super().__init__(arg)
         self.SHARPSHOOTER_CHANCE = 1
@@ -632,87 +748,59 @@ class AleatoireMode(GameMode):
         for totem, (s, cs, ws) in self.TOTEM_CHANCES.items():
             self.TOTEM_CHANCES[totem] = (s, cs, var.TOTEM_CHANCES[totem][2])
 
-        self.ROLE_INDEX =         (   8   ,  10   ,  12   ,  13   ,  14   ,  15   ,  17   ,  18   ,  21   )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({ # village roles
-            "seer"              : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "shaman"            : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "matchmaker"        : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "hunter"            : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
-            "augur"             : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ),
-            "time lord"         : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ),
-            "guardian angel"    : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            # wolf roles
-            "wolf"              : (   1   ,   2   ,   2   ,   2   ,   2   ,   2   ,   3   ,   3   ,   3   ),
-            "wolf cub"          : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ),
-            "traitor"           : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "werecrow"          : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ),
-            "hag"               : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            # neutral roles
-            "vengeful ghost"    : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ),
-            "amnesiac"          : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "turncoat"          : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            # templates
-            "cursed villager"   : (   2   ,   2   ,   2   ,   2   ,   2   ,   2   ,   2   ,   2   ,   2   ),
-            "assassin"          : (   0   ,   1   ,   1   ,   2   ,   2   ,   2   ,   2   ,   2   ,   2   ),
-            "gunner"            : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "mayor"             : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ),
-            })
-
 @game_mode("alpha", minp = 7, maxp = 24, likelihood = 5)
 class AlphaMode(GameMode):
     """Features the alpha wolf who can turn other people into wolves, be careful whom you trust!"""
-    def __init__(self, arg=""):
-        super().__init__(arg)
-        self.ROLE_INDEX =         (   7   ,   8   ,  10   ,  11   ,  12   ,  14   ,  15   ,  17   ,  18   ,  20   ,  21   ,  24   )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({
-            #village roles
-            "oracle"            : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "matchmaker"        : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "village drunk"     : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "guardian angel"    : (   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "doctor"            : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "harlot"            : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "augur"             : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            # wolf roles
-            "wolf"              : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ,   3   ,   3   ,   4   ,   5   ),
-            "alpha wolf"        : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "traitor"           : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            "werecrow"          : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
-            # neutral roles
-            "lycan"             : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ,   2   ,   2   ),
-            "clone"             : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
-            # templates
-            "cursed villager"   : (   1   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ,   2   ,   3   ,   3   ,   3   ,   4   ),
-            })
+    ROLE_INDEX =              (   7   ,   8   ,  10   ,  11   ,  12   ,  14   ,  15   ,  17   ,  18   ,  20   ,  21   ,  24   )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({
+        #village roles
+        "oracle"            : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "matchmaker"        : (   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "village drunk"     : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "guardian angel"    : (   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "doctor"            : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "harlot"            : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "augur"             : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        # wolf roles
+        "wolf"              : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ,   3   ,   3   ,   4   ,   5   ),
+        "alpha wolf"        : (   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "traitor"           : (   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        "werecrow"          : (   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ),
+        # neutral roles
+        "lycan"             : (   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ,   2   ,   2   ),
+        "clone"             : (   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   0   ,   1   ,   1   ,   1   ),
+        # templates
+        "cursed villager"   : (   1   ,   1   ,   1   ,   1   ,   2   ,   2   ,   2   ,   2   ,   3   ,   3   ,   3   ,   4   ),
+        })
 
 # original idea by Rossweisse, implemented by Vgr with help from woffle and jacob1
 @game_mode("guardian", minp = 8, maxp = 16, likelihood = 0)
 class GuardianMode(GameMode):
     """Game mode full of guardian angels, wolves need to pick them apart!"""
+    ROLE_INDEX =              (   8   ,   10   ,  12   ,  13   ,  15   )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({
+        # village roles
+        "bodyguard"         : (   0   ,   0   ,   0   ,   0   ,   1   ),
+        "guardian angel"    : (   1   ,   1   ,   2   ,   2   ,   2   ),
+        "shaman"            : (   0   ,   1   ,   1   ,   1   ,   1   ),
+        "seer"              : (   1   ,   1   ,   1   ,   1   ,   1   ),
+        # wolf roles
+        "wolf"              : (   1   ,   1   ,   1   ,   1   ,   2   ),
+        "werecrow"          : (   0   ,   1   ,   1   ,   1   ,   1   ),
+        "werekitten"        : (   1   ,   1   ,   1   ,   1   ,   1   ),
+        "alpha wolf"        : (   0   ,   0   ,   1   ,   1   ,   1   ),
+        # neutral roles
+        "jester"            : (   0   ,   0   ,   0   ,   1   ,   1   ),
+        # templates
+        "gunner"            : (   0   ,   0   ,   0   ,   1   ,   1   ),
+        "cursed villager"   : (   1   ,   1   ,   2   ,   2   ,   2   ),
+        })
+
     def __init__(self, arg=""):
         self.LIMIT_ABSTAIN = False
         super().__init__(arg)
-        self.ROLE_INDEX =         (   8   ,   10   ,  12   ,  13   ,  15   )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({
-            # village roles
-            "bodyguard"         : (   0   ,   0   ,   0   ,   0   ,   1   ),
-            "guardian angel"    : (   1   ,   1   ,   2   ,   2   ,   2   ),
-            "shaman"            : (   0   ,   1   ,   1   ,   1   ,   1   ),
-            "seer"              : (   1   ,   1   ,   1   ,   1   ,   1   ),
-            # wolf roles
-            "wolf"              : (   1   ,   1   ,   1   ,   1   ,   2   ),
-            "werecrow"          : (   0   ,   1   ,   1   ,   1   ,   1   ),
-            "werekitten"        : (   1   ,   1   ,   1   ,   1   ,   1   ),
-            "alpha wolf"        : (   0   ,   0   ,   1   ,   1   ,   1   ),
-            # neutral roles
-            "jester"            : (   0   ,   0   ,   0   ,   1   ,   1   ),
-            # templates
-            "gunner"            : (   0   ,   0   ,   0   ,   1   ,   1   ),
-            "cursed villager"   : (   1   ,   1   ,   2   ,   2   ,   2   ),
-            })
 
         self.TOTEM_CHANCES = { #  shaman , crazed , wolf
                         "death": (   4   ,   1   ,   0   ),
@@ -769,63 +857,62 @@ class GuardianMode(GameMode):
 @game_mode("charming", minp = 5, maxp = 24, likelihood = 4)
 class CharmingMode(GameMode):
     """Charmed players must band together to find the piper in this game mode."""
-    def __init__(self, arg=""):
-        super().__init__(arg)
-        self.ROLE_INDEX =         (  5  ,  6  ,  8 ,  10  , 11  , 12  , 14  , 16  , 18  , 19  , 22  , 24  )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({# village roles
-              "seer"            : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "harlot"          : (  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "shaman"          : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ,  2  ),
-              "detective"       : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "bodyguard"       : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  2  ,  2  ,  2  ,  2  ),
-              # wolf roles
-              "wolf"            : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ,  2  ,  2  ,  3  ,  3  ),
-              "traitor"         : (  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "werekitten"      : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "warlock"         : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "sorcerer"        : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ),
-              # neutral roles
-              "piper"           : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "vengeful ghost"  : (  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              # templates
-              "cursed villager" : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "gunner"          : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ),
-              "sharpshooter"    : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ),
-              "mayor"           : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              "assassin"        : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-              })
+    ROLE_INDEX =              (  5  ,  6  ,  8 ,  10  , 11  , 12  , 14  , 16  , 18  , 19  , 22  , 24  )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({# village roles
+          "seer"            : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "harlot"          : (  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "shaman"          : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ,  2  ),
+          "detective"       : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "bodyguard"       : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  2  ,  2  ,  2  ,  2  ),
+          # wolf roles
+          "wolf"            : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ,  2  ,  2  ,  3  ,  3  ),
+          "traitor"         : (  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "werekitten"      : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "warlock"         : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "sorcerer"        : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ),
+          # neutral roles
+          "piper"           : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "vengeful ghost"  : (  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          # templates
+          "cursed villager" : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "gunner"          : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ),
+          "sharpshooter"    : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ,  2  ),
+          "mayor"           : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          "assassin"        : (  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+          })
 
 @game_mode("sleepy", minp=8, maxp=24, likelihood=5)
 class SleepyMode(GameMode):
     """A small village has become the playing ground for all sorts of supernatural beings."""
+    ROLE_INDEX =             (  8  , 10  , 12  , 15  , 18  , 21  )
+    ROLE_GUIDE = reset_roles(ROLE_INDEX)
+    ROLE_GUIDE.update({
+        # village roles
+        "seer"             : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+        "priest"           : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+        "harlot"           : (  0  ,  0  ,  0  ,  0  ,  1  ,  1  ),
+        "detective"        : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ),
+        "vigilante"        : (  0  ,  0  ,  1  ,  1  ,  1  ,  1  ),
+        "village drunk"    : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ),
+        # wolf roles
+        "wolf"             : (  1  ,  1  ,  2  ,  3  ,  4  ,  5  ),
+        "werecrow"         : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+        "traitor"          : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+        "cultist"          : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+        # neutral roles
+        "dullahan"         : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+        "vengeful ghost"   : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ),
+        "monster"          : (  0  ,  0  ,  0  ,  0  ,  1  ,  2  ),
+        # templates
+        "cursed villager"  : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+        "blessed villager" : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+        "prophet"          : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
+        "gunner"           : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ),
+        })
+
     def __init__(self, arg=""):
         super().__init__(arg)
-        self.ROLE_INDEX =        (  8  , 10  , 12  , 15  , 18  , 21  )
-        self.ROLE_GUIDE = reset_roles(self.ROLE_INDEX)
-        self.ROLE_GUIDE.update({
-            # village roles
-            "seer"             : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-            "priest"           : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-            "harlot"           : (  0  ,  0  ,  0  ,  0  ,  1  ,  1  ),
-            "detective"        : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ),
-            "vigilante"        : (  0  ,  0  ,  1  ,  1  ,  1  ,  1  ),
-            "village drunk"    : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ),
-            # wolf roles
-            "wolf"             : (  1  ,  1  ,  2  ,  3  ,  4  ,  5  ),
-            "werecrow"         : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-            "traitor"          : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-            "cultist"          : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-            # neutral roles
-            "dullahan"         : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-            "vengeful ghost"   : (  0  ,  0  ,  0  ,  1  ,  1  ,  1  ),
-            "monster"          : (  0  ,  0  ,  0  ,  0  ,  1  ,  2  ),
-            # templates
-            "cursed villager"  : (  1  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-            "blessed villager" : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-            "prophet"          : (  0  ,  1  ,  1  ,  1  ,  1  ,  1  ),
-            "gunner"           : (  0  ,  0  ,  0  ,  0  ,  0  ,  1  ),
-            })
         # this ensures that priest will always receive the blessed villager and prophet templates
         # prophet is normally a role by itself, but we're turning it into a template for this mode
         self.TEMPLATE_RESTRICTIONS = var.TEMPLATE_RESTRICTIONS.copy()
@@ -881,10 +968,7 @@ class SleepyMode(GameMode):
     def setup_nightmares(self, evt, cli, var):
         if random.random() < 1/5:
             self.having_nightmare = True
-            with var.WARNING_LOCK:
-                t = threading.Timer(60, self.do_nightmare, (cli, var, random.choice(list_players()), var.NIGHT_COUNT))
-                t.daemon = True
-                t.start()
+            timers.schedule(60, self.do_nightmare, cli, var, random.choice(list_players()), var.NIGHT_COUNT)
         else:
             self.having_nightmare = None
 
@@ -1223,6 +1307,7 @@ class MaelstromMode(GameMode):
         var.ORIGINAL_ROLES[role].add(nick)
         var.FINAL_ROLES[nick] = role
         var.LAST_SAID_TIME[nick] = datetime.now()
+        track_idle(cli, nick)
         if nick in var.USERS:
             var.PLAYERS[nick] = var.USERS[nick]
 
@@ -10,7 +10,7 @@ from oyoyo.parse import parse_nick
 import botconfig
 import src.settings as var
 from src import decorators, wolfgame, errlog as log, stream_handler as alog
-from src.utilities import irc_equals
+from src.utilities import irc_equals, is_fake_nick
 
 hook = decorators.hook
 
@@ -40,19 +40,26 @@ def on_privmsg(cli, rawnick, chan, msg, notice = False):
                     (irc_equals(chan, botconfig.NICK) and not botconfig.ALLOW_PRIVATE_NOTICE_COMMANDS))):
         return  # not allowed in settings
 
+    nick = parse_nick(rawnick)[0]
     if irc_equals(chan, botconfig.NICK):
-        chan = parse_nick(rawnick)[0]
+        chan = nick
+
+    if chan != nick and msg[:len(botconfig.CMD_CHAR)].lower() != botconfig.CMD_CHAR:
+        # Most of what is said in the channel is chatter rather than commands; only the
+        # listeners for every message care about it, and none of them need the checks
+        # done in cmd.caller beyond the ones below. PMs and commands go the full way.
+        on_chatter(cli, rawnick, nick, chan, msg)
+        return
 
     for fn in decorators.COMMANDS[""]:
         fn.caller(cli, rawnick, chan, msg)
 
     phase = var.PHASE
+    lmsg = msg.lower()
     for x in list(decorators.COMMANDS.keys()):
-        if chan != parse_nick(rawnick)[0] and not msg.lower().startswith(botconfig.CMD_CHAR):
-            break # channel message but no prefix; ignore
-        if msg.lower().startswith(botconfig.CMD_CHAR+x):
+        if lmsg.startswith(botconfig.CMD_CHAR+x):
             h = msg[len(x)+len(botconfig.CMD_CHAR):]
-        elif not x or msg.lower().startswith(x):
+        elif not x or lmsg.startswith(x):
             h = msg[len(x):]
         else:
             continue
@@ -62,13 +69,25 @@ def on_privmsg(cli, rawnick, chan, msg, notice = False):
                     fn.caller(cli, rawnick, chan, h.lstrip())
 
 
+@decorators.handle_error
+def on_chatter(cli, rawnick, nick, chan, msg):
+    if chan.startswith("#") and chan != botconfig.CHANNEL:
+        return # don't have empty commands triggering in other channels
+    if nick not in var.USERS and not is_fake_nick(nick):
+        return
+    for fn in decorators.COMMANDS[""]:
+        if fn.chan:
+            chatter_listener(cli, fn, rawnick if fn.raw_nick else nick, chan, msg)
+
+@decorators.handle_error
+def chatter_listener(cli, fn, nick, chan, msg):
+    # one listener failing shouldn't keep the others from seeing the message
+    fn.func(cli, nick, chan, msg)
+
 def unhandled(cli, prefix, cmd, *args):
-    if cmd in decorators.HOOKS:
-        largs = list(args)
-        for i,arg in enumerate(largs):
-            if isinstance(arg, bytes): largs[i] = arg.decode('ascii')
-        for fn in decorators.HOOKS.get(cmd, []):
-            fn.caller(cli, prefix, *largs)
+    # the client has already decoded the arguments
+    for caller in decorators.HOOKS.get(cmd, ()):
+        caller(cli, prefix, *args)
 
 def connect_callback(cli):
     @hook("endofmotd", hookid=294)
@@ -124,7 +143,7 @@ def connect_callback(cli):
         hook("unavailresource")(mustrelease)
         hook("nicknameinuse")(mustregain)
 
-    request_caps = {"account-notify", "extended-join", "multi-prefix"}
+    request_caps = {"account-notify", "away-notify", "extended-join", "multi-prefix"}
 
     if botconfig.SASL_AUTHENTICATION:
         request_caps.add("sasl")
@@ -0,0 +1,164 @@
+# lover bookkeeping
+
+__all__ = ["LoverGraph"]
+
+class LoverGraph:
+    """Keeps track of who is in love with whom.
+
+    Read access mirrors the old dict of sets: graph[nick] gives a
+    read-only view of the people nick was matched with, and nick stays
+    in the graph after those links are cleared, so that the end of game
+    statistics still know they were a lover.
+
+    On top of the links, the living lovers are kept in disjoint sets,
+    one per cluster of lovers that are linked to each other, either
+    directly or through other living lovers. Matching two people merges
+    their clusters, moving the smaller one over; a death or a removed
+    link only splits up the one cluster it touched. Asking for the
+    clusters therefore never needs to look at the whole graph.
+
+    """
+
+    def __init__(self):
+        self._links = {}    # nick -> {lover: None}, used as an ordered set
+        self._cluster = {}  # living lover -> cluster id
+        self._members = {}  # cluster id -> set of living lovers
+        self._next_id = 0
+
+    def __contains__(self, nick):
+        return nick in self._links
+
+    def __getitem__(self, nick):
+        return self._links[nick].keys()
+
+    def __iter__(self):
+        return iter(self._links)
+
+    def __len__(self):
+        return len(self._links)
+
+    def get(self, nick, default=None):
+        if nick in self._links:
+            return self._links[nick].keys()
+        return default
+
+    def keys(self):
+        return self._links.keys()
+
+    def items(self):
+        return [(nick, lovers.keys()) for nick, lovers in self._links.items()]
+
+    def link(self, nick, other):
+        """Make nick and other lovers of each other."""
+        for a, b in ((nick, other), (other, nick)):
+            if a not in self._links:
+                self._links[a] = {}
+                self._add(a)
+            self._links[a][b] = None
+        self._union(nick, other)
+
+    def discard(self, nick, other):
+        """Remove other from the lovers of nick, but not the other way around."""
+        lovers = self._links.get(nick)
+        if lovers is None or other not in lovers:
+            return
+        del lovers[other]
+        self._unlinked(nick, other)
+
+    def clear(self, nick):
+        """Remove all of the lovers of nick, but not the other way around."""
+        lovers = self._links.get(nick)
+        if not lovers:
+            return
+        others = list(lovers)
+        lovers.clear()
+        for other in others:
+            self._unlinked(nick, other)
+
+    def died(self, nick):
+        """Take nick out of the clusters of living lovers; the links stay as they are."""
+        cid = self._cluster.pop(nick, None)
+        if cid is None:
+            return
+        members = self._members[cid]
+        members.discard(nick)
+        self._split(cid)
+
+    def rename(self, old, new):
+        if old in self._links:
+            self._links[new] = self._links.pop(old)
+        for lovers in self._links.values():
+            if old in lovers:
+                # keep the order of the links
+                items = [(new if lover == old else lover) for lover in lovers]
+                lovers.clear()
+                lovers.update(dict.fromkeys(items))
+        cid = self._cluster.pop(old, None)
+        if cid is not None:
+            self._cluster[new] = cid
+            self._members[cid].discard(old)
+            self._members[cid].add(new)
+
+    def clusters(self):
+        """Return the clusters of living lovers, as a list of sets."""
+        return [set(members) for members in self._members.values()]
+
+    def cluster(self, nick):
+        """Return the living lovers in the same cluster as nick, nick included."""
+        cid = self._cluster.get(nick)
+        if cid is None:
+            return set()
+        return set(self._members[cid])
+
+    def _linked(self, a, b):
+        return b in self._links.get(a, ()) or a in self._links.get(b, ())
+
+    def _add(self, nick):
+        cid = self._next_id
+        self._next_id += 1
+        self._cluster[nick] = cid
+        self._members[cid] = {nick}
+
+    def _union(self, a, b):
+        ca = self._cluster.get(a)
+        cb = self._cluster.get(b)
+        if ca is None or cb is None or ca == cb:
+            return
+        if len(self._members[ca]) < len(self._members[cb]):
+            ca, cb = cb, ca
+        moved = self._members.pop(cb)
+        for nick in moved:
+            self._cluster[nick] = ca
+        self._members[ca].update(moved)
+
+    def _unlinked(self, a, b):
+        cid = self._cluster.get(a)
+        if cid is None or cid != self._cluster.get(b) or self._linked(a, b):
+            return
+        self._split(cid)
+
+    def _split(self, cid):
+        """Break cluster cid up into the parts that are still linked together."""
+        remaining = set(self._members.pop(cid))
+        while remaining:
+            start = remaining.pop()
+            part = {start}
+            todo = [start]
+            while todo:
+                nick = todo.pop()
+                for other in list(remaining):
+                    if self._linked(nick, other):
+                        remaining.discard(other)
+                        part.add(other)
+                        todo.append(other)
+            # the first part keeps the id, the others get new ones
+            if cid not in self._members:
+                new = cid
+            else:
+                new = self._next_id
+                self._next_id += 1
+            self._members[new] = part
+            for nick in part:
+                self._cluster[nick] = new
+
+# vim: set sw=4 expandtab:
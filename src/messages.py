@@ -1,40 +1,156 @@
 import json
+import operator
 import os
+import string
+from types import MappingProxyType
 
 import src.settings as var
 
 MESSAGES_DIR = os.path.join(os.path.dirname(__file__), "..", "messages")
 ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
 
+_formatter = string.Formatter()
+
+class Template(str):
+    """A message, parsed once when the messages are loaded.
+
+    Templates are strings and can be used like any other; only format()
+    changes. Messages that only use plain {0} or {name} fields, which is
+    nearly all of them, are also turned into a %-style string, which is
+    faster to fill in than going through str.format() every time.
+
+    """
+
+    def __new__(cls, text, key=None):
+        self = super().__new__(cls, text)
+        self._compile(key)
+        return self
+
+    def _compile(self, key):
+        try:
+            fields = list(_formatter.parse(self))
+        except ValueError as e:
+            raise ValueError("Message {0!r} is not a valid template: {1}".format(key, e)) from None
+
+        pct = []
+        indexes = []
+        names = set()
+        auto = 0
+        simple = True
+        for literal, field, spec, conv in fields:
+            pct.append(literal.replace("%", "%%"))
+            if field is None:
+                continue
+            # {0.nick} and {0[1]} still take their value from argument 0
+            base = field.partition(".")[0].partition("[")[0]
+            if spec or conv or base != field:
+                simple = False
+            if base == "":
+                base = str(auto)
+                auto += 1
+            elif auto and base.isdigit():
+                raise ValueError("Message {0!r} mixes {{}} and numbered fields".format(key))
+            if base.isdigit():
+                indexes.append(int(base))
+                pct.append("%s")
+            else:
+                names.add(base)
+                pct.append("%({0})s".format(base))
+        if auto and len(indexes) > auto:
+            raise ValueError("Message {0!r} mixes {{}} and numbered fields".format(key))
+
+        self.positional = max(indexes) + 1 if indexes else 0 # how many positional arguments are needed
+        self.names = frozenset(names)
+        if simple and not (indexes and names):
+            # shadows str.format for this message only
+            self.format = _fast_format(str(self), "".join(pct), indexes, names)
+
+def _fast_format(text, pct, indexes, names):
+    # anything the %-style string can't handle, errors included, is left to str.format()
+    if names:
+        def format(*args, **kwargs):
+            try:
+                return pct % kwargs
+            except (KeyError, TypeError):
+                return text.format(*args, **kwargs)
+    elif indexes == list(range(len(indexes))):
+        def format(*args, **kwargs):
+            try:
+                return pct % args
+            except TypeError: # too many or too few arguments
+                return text.format(*args, **kwargs)
+    else:
+        # out of order or repeated fields, pick the arguments to fill them with
+        if len(indexes) == 1:
+            index = indexes[0]
+            order = lambda args: (args[index],)
+        else:
+            order = operator.itemgetter(*indexes)
+        def format(*args, **kwargs):
+            try:
+                return pct % order(args)
+            except (IndexError, TypeError):
+                return text.format(*args, **kwargs)
+    return format
+
+def _compile(key, message):
+    if isinstance(message, str):
+        return Template(message, key)
+    if isinstance(message, list):
+        return tuple(_compile(key, item) for item in message)
+    return message
+
+def _templates(message):
+    if isinstance(message, str):
+        yield message
+    elif isinstance(message, tuple):
+        for item in message:
+            yield from _templates(item)
+
 class Messages:
     def __init__ (self):
         self.lang = var.LANGUAGE
         self._load_messages()
 
     def get(self, key):
-        if not self.messages[key.lower()]:
+        try:
+            message = self.messages[key]
+        except KeyError:
+            message = self.messages[key.lower()]
+        if not message:
             raise KeyError("Key {0!r} does not exist! Add it to messages.json".format(key))
-        return self.messages[key.lower()]
+        return message
 
     __getitem__ = get
 
     def _load_messages(self):
         with open(os.path.join(MESSAGES_DIR, self.lang + ".json")) as f:
-            self.messages = json.load(f)
+            messages = {key.lower(): _compile(key, message) for key, message in json.load(f).items()}
 
-        if not os.path.isfile(os.path.join(ROOT_DIR, "messages.json")):
-            return
-        with open(os.path.join(ROOT_DIR, "messages.json")) as f:
-            custom_msgs = json.load(f)
+        custom_msgs = None
+        if os.path.isfile(os.path.join(ROOT_DIR, "messages.json")):
+            with open(os.path.join(ROOT_DIR, "messages.json")) as f:
+                custom_msgs = json.load(f)
 
-        if not custom_msgs:
-            return
+        for key, message in (custom_msgs or {}).items():
+            key = key.lower()
+            message = _compile(key, message)
+            if key in messages:
+                default = messages[key]
+                if not isinstance(message, type(default)):
+                    raise TypeError("messages.json: Key {0!r} must be of type {1!r}".format(
+                        key, "list" if isinstance(default, tuple) else type(default).__name__))
+                # the code fills in the fields of the default message, so the custom one can't ask for more
+                positional = max([t.positional for t in _templates(default)] or [0])
+                names = frozenset().union(*(t.names for t in _templates(default)))
+                for template in _templates(message):
+                    if template.positional > positional or not template.names <= names:
+                        raise ValueError("messages.json: Key {0!r} uses fields that are not given to it; "
+                                         "the default message uses {1} positional field(s){2}".format(
+                                         key, positional, " and " + ", ".join(sorted(names)) if names else ""))
+            messages[key] = message
 
-        for key, message in custom_msgs.items():
-            if key in self.messages:
-                if not isinstance(message, type(self.messages[key.lower()])):
-                    raise TypeError("messages.json: Key {0!r} must be of type {1!r}".format(key, type(self.messages[key.lower()]).__name__))
-            self.messages[key.lower()] = message
+        self.messages = MappingProxyType(messages)
 
 messages = Messages()
 
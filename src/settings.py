@@ -182,6 +182,8 @@ TOTEM_CHANCES = {       "death": (      1      ,        1        ,       0
                 }
 
 GAME_MODES = {}
+ROLE_TABLES = {} # game mode name -> RoleTable, for the modes whose roles don't depend on arguments
+ROLE_TABLE = None # RoleTable of the current game mode
 GAME_PHASES = ("night", "day") # all phases that constitute "in game", game modes can extend this with custom phases
 
 ACCOUNTS_ONLY = False # If True, will use only accounts for everything
@@ -0,0 +1,93 @@
+# central timer scheduler
+# all game timers share a single thread and a heap ordered by deadline,
+# instead of spawning a threading.Timer (and thus an OS thread) for each one
+import heapq
+import itertools
+import threading
+import time
+
+import src.settings as var
+from src.decorators import handle_error
+
+__all__ = ["Timer", "schedule", "cancel_game", "cancel_all"]
+
+_queue = []
+_counter = itertools.count()
+_cond = threading.Condition(threading.RLock())
+_thread = None
+
+class Timer:
+    __slots__ = ("deadline", "func", "args", "game_id", "cancelled", "fired")
+
+    def __init__(self, delay, func, args, game_id):
+        self.deadline = time.monotonic() + delay
+        self.func = func
+        self.args = args
+        self.game_id = game_id
+        self.cancelled = False
+        self.fired = False
+
+    def cancel(self):
+        # the entry is dropped from the heap lazily, once it reaches the top
+        self.cancelled = True
+
+    def is_alive(self):
+        return not self.cancelled and not self.fired
+
+    def remaining(self):
+        """Return the number of seconds left before the timer fires."""
+        return self.deadline - time.monotonic()
+
+def schedule(delay, func, *args, game_id=None):
+    """Run func(*args) on the scheduler thread after delay seconds.
+
+    The timer is tagged with the current game id unless one is given,
+    so that it can be cancelled along with the rest of the game.
+
+    """
+    global _thread
+    if game_id is None:
+        game_id = var.GAME_ID
+    timer = Timer(delay, func, args, game_id)
+    with _cond:
+        heapq.heappush(_queue, (timer.deadline, next(_counter), timer))
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="timers", daemon=True)
+            _thread.start()
+        _cond.notify()
+    return timer
+
+def cancel_game(game_id):
+    """Cancel every pending timer belonging to the given game."""
+    with _cond:
+        for _, _, timer in _queue:
+            if timer.game_id == game_id:
+                timer.cancel()
+
+def cancel_all():
+    """Cancel every pending timer, whichever game it was armed for."""
+    with _cond:
+        for _, _, timer in _queue:
+            timer.cancel()
+
+def _run():
+    while True:
+        with _cond:
+            while True:
+                while _queue and _queue[0][2].cancelled:
+                    heapq.heappop(_queue)
+                if not _queue:
+                    _cond.wait()
+                    continue
+                delay = _queue[0][0] - time.monotonic()
+                if delay <= 0:
+                    break
+                _cond.wait(delay)
+            timer = heapq.heappop(_queue)[2]
+            timer.fired = True
+
+        # run the callback outside the lock, so it can schedule or cancel other timers;
+        # errors are reported like any other (most callbacks are already wrapped)
+        handle_error(timer.func)(*timer.args)
+
+# vim: set sw=4 expandtab:
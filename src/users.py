@@ -0,0 +1,372 @@
+# user state tracking
+
+from collections.abc import MutableMapping
+
+from src.utilities import irc_lower
+
+__all__ = ["NickTrie", "User", "UserTracker"]
+
+# characters that nick completion may skip at the start of a nick
+_NICK_PADDING = "[{\\^_`|}]"
+
+class _Node:
+    __slots__ = ("children", "keys", "end")
+
+    def __init__(self):
+        self.children = {}
+        self.keys = set() # every nick at or below this node
+        self.end = None   # the nick spelled out by the path to this node
+
+class NickTrie:
+    """Prefix tree of nicks, for completing partial nicks.
+
+    Nicks are stored under their casemapped form and, for nicks that
+    start with padding characters such as _ or [, under the form with
+    those stripped, so that "!see bar" finds _bar_ like it always has.
+    Every node knows all the nicks below it, so a completion only walks
+    the prefix, no matter how many nicks there are.
+
+    """
+
+    def __init__(self, nicks=()):
+        self._root = _Node()
+        self._nicks = {} # irc_lower(nick) -> nick
+        self._keys = {}  # nick -> irc_lower(nick)
+        for nick in nicks:
+            self.add(nick)
+
+    def __contains__(self, nick):
+        return irc_lower(nick) in self._nicks
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, nick):
+        key = irc_lower(nick)
+        if key in self._nicks:
+            if self._nicks[key] == nick:
+                return
+            self.remove(self._nicks[key])
+        self._nicks[key] = nick
+        self._keys[nick] = key
+        self._root.keys.add(key)
+        for form in self._forms(key):
+            node = self._root
+            for char in form:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node()
+                child.keys.add(key)
+                node = child
+            if form == key:
+                node.end = key
+
+    def remove(self, nick):
+        key = irc_lower(nick)
+        if key not in self._nicks:
+            return
+        del self._keys[self._nicks.pop(key)]
+        self._root.keys.discard(key)
+        for form in self._forms(key):
+            node = self._root
+            for char in form:
+                child = node.children[char]
+                child.keys.discard(key)
+                if not child.keys:
+                    # nothing else below, drop the whole branch
+                    del node.children[char]
+                    break
+                node = child
+            else:
+                if node.end == key:
+                    node.end = None
+
+    def rename(self, old, new):
+        self.remove(old)
+        self.add(new)
+
+    def clear(self):
+        self._root = _Node()
+        self._nicks.clear()
+        self._keys.clear()
+
+    def rehash(self):
+        """Rebuild the trie after the case mapping changed."""
+        nicks = list(self._keys)
+        self.clear()
+        for nick in nicks:
+            self.add(nick)
+
+    def complete(self, prefix, exclude=None, extra=()):
+        """Complete a partial nick, the way complete_match() does.
+
+        Return a (nick, 1) tuple if prefix is a nick or the start of
+        exactly one nick, and (None, number of matches) otherwise. The
+        exclude nick, if any, is treated as if it were not there. The
+        nicks in extra are matched as well, as if they were in the trie.
+
+        """
+
+        skip = irc_lower(exclude) if exclude is not None else None
+        lprefix = irc_lower(prefix)
+        others = {} # the nicks in extra that match
+        for nick in extra:
+            key = irc_lower(nick)
+            if key == skip or key in self._nicks:
+                continue
+            if key == lprefix:
+                return nick, 1
+            if any(form.startswith(lprefix) for form in self._forms(key)):
+                others[key] = nick
+
+        node = self._root
+        for char in lprefix:
+            node = node.children.get(char)
+            if node is None:
+                break
+        else:
+            if node.end is not None and node.end != skip:
+                return self._nicks[node.end], 1
+        keys = node.keys if node is not None else ()
+        count = len(keys) + len(others)
+        if skip in keys:
+            count -= 1
+        if count != 1:
+            return None, count
+        for key in keys:
+            if key != skip:
+                return self._nicks[key], 1
+        for nick in others.values():
+            return nick, 1
+
+    def _forms(self, key):
+        yield key
+        stripped = key.lstrip(_NICK_PADDING)
+        if stripped and stripped != key:
+            yield stripped
+
+class User:
+    """What the bot knows about someone it shares a channel with.
+
+    The ident, host and account are kept alongside their lowercased
+    forms, and changing any of them updates the indexes of the tracker
+    the user belongs to. Item access (user["account"]) is kept working
+    for the code that still treats users as plain dicts.
+
+    """
+
+    __slots__ = ("nick", "_ident", "_host", "_account", "lident", "lhost", "laccount",
+                 "inchan", "modes", "moded", "away", "notice", "simple", "_tracker")
+
+    _fields = ("ident", "host", "account", "inchan", "modes", "moded", "away")
+
+    def __init__(self, ident, host, account="*", inchan=False, modes=(), moded=(), away=False):
+        self.nick = None
+        self._tracker = None
+        self._ident = ident
+        self._host = host
+        self._account = account
+        self.inchan = inchan
+        self.modes = set(modes)
+        self.moded = set(moded)
+        self.away = away
+        self.notice = None # cached by is_user_notice, None until looked up
+        self.simple = None # cached by is_user_simple
+        self._lower()
+
+    def _lower(self):
+        self.lident = irc_lower(self._ident)
+        self.lhost = self._host.lower() if self._host is not None else None
+        self.laccount = irc_lower(self._account)
+
+    def _change(self, attr, value):
+        tracker = self._tracker
+        if tracker is not None:
+            tracker._unindex(self)
+        setattr(self, attr, value)
+        self._lower()
+        self.notice = self.simple = None
+        if tracker is not None:
+            tracker._index(self)
+
+    @property
+    def ident(self):
+        return self._ident
+
+    @ident.setter
+    def ident(self, value):
+        self._change("_ident", value)
+
+    @property
+    def host(self):
+        return self._host
+
+    @host.setter
+    def host(self, value):
+        self._change("_host", value)
+
+    @property
+    def account(self):
+        return self._account
+
+    @account.setter
+    def account(self, value):
+        self._change("_account", value)
+
+    @property
+    def logged_in(self):
+        return self.laccount is not None and self.laccount not in ("*", "0", "")
+
+    @property
+    def hostmask(self):
+        """Return the lowercased ident@host of the user."""
+        return "{0}@{1}".format(self.lident, self.lhost)
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def keys(self):
+        return self._fields
+
+    def get(self, key, default=None):
+        if key not in self._fields:
+            return default
+        return getattr(self, key)
+
+    def __repr__(self):
+        return "User({0!r}, {1!r}, {2!r}, {3!r}, inchan={4!r})".format(
+            self.nick, self._ident, self._host, self._account, self.inchan)
+
+class UserTracker(MutableMapping):
+    """Everyone the bot knows about, keyed by nick.
+
+    Lookups are done with the server's case mapping, so that
+    users["Foo"] and users["foo"] are the same person, but iterating
+    gives back the nicks as the users spelled them. On top of that, the
+    tracker keeps a NickTrie of the nicks for completion, and
+    reverse indexes from accounts and hosts to the nicks using them.
+
+    Records can be given as User objects or as the dicts the bot used
+    to keep (see User for the keys); dicts are turned into Users.
+
+    """
+
+    def __init__(self):
+        self._users = {}    # irc_lower(nick) -> User
+        self._trie = NickTrie()
+        self._accounts = {} # lowercased account -> set of irc_lower(nick)
+        self._hosts = {}    # lowercased host -> set of irc_lower(nick)
+
+    def __getitem__(self, nick):
+        return self._users[irc_lower(nick)]
+
+    def __contains__(self, nick):
+        return nick is not None and irc_lower(nick) in self._users
+
+    def __setitem__(self, nick, user):
+        if not isinstance(user, User):
+            user = User(**user)
+        if user._tracker is not None:
+            del user._tracker[user.nick]
+        key = irc_lower(nick)
+        if key in self._users:
+            del self[self._users[key].nick]
+        user.nick = nick
+        user.notice = user.simple = None # preferences may match on the nick
+        user._tracker = self
+        self._users[key] = user
+        self._index(user)
+        self._trie.add(nick)
+
+    def __delitem__(self, nick):
+        key = irc_lower(nick)
+        user = self._users.pop(key)
+        self._unindex(user)
+        self._trie.remove(user.nick)
+        user._tracker = None
+
+    def __iter__(self):
+        return (user.nick for user in self._users.values())
+
+    def __len__(self):
+        return len(self._users)
+
+    def values(self):
+        return list(self._users.values())
+
+    def items(self):
+        return [(user.nick, user) for user in self._users.values()]
+
+    def clear(self):
+        for user in self._users.values():
+            user._tracker = None
+        self._users.clear()
+        self._trie.clear()
+        self._accounts.clear()
+        self._hosts.clear()
+
+    def forget_preferences(self):
+        """Drop the cached delivery preferences, after they changed."""
+        for user in self._users.values():
+            user.notice = user.simple = None
+
+    def nick(self, nick):
+        """Return nick as spelled by the user, or None if unknown."""
+        user = self._users.get(irc_lower(nick))
+        return user.nick if user is not None else None
+
+    def by_account(self, account):
+        """Return the nicks of the users logged in to account."""
+        keys = self._accounts.get(irc_lower(account), ())
+        return [self._users[key].nick for key in keys]
+
+    def by_host(self, host):
+        """Return the nicks of the users connecting from host."""
+        keys = self._hosts.get(host.lower(), ())
+        return [self._users[key].nick for key in keys]
+
+    def complete(self, prefix):
+        """Complete a partial nick; see NickTrie.complete()."""
+        return self._trie.complete(prefix)
+
+    def rehash(self):
+        """Rebuild the keys and indexes after the case mapping changed."""
+        users = [(user.nick, user) for user in self._users.values()]
+        self.clear()
+        for nick, user in users:
+            user._lower()
+            self[nick] = user
+
+    def _index(self, user):
+        key = irc_lower(user.nick)
+        if user.logged_in:
+            self._accounts.setdefault(user.laccount, set()).add(key)
+        if user.lhost is not None:
+            self._hosts.setdefault(user.lhost, set()).add(key)
+
+    def _unindex(self, user):
+        key = irc_lower(user.nick)
+        for index, value in ((self._accounts, user.laccount), (self._hosts, user.lhost)):
+            keys = index.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[value]
+
+# vim: set sw=4 expandtab:
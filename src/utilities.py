@@ -1,22 +1,25 @@
+import contextlib
 import fnmatch
+import functools
 import itertools
 import json
 import random
 import re
 import string
+import threading
 import traceback
 import urllib
 
 import botconfig
 import src.settings as var
-from src import proxy, debuglog
+from src import proxy, version, debuglog
 from src.events import Event
 from src.messages import messages
 
-__all__ = ["pm", "is_fake_nick", "mass_mode", "mass_privmsg", "reply",
+__all__ = ["pm", "is_fake_nick", "mass_mode", "batch_modes", "mass_privmsg", "batch_privmsg", "hold_privmsgs", "reply",
            "is_user_simple", "is_user_notice", "in_wolflist",
            "relay_wolfchat_command", "chk_nightdone", "chk_decision",
-           "chk_win", "irc_lower", "irc_equals", "is_role", "match_hostmask",
+           "chk_win", "track_idle", "irc_lower", "irc_equals", "is_role", "match_hostmask",
            "is_owner", "is_admin", "plural", "singular", "list_players",
            "list_players_and_roles", "list_participants", "get_role", "get_roles",
            "get_reveal_role", "get_templates", "role_order", "break_long_message",
@@ -28,6 +31,11 @@ def pm(cli, target, message):
         debuglog("Would message fake nick {0}: {1!r}".format(target, message))
         return
 
+    queue = getattr(_pms, "queue", None)
+    if queue is not None:
+        queue.append((target, message))
+        return
+
     if is_user_notice(target):
         cli.notice(target, message)
         return
@@ -36,33 +44,140 @@ def pm(cli, target, message):
 
 is_fake_nick = re.compile(r"^[0-9]+$").search
 
-def mass_mode(cli, md_param, md_plain):
-    """ Example: mass_mode(cli, [('+v', 'asdf'), ('-v','wobosd')], ['-m']) """
-    lmd = len(md_param)  # store how many mode changes to do
-    if md_param:
-        for start_i in range(0, lmd, var.MODELIMIT):  # 4 mode-changes at a time
-            if start_i + var.MODELIMIT > lmd:  # If this is a remainder (mode-changes < 4)
-                z = list(zip(*md_param[start_i:]))  # zip this remainder
-                ei = lmd % var.MODELIMIT  # len(z)
+# longest MODE line to send; the server adds our hostmask in front of it when relaying
+MODE_LINE_LENGTH = 400
+
+class ModeBatch:
+    """Channel mode changes waiting to be sent.
+
+    Changes are keyed by mode and target, so that queueing the same
+    change twice sends it once. A change that undoes one still waiting
+    (such as -v after +v) drops both of them, but only if what we know
+    of the modes of the target says the first one would have changed
+    anything; otherwise (+v on someone already voiced) the last one is
+    kept, so that it still gets sent.
+
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self._params = {} # (mode, target) -> "+" or "-", in the order they were queued
+        self._plain = {}  # mode -> "+" or "-"
+        self._effective = set() # keys of the queued changes known to change a mode
+
+    def add(self, change, target=None):
+        sign, mode = change[0], change[1:]
+        if target is None:
+            queue, key = self._plain, mode
+        else:
+            queue, key = self._params, (mode, target)
+        if key in queue and queue[key] != sign and key in self._effective:
+            del queue[key]
+            self._effective.discard(key)
+            return
+        queue[key] = sign
+        if target in var.USERS and mode in var.MODES_PREFIXES.values():
+            # only the prefix modes of users are kept track of
+            if (mode in var.USERS[target]["modes"]) != (sign == "+"):
+                self._effective.add(key)
             else:
-                z = list(zip(*md_param[start_i:start_i+var.MODELIMIT])) # zip four
-                ei = var.MODELIMIT # len(z)
-            # Now z equal something like [('+v', '-v'), ('asdf', 'wobosd')]
-            arg1 = "".join(md_plain) + "".join(z[0])
-            arg2 = " ".join(z[1])  # + " " + " ".join([x+"!*@*" for x in z[1]])
-            cli.mode(botconfig.CHANNEL, arg1, arg2)
-    elif md_plain:
-            cli.mode(botconfig.CHANNEL, "".join(md_plain))
+                self._effective.discard(key)
+        else:
+            self._effective.discard(key)
+
+    def __bool__(self):
+        return bool(self._params or self._plain)
+
+    def lines(self):
+        """Return the queued changes as (modes, targets) pairs, as few as the server allows."""
+        limit = var.MODELIMIT or len(self._params) or 1
+        lines = []
+        modes = "".join(sign + mode for mode, sign in self._plain.items())
+        targets = []
+        length = len(modes)
+        for (mode, target), sign in self._params.items():
+            if targets and (len(targets) >= limit or length + len(mode) + len(target) + 2 > MODE_LINE_LENGTH):
+                lines.append((modes, targets))
+                modes, targets, length = "", [], 0
+            modes += sign + mode
+            targets.append(target)
+            length += len(mode) + len(target) + 2
+        if modes:
+            lines.append((modes, targets))
+        return lines
+
+    def flush(self, cli):
+        lines = self.lines()
+        self._params.clear()
+        self._plain.clear()
+        self._effective.clear()
+        for modes, targets in lines:
+            # only write the signs where they change, the way servers echo them back
+            compact = ""
+            sign = None
+            for char in modes:
+                if char in "+-":
+                    if char != sign:
+                        compact += char
+                    sign = char
+                else:
+                    compact += char
+            cli.mode(botconfig.CHANNEL, compact, *targets)
+
+_modes = threading.local()
+
+def _mode_batch():
+    batch = getattr(_modes, "batch", None)
+    if batch is None:
+        batch = _modes.batch = ModeBatch()
+    return batch
+
+def mass_mode(cli, md_param, md_plain):
+    """ Example: mass_mode(cli, [('+v', 'asdf'), ('-v','wobosd')], ['-m'])
+
+    Inside of a function decorated with batch_modes, the changes are held
+    back until the outermost one returns, and sent along with the rest.
+
+    """
+    batch = _mode_batch()
+    for change in md_plain:
+        batch.add(change)
+    for change, target in md_param:
+        batch.add(change, target)
+    if not batch.depth:
+        batch.flush(cli)
+
+def batch_modes(func):
+    """Collect the mode changes of a state transition and send them when it's over.
+
+    The decorated function must take cli as its first argument. Calls
+    can be nested; the modes are only sent once the outermost returns.
+
+    """
+    @functools.wraps(func)
+    def wrapper(cli, *args, **kwargs):
+        batch = _mode_batch()
+        batch.depth += 1
+        try:
+            return func(cli, *args, **kwargs)
+        finally:
+            batch.depth -= 1
+            if not batch.depth and batch:
+                batch.flush(cli)
+    return wrapper
 
 def mass_privmsg(cli, targets, msg, notice=False, privmsg=False):
     if not targets:
         return
     if not notice and not privmsg:
+        queue = getattr(_pms, "queue", None)
         msg_targs = []
         not_targs = []
         for target in targets:
             if is_fake_nick(target):
                 debuglog("Would message fake nick {0}: {1!r}".format(target, msg))
+            elif queue is not None:
+                queue.append((target, msg))
             elif is_user_notice(target):
                 not_targs.append(target)
             else:
@@ -84,18 +199,63 @@ def mass_privmsg(cli, targets, msg, notice=False, privmsg=False):
                 not_targs = not_targs[var.MAX_PRIVMSG_TARGETS:]
             cli.notice(bgs, msg)
     else:
+        targets = list(targets)
         while targets:
             if len(targets) <= var.MAX_PRIVMSG_TARGETS:
                 bgs = ",".join(targets)
                 targets = None
             else:
                 bgs = ",".join(targets[:var.MAX_PRIVMSG_TARGETS])
-                target = targets[var.MAX_PRIVMSG_TARGETS:]
+                targets = targets[var.MAX_PRIVMSG_TARGETS:]
             if notice:
                 cli.notice(bgs, msg)
             else:
                 cli.msg(bgs, msg)
 
+_pms = threading.local()
+
+@contextlib.contextmanager
+def hold_privmsgs(queue):
+    """Queue what pm() and mass_privmsg() send inside of the block onto queue instead.
+
+    The (target, message) pairs are left for the caller to send, with batch_privmsg().
+    Messages sent explicitly as notices or privmsgs still go out straight away.
+
+    """
+    outer = getattr(_pms, "queue", None)
+    _pms.queue = queue
+    try:
+        yield queue
+    finally:
+        _pms.queue = outer
+
+def batch_privmsg(cli, pms):
+    """Send a list of (target, message) pairs, sharing a line between targets getting the same message.
+
+    Messages are grouped in the order they were first queued. If that would make someone receive
+    their messages out of order, everything is sent one by one instead.
+
+    """
+    groups = {} # message -> (position, targets)
+    last = {} # target -> position of the last message queued for them
+    in_order = True
+    for target, msg in pms:
+        if msg not in groups:
+            groups[msg] = (len(groups), [])
+        idx, targets = groups[msg]
+        if last.get(target, -1) > idx:
+            in_order = False
+        last[target] = idx
+        targets.append(target)
+
+    if not in_order:
+        for target, msg in pms:
+            pm(cli, target, msg)
+        return
+
+    for msg, (idx, targets) in groups.items():
+        mass_privmsg(cli, targets, msg)
+
 # Decide how to reply to a user, depending on the channel / query it was called in, and whether a game is running and they are playing
 def reply(cli, nick, chan, msg, private=False, prefix_nick=False):
     if chan == nick:
@@ -111,31 +271,39 @@ def reply(cli, nick, chan, msg, private=False, prefix_nick=False):
             cli.msg(chan, msg)
 
 def is_user_simple(nick):
-    if nick in var.USERS:
-        ident = irc_lower(var.USERS[nick]["ident"])
-        host = var.USERS[nick]["host"].lower()
-        acc = irc_lower(var.USERS[nick]["account"])
-    else:
+    user = var.USERS.get(nick)
+    if user is None:
         return False
-    if acc and acc != "*" and not var.DISABLE_ACCOUNTS:
-        if acc in var.SIMPLE_NOTIFY_ACCS:
+    if user.simple is None:
+        user.simple = _is_user_simple(user)
+    return user.simple
+
+def _is_user_simple(user):
+    if user.logged_in and not var.DISABLE_ACCOUNTS:
+        if user.laccount in var.SIMPLE_NOTIFY_ACCS:
             return True
         return False
     elif not var.ACCOUNTS_ONLY:
         for hostmask in var.SIMPLE_NOTIFY:
-            if match_hostmask(hostmask, nick, ident, host):
+            if match_hostmask(hostmask, user.nick, user.lident, user.lhost):
                 return True
     return False
 
 def is_user_notice(nick):
-    if nick in var.USERS and var.USERS[nick]["account"] and var.USERS[nick]["account"] != "*" and not var.DISABLE_ACCOUNTS:
-        if irc_lower(var.USERS[nick]["account"]) in var.PREFER_NOTICE_ACCS:
+    user = var.USERS.get(nick)
+    if user is None:
+        return False
+    if user.notice is None:
+        user.notice = _is_user_notice(user)
+    return user.notice
+
+def _is_user_notice(user):
+    if user.logged_in and not var.DISABLE_ACCOUNTS:
+        if user.laccount in var.PREFER_NOTICE_ACCS:
             return True
-    if nick in var.USERS and not var.ACCOUNTS_ONLY:
-        ident = irc_lower(var.USERS[nick]["ident"])
-        host = var.USERS[nick]["host"].lower()
+    if not var.ACCOUNTS_ONLY:
         for hostmask in var.PREFER_NOTICE:
-            if match_hostmask(hostmask, nick, ident, host):
+            if match_hostmask(hostmask, user.nick, user.lident, user.lhost):
                 return True
     return False
 
@@ -190,6 +358,10 @@ def chk_decision(cli, force=""):
 def chk_win(cli, end_game=True, winner=None):
     pass
 
+@proxy.stub
+def track_idle(cli, nick):
+    pass
+
 def irc_lower(nick):
     if nick is None:
         return None
@@ -434,30 +606,20 @@ def get_victim(cli, nick, victim, in_chan, self_in_list=False, bot_in_list=False
     if not victim:
         reply(cli, nick, chan, messages["not_enough_parameters"], private=True)
         return
-    pl = [x for x in list_players() if x != nick or self_in_list]
-    pll = [x.lower() for x in pl]
-
-    if bot_in_list: # for villagergame
-        pl.append(botconfig.NICK)
-        pll.append(botconfig.NICK.lower())
-
-    tempvictim, num_matches = complete_match(victim.lower(), pll)
+    # the trie of living players is kept up to date as they join, die and change nick
+    extra = (botconfig.NICK,) if bot_in_list else () # for villagergame
+    tempvictim, num_matches = var.PLAYER_NICKS.complete(victim, exclude=None if self_in_list else nick, extra=extra)
     if not tempvictim:
         #ensure messages about not being able to act on yourself work
-        if num_matches == 0 and nick.lower().startswith(victim.lower()):
+        if num_matches == 0 and irc_lower(nick).startswith(irc_lower(victim)):
             return nick
         reply(cli, nick, chan, messages["not_playing"].format(victim), private=True)
         return
-    return pl[pll.index(tempvictim)] #convert back to normal casing
+    return tempvictim
 
 # wrapper around complete_match() used for any nick on the channel
 def get_nick(cli, nick):
-    ul = [x for x in var.USERS]
-    ull = [x.lower() for x in var.USERS]
-    lnick, num_matches = complete_match(nick.lower(), ull)
-    if not lnick:
-        return None
-    return ul[ull.index(lnick)]
+    return var.USERS.complete(nick)[0]
 
 def pastebin_tb(cli, msg, exc):
     try:
@@ -470,7 +632,7 @@ def pastebin_tb(cli, msg, exc):
         api_url = "https://ptpb.pw/~{0}-error-{1}".format(bot_id, rand_id)
 
         req = urllib.request.Request(api_url, urllib.parse.urlencode({
-            "c": traceback.format_exc(),  # contents
+            "c": version.version_string() + "\n\n" + traceback.format_exc(),  # contents
             "s": 86400                    # expiry (seconds)
         }).encode("utf-8", "replace"))
 
@@ -0,0 +1,90 @@
+# build information, read once from the git checkout the bot runs from
+
+import os
+import platform
+
+__all__ = ["get_version", "refresh", "version_string"]
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+_version = None
+_loaded = False
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _git_dir():
+    path = os.path.join(ROOT_DIR, ".git")
+    if os.path.isfile(path):
+        # worktrees and submodules point to the real directory
+        target = _read(path)
+        if not target or not target.startswith("gitdir:"):
+            return None
+        path = os.path.join(ROOT_DIR, target[7:].strip())
+    if not os.path.isdir(path):
+        return None
+    return path
+
+def _resolve(git_dir):
+    head = _read(os.path.join(git_dir, "HEAD"))
+    if not head:
+        return None
+    if not head.startswith("ref:"):
+        return head # detached HEAD
+
+    ref = head[4:].strip()
+    # linked worktrees keep the shared refs in the main repository
+    common = _read(os.path.join(git_dir, "commondir"))
+    dirs = [git_dir]
+    if common:
+        dirs.append(os.path.join(git_dir, common))
+
+    for d in dirs:
+        sha = _read(os.path.join(d, ref))
+        if sha:
+            return sha
+    for d in dirs:
+        packed = _read(os.path.join(d, "packed-refs"))
+        if not packed:
+            continue
+        for line in packed.splitlines():
+            if line.startswith(("#", "^")):
+                continue
+            sha, _, name = line.partition(" ")
+            if name == ref:
+                return sha
+    return None
+
+def refresh():
+    """Read the current commit again, e.g. after pulling. Return the new version."""
+    global _version, _loaded
+    git_dir = _git_dir()
+    sha = _resolve(git_dir) if git_dir else None
+    _version = sha[:7] if sha else None
+    _loaded = True
+    return _version
+
+def get_version():
+    """Return the short hash of the commit the bot runs from, or None if unknown.
+
+    This never runs git; the hash is read from the .git directory once
+    and cached until refresh() is called.
+
+    """
+
+    if not _loaded:
+        refresh()
+    return _version
+
+def version_string():
+    """Return a description of the bot version, for CTCP VERSION and error reports."""
+    version = get_version()
+    if version:
+        return "lykos {0}, Python {1}".format(version, platform.python_version())
+    return "lykos, Python {0}".format(platform.python_version())
+
+# vim: set sw=4 expandtab:
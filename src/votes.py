@@ -0,0 +1,101 @@
+# lynch vote bookkeeping
+
+__all__ = ["VoteLedger"]
+
+class VoteLedger:
+    """Keeps track of who is voting for whom during the day.
+
+    Votes are stored per target in the order they were cast, alongside
+    a reverse index of what every voter is voting for, so that casting,
+    moving or retracting a vote never has to look at the other targets.
+    Read access mirrors the old dict of lists: ledger[votee] gives a
+    read-only view of the people voting for votee.
+
+    """
+
+    def __init__(self):
+        self._votes = {} # votee -> {voter: None}, used as an ordered set
+        self._voted = {} # voter -> votee
+
+    def __contains__(self, votee):
+        return votee in self._votes
+
+    def __getitem__(self, votee):
+        return self._votes[votee].keys()
+
+    def __iter__(self):
+        return iter(self._votes)
+
+    def __len__(self):
+        return len(self._votes)
+
+    def get(self, votee, default=None):
+        if votee in self._votes:
+            return self._votes[votee].keys()
+        return default
+
+    def keys(self):
+        return self._votes.keys()
+
+    def values(self):
+        return [voters.keys() for voters in self._votes.values()]
+
+    def items(self):
+        return [(votee, voters.keys()) for votee, voters in self._votes.items()]
+
+    def voters(self):
+        """Return a view of everyone currently voting."""
+        return self._voted.keys()
+
+    def vote(self, voter, votee):
+        """Move voter's vote to votee. Return False if it was already there."""
+        old = self._voted.get(voter)
+        if old == votee:
+            return False
+        if old is not None:
+            self._discard(voter, old)
+        self._votes.setdefault(votee, {})[voter] = None
+        self._voted[voter] = votee
+        return True
+
+    def retract(self, voter):
+        """Remove voter's vote, returning who they were voting for."""
+        votee = self._voted.pop(voter, None)
+        if votee is not None:
+            self._discard(voter, votee)
+        return votee
+
+    def remove_player(self, nick):
+        """Remove the votes cast by and for nick."""
+        self.retract(nick)
+        for voter in self._votes.pop(nick, ()):
+            del self._voted[voter]
+
+    def rename(self, prefix, nick):
+        votee = self._voted.pop(prefix, None)
+        if votee is not None:
+            voters = self._votes[votee]
+            # keep the position of the vote, since it is shown in !votes
+            self._votes[votee] = {(nick if v == prefix else v): None for v in voters}
+            self._voted[nick] = votee
+        if prefix in self._votes:
+            self._votes = {(nick if v == prefix else v): voters for v, voters in self._votes.items()}
+            for voter in self._votes[nick]:
+                self._voted[voter] = nick
+
+    def snapshot(self):
+        """Return a copy of the votes as a dict of lists.
+
+        Changes to the copy do not affect the ledger, which allows the
+        chk_decision event to add or remove voters freely.
+
+        """
+        return {votee: list(voters) for votee, voters in self._votes.items()}
+
+    def _discard(self, voter, votee):
+        voters = self._votes[votee]
+        del voters[voter]
+        if not voters:
+            del self._votes[votee]
+
+# vim: set sw=4 expandtab:
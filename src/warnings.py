@@ -14,12 +14,10 @@ __all__ = ["is_user_stasised", "decrement_stasis", "parse_warning_target", "add_
 def is_user_stasised(nick):
     """Checks if a user is in stasis. Returns a number of games in stasis."""
 
-    if nick in var.USERS:
-        ident = irc_lower(var.USERS[nick]["ident"])
-        host = var.USERS[nick]["host"].lower()
-        acc = irc_lower(var.USERS[nick]["account"])
-    else:
+    user = var.USERS.get(nick)
+    if user is None:
         return -1
+    ident, host, acc = user.lident, user.lhost, user.laccount
     amount = 0
     if not var.DISABLE_ACCOUNTS and acc and acc != "*":
         if acc in var.STASISED_ACCS:
@@ -31,9 +29,8 @@ def is_user_stasised(nick):
 
 def decrement_stasis(nick=None):
     if nick and nick in var.USERS:
-        ident = irc_lower(var.USERS[nick]["ident"])
-        host = var.USERS[nick]["host"].lower()
-        acc = irc_lower(var.USERS[nick]["account"])
+        user = var.USERS[nick]
+        ident, host, acc = user.lident, user.lhost, user.laccount
         # decrement account stasis even if accounts are disabled
         if acc in var.STASISED_ACCS:
             db.decrement_stasis(acc=acc)
@@ -199,11 +196,13 @@ def add_warning(cli, target, amount, actor, reason, notes=None, expires=None, sa
         for hm in hmlist:
             cmodes.append(("+b", "*!*@{0}".format(hm)))
         mass_mode(cli, cmodes, [])
-        for (nick, user) in var.USERS.items():
-            if user["account"] in acclist:
-                cli.kick(botconfig.CHANNEL, nick, messages["tempban_kick"].format(nick=nick, botnick=botconfig.NICK, reason=reason))
-            elif user["host"] in hmlist:
-                cli.kick(botconfig.CHANNEL, nick, messages["tempban_kick"].format(nick=nick, botnick=botconfig.NICK, reason=reason))
+        kicked = set()
+        for acc in acclist:
+            kicked.update(var.USERS.by_account(acc))
+        for hm in hmlist:
+            kicked.update(var.USERS.by_host(hm))
+        for nick in kicked:
+            cli.kick(botconfig.CHANNEL, nick, messages["tempban_kick"].format(nick=nick, botnick=botconfig.NICK, reason=reason))
 
     # Update any tracking vars that may have changed due to this
     db.init_vars()
@@ -228,7 +227,6 @@ def fstasis(cli, nick, chan, rest):
     msg = None
 
     if data:
-        lusers = {k.lower(): v for k, v in var.USERS.items()}
         acc, hostmask = parse_warning_target(data[0], lower=True)
         cur = max(var.STASISED[hostmask], var.STASISED_ACCS[acc])
 
@@ -21,10 +21,10 @@
 
 import copy
 import fnmatch
+import heapq
 import itertools
 import math
 import os
-import platform
 import random
 import re
 import signal
@@ -32,7 +32,6 @@ import socket
 import string
 import subprocess
 import sys
-import threading
 import time
 import traceback
 import urllib.request
@@ -45,8 +44,11 @@ import botconfig
 import src
 import src.settings as var
 from src.utilities import *
-from src import db, decorators, events, logger, proxy, debuglog, errlog, plog
+from src import db, decorators, events, logger, proxy, timers, version, debuglog, errlog, plog
 from src.messages import messages
+from src.lovers import LoverGraph
+from src.users import NickTrie, UserTracker
+from src.votes import VoteLedger
 from src.warnings import *
 
 # done this way so that events is accessible in !eval (useful for debugging)
@@ -69,7 +71,8 @@ var.LAST_TIME = None
 var.LAST_START = {}
 var.LAST_WAIT = {}
 
-var.USERS = {}
+var.USERS = UserTracker()
+var.PLAYER_NICKS = NickTrie()
 
 var.ADMIN_PINGING = False
 var.SPECIAL_ROLES = {}
@@ -78,11 +81,11 @@ var.PLAYERS = {}
 var.DCED_PLAYERS = {}
 var.ADMIN_TO_PING = None
 var.AFTER_FLASTGAME = None
-var.PINGING_IFS = False
 var.TIMERS = {}
 
 var.ORIGINAL_SETTINGS = {}
 var.CURRENT_GAMEMODE = var.GAME_MODES["default"][0]()
+var.ROLE_TABLE = var.CURRENT_GAMEMODE.ROLE_TABLE
 
 var.LAST_SAID_TIME = {}
 
@@ -172,6 +175,7 @@ def connect_callback(cli):
     def on_whoreply(cli, svr, botnick, chan, user, host, server, nick, status, rest):
         if not var.DISABLE_ACCOUNTS:
             plog("IRCd does not support accounts, disabling account-related features.")
+            var.USERS.forget_preferences()
         var.DISABLE_ACCOUNTS = True
         var.ACCOUNTS_ONLY = False
 
@@ -190,7 +194,7 @@ def connect_callback(cli):
             if not stat in var.MODES_PREFIXES:
                 continue
             newstat += var.MODES_PREFIXES[stat]
-        var.USERS[nick] = dict(ident=user,host=host,account="*",inchan=True,modes=set(newstat),moded=set())
+        var.USERS[nick] = dict(ident=user,host=host,account="*",inchan=True,modes=set(newstat),moded=set(),away="G" in status)
 
     @hook("whospcrpl", hookid=295)
     def on_whoreply(cli, server, nick, ident, host, _, user, status, acc):
@@ -208,7 +212,7 @@ def connect_callback(cli):
             if not stat in var.MODES_PREFIXES:
                 continue
             newstat += var.MODES_PREFIXES[stat]
-        var.USERS[user] = dict(ident=ident,host=host,account=acc,inchan=True,modes=set(newstat),moded=set())
+        var.USERS[user] = dict(ident=ident,host=host,account=acc,inchan=True,modes=set(newstat),moded=set(),away="G" in status)
 
     @hook("endofwho", hookid=295)
     def afterwho(*args):
@@ -318,12 +322,15 @@ def reset_settings():
         setattr(var, attr, var.ORIGINAL_SETTINGS[attr])
     var.ORIGINAL_SETTINGS.clear()
 
+@batch_modes
 def reset_modes_timers(cli):
     # Reset game timers
     with var.WARNING_LOCK: # make sure it isn't being used by the ping join handler
         for x, timr in var.TIMERS.items():
-            timr[0].cancel()
+            timr.cancel()
         var.TIMERS = {}
+        # not just those of var.GAME_ID, timers armed under an older id would still fire otherwise
+        timers.cancel_all()
 
     # Reset modes
     cmodes = []
@@ -350,6 +357,7 @@ def reset():
     var.DEAD = set()
     var.ROLES = {"person" : set()}
     var.ALL_PLAYERS = []
+    var.PLAYER_NICKS.clear()
     var.JOINED_THIS_GAME = set() # keeps track of who already joined this game at least once (hostmasks)
     var.JOINED_THIS_GAME_ACCS = set() # same, except accounts
     var.PINGED_ALREADY = set()
@@ -358,12 +366,20 @@ def reset():
     var.FGAMED = False
     var.GAMEMODE_VOTES = {} #list of players who have used !game
     var.START_VOTES = set() # list of players who have voted to !start
-    var.LOVERS = {} # need to be here for purposes of random
+    var.LOVERS = LoverGraph() # need to be here for purposes of random
+    # mode changes and deadchat joins of deaths resolved outside of a main
+    # del_player call, which are sent along with those of the next one
+    var.HELD_CMODE = []
+    var.HELD_DEADCHAT = []
     var.ENTRANCED = set()
 
     reset_settings()
 
     var.LAST_SAID_TIME.clear()
+    var.IDLE_QUEUE = []
+    var.REAPER_TIMER = None
+    var.IDLE_WARNED = set()
+    var.IDLE_WARNED_PM = set()
     var.PLAYERS.clear()
     var.DCED_PLAYERS.clear()
     var.DISCONNECTED.clear()
@@ -770,12 +786,10 @@ def altpinger(cli, nick, chan, rest):
     reply(cli, nick, chan, "\n".join(msg), private=True)
 
 def is_user_altpinged(nick):
-    if nick in var.USERS.keys():
-        ident = irc_lower(var.USERS[nick]["ident"])
-        host = var.USERS[nick]["host"].lower()
-        acc = irc_lower(var.USERS[nick]["account"])
-    else:
+    user = var.USERS.get(nick)
+    if user is None:
         return 0
+    ident, host, acc = user.lident, user.lhost, user.laccount
     if not var.DISABLE_ACCOUNTS and acc and acc != "*":
         if acc in var.PING_IF_PREFS_ACCS.keys():
             return var.PING_IF_PREFS_ACCS[acc]
@@ -787,9 +801,8 @@ def is_user_altpinged(nick):
 
 def toggle_altpinged_status(nick, value, old=None):
     # nick should be in var.USERS if not fake; if not, let the error propagate
-    ident = irc_lower(var.USERS[nick]["ident"])
-    host = var.USERS[nick]["host"].lower()
-    acc = irc_lower(var.USERS[nick]["account"])
+    user = var.USERS[nick]
+    ident, host, acc = user.lident, user.lhost, user.laccount
     if value == 0:
         if not var.DISABLE_ACCOUNTS and acc and acc != "*":
             if acc in var.PING_IF_PREFS_ACCS:
@@ -836,106 +849,59 @@ def toggle_altpinged_status(nick, value, old=None):
 @handle_error
 def join_timer_handler(cli):
     with var.WARNING_LOCK:
-        var.PINGING_IFS = True
         to_ping = []
         pl = list_players()
 
-        checker = set()
-        chk_acc = set()
-
-        # Add accounts/hosts to the list of possible players to ping
-        if not var.DISABLE_ACCOUNTS:
-            for num in var.PING_IF_NUMS_ACCS:
-                if num <= len(pl):
-                    chk_acc.update(var.PING_IF_NUMS_ACCS[num])
-
-        if not var.ACCOUNTS_ONLY:
-            for num in var.PING_IF_NUMS:
-                if num <= len(pl):
-                    checker.update(var.PING_IF_NUMS[num])
-
         # Don't ping alt connections of users that have already joined
         if not var.DISABLE_ACCOUNTS:
-            for acc in (var.USERS[player]["account"] for player in pl if player in var.USERS):
-                var.PINGED_ALREADY_ACCS.add(irc_lower(acc))
-
-        # Remove players who have already been pinged from the list of possible players to ping
-        for acc in frozenset(chk_acc):
-            if acc in var.PINGED_ALREADY_ACCS:
-                chk_acc.remove(acc)
-
-        for hostmask in frozenset(checker):
-            if hostmask in var.PINGED_ALREADY:
-                checker.remove(hostmask)
+            for player in pl:
+                if player in var.USERS:
+                    var.PINGED_ALREADY_ACCS.add(var.USERS[player].laccount)
 
-        # If there is nobody to ping, do nothing
-        if not chk_acc and not checker:
-            var.PINGING_IFS = False
-            return
-
-        @hook("whoreply", hookid=387)
-        def ping_altpingers_noacc(cli, svr, botnick, chan, ident, host, server, nick, status, rest):
-            if ("G" in status or is_user_stasised(nick) or not var.PINGING_IFS or
-                    nick == botnick or nick in pl):
-                return
+        def can_ping(user):
+            return (user.inchan and not user.away and user.nick != botconfig.NICK and
+                    user.nick not in pl and not is_user_stasised(user.nick))
 
-            ident = irc_lower(ident)
-            host = host.lower()
-            hostmask = ident + "@" + host
-            if hostmask in checker:
-                to_ping.append(nick)
-                var.PINGED_ALREADY.add(hostmask)
+        # Only the preferences at or below the player count matter; the account and host
+        # of everyone in the channel are already known from extended-join and account-notify
+        if not var.DISABLE_ACCOUNTS:
+            for num, accs in var.PING_IF_NUMS_ACCS.items():
+                if num > len(pl):
+                    continue
+                for acc in accs - var.PINGED_ALREADY_ACCS:
+                    for nick in var.USERS.by_account(acc):
+                        if can_ping(var.USERS[nick]):
+                            to_ping.append(nick)
+                            var.PINGED_ALREADY_ACCS.add(acc)
 
-        @hook("whospcrpl", hookid=387)
-        def ping_altpingers(cli, server, nick, ident, host, _, user, status, acc):
-            if ("G" in status or is_user_stasised(user) or not var.PINGING_IFS or
-                user == botconfig.NICK or user in pl):
+        if not var.ACCOUNTS_ONLY:
+            for num, hostmasks in var.PING_IF_NUMS.items():
+                if num > len(pl):
+                    continue
+                for hostmask in hostmasks - var.PINGED_ALREADY:
+                    ident, _, host = hostmask.rpartition("@")
+                    for nick in var.USERS.by_host(host):
+                        user = var.USERS[nick]
+                        # logged in users only get pinged for their account
+                        if user.logged_in and not var.DISABLE_ACCOUNTS:
+                            continue
+                        if (not ident or user.lident == ident) and can_ping(user):
+                            to_ping.append(nick)
+                            var.PINGED_ALREADY.add(hostmask)
 
-                return
+        if to_ping:
+            to_ping = sorted(set(to_ping), key=lambda x: x.lower())
 
-            # Create list of players to ping
-            acc = irc_lower(acc)
-            ident = irc_lower(ident)
-            host = host.lower()
-            if acc and acc != "*":
-                if acc in chk_acc:
-                    to_ping.append(user)
-                    var.PINGED_ALREADY_ACCS.add(acc)
-
-            elif not var.ACCOUNTS_ONLY:
-                hostmask = ident + "@" + host
-                to_ping.append(user)
-                var.PINGED_ALREADY.add(hostmask)
-
-        @hook("endofwho", hookid=387)
-        def fetch_altpingers(*stuff):
-            # fun fact: if someone joined 10 seconds after someone else, the bot would break.
-            # effectively, the join would delete join_pinger from var.TIMERS and this function
-            # here would be reached before it was created again, thus erroring and crashing.
-            # this is one of the multiple reasons we need unit testing
-            # I was lucky to catch this in testing, as it requires precise timing
-            # it only failed if a join happened while this outer func had started
-            var.PINGING_IFS = False
-            hook.unhook(387)
-            if to_ping:
-                to_ping.sort(key=lambda x: x.lower())
-
-                msg_prefix = messages["ping_player"].format(len(pl), "" if len(pl) == 1 else "s")
-                msg = msg_prefix + break_long_message(to_ping).replace("\n", "\n" + msg_prefix)
-
-                cli.msg(botconfig.CHANNEL, msg)
+            msg_prefix = messages["ping_player"].format(len(pl), "" if len(pl) == 1 else "s")
+            msg = msg_prefix + break_long_message(to_ping).replace("\n", "\n" + msg_prefix)
 
-        if not var.DISABLE_ACCOUNTS:
-            cli.who(botconfig.CHANNEL, "%uhsnfa")
-        else:
-            cli.who(botconfig.CHANNEL)
+            cli.msg(botconfig.CHANNEL, msg)
 
 def get_deadchat_pref(nick):
-    if nick in var.USERS:
-        host = var.USERS[nick]["host"].lower()
-        acc = irc_lower(var.USERS[nick]["account"])
-    else:
+    user = var.USERS.get(nick)
+    if user is None:
         return False
+    host, acc = user.lhost, user.laccount
 
     if acc in var.DEADCHAT_PREFS_ACCS:
         return False
@@ -1114,6 +1080,7 @@ def join_player(cli, player, chan, who=None, forced=False, *, sanity=True):
         mass_mode(cli, cmodes, [])
         var.ROLES["person"].add(player)
         var.ALL_PLAYERS.append(player)
+        var.PLAYER_NICKS.add(player)
         var.PHASE = "join"
         with var.WAIT_TB_LOCK:
             var.WAIT_TB_TOKENS = var.WAIT_TB_INIT
@@ -1130,10 +1097,7 @@ def join_player(cli, player, chan, who=None, forced=False, *, sanity=True):
 
         # Set join timer
         if var.JOIN_TIME_LIMIT > 0:
-            t = threading.Timer(var.JOIN_TIME_LIMIT, kill_join, [cli, chan])
-            var.TIMERS["join"] = (t, time.time(), var.JOIN_TIME_LIMIT)
-            t.daemon = True
-            t.start()
+            var.TIMERS["join"] = timers.schedule(var.JOIN_TIME_LIMIT, kill_join, cli, chan)
 
     elif player in pl:
         cli.notice(who, messages["already_playing"].format("You" if who == player else "They"))
@@ -1159,6 +1123,7 @@ def join_player(cli, player, chan, who=None, forced=False, *, sanity=True):
                     return
 
         var.ALL_PLAYERS.append(player)
+        var.PLAYER_NICKS.add(player)
         if not is_fake_nick(player) or not botconfig.DEBUG_MODE:
             if var.AUTO_TOGGLE_MODES and var.USERS[player]["modes"]:
                 for mode in var.USERS[player]["modes"]:
@@ -1200,12 +1165,9 @@ def join_player(cli, player, chan, who=None, forced=False, *, sanity=True):
 
     with var.WARNING_LOCK:
         if "join_pinger" in var.TIMERS:
-            var.TIMERS["join_pinger"][0].cancel()
+            var.TIMERS["join_pinger"].cancel()
 
-        t = threading.Timer(10, join_timer_handler, (cli,))
-        var.TIMERS["join_pinger"] = (t, time.time(), 10)
-        t.daemon = True
-        t.start()
+        var.TIMERS["join_pinger"] = timers.schedule(10, join_timer_handler, cli)
 
     return True
 
@@ -1262,16 +1224,14 @@ def fjoin(cli, nick, chan, rest):
                 continue
         if not tojoin:
             continue
-        ul = list(var.USERS.keys())
-        ull = [u.lower() for u in ul]
-        if tojoin.lower() not in ull or not var.USERS[ul[ull.index(tojoin.lower())]]["inchan"]:
+        if tojoin not in var.USERS or not var.USERS[tojoin]["inchan"]:
             if not is_fake_nick(tojoin) or not botconfig.DEBUG_MODE:
                 if not noticed:  # important
                     cli.msg(chan, nick+messages["fjoin_in_chan"])
                     noticed = True
                 continue
         if not is_fake_nick(tojoin):
-            tojoin = ul[ull.index(tojoin.lower())].strip()
+            tojoin = var.USERS.nick(tojoin).strip()
             if not botconfig.DEBUG_MODE and var.ACCOUNTS_ONLY:
                 if not var.USERS[tojoin]["account"] or var.USERS[tojoin]["account"] == "*":
                     cli.notice(nick, messages["account_not_logged_in"].format(tojoin))
@@ -1350,6 +1310,16 @@ def on_kicked(cli, nick, chan, victim, reason):
         var.USERS[victim]["modes"] = set()
         var.USERS[victim]["moded"] = set()
 
+@hook("away")
+def on_away(cli, prefix, *rest):
+    # this is both the AWAY command sent with away-notify, and the RPL_AWAY numeric
+    if len(rest) == 3:
+        nick, away = rest[1], True
+    else:
+        nick, away = parse_nick(prefix)[0], bool(rest and rest[0])
+    if nick in var.USERS:
+        var.USERS[nick].away = away
+
 @hook("account")
 def on_account(cli, rnick, acc):
     nick, _, ident, host = parse_nick(rnick)
@@ -2002,7 +1972,7 @@ def hurry_up(cli, gameid, change):
     avail = len(pl)
     votesneeded = avail // 2 + 1
     not_lynching = set(var.NO_LYNCH)
-    votelist = copy.deepcopy(var.VOTES)
+    votelist = var.VOTES.snapshot()
 
     # Note: this event can be differentiated between regular chk_decision
     # by checking evt.param.timeout. A priority 1.1 event stops event
@@ -2068,7 +2038,7 @@ def chk_decision(cli, force=""):
         votesneeded = avail // 2 + 1
         not_lynching = set(var.NO_LYNCH)
         deadlist = []
-        votelist = copy.deepcopy(var.VOTES)
+        votelist = var.VOTES.snapshot()
 
         event = Event("chk_decision", {
             "not_lynching": not_lynching,
@@ -2153,9 +2123,9 @@ def chk_decision(cli, force=""):
 
                     # this checks if any succubus have voted the current votee
                     # if it is NOT the case, then it checks if any succubus voted at all
-                    # it does so by joining together all the values from var.VOTES and casting them all into a single set
+                    # it does so by looking at everyone who is currently voting
                     # if any succubus voted for anyone else and nobody for the current votee, then proceed to block
-                    if not var.ROLES["succubus"] & set(var.VOTES[votee]) and var.ROLES["succubus"] & set(itertools.chain(*var.VOTES.values())):
+                    if not var.ROLES["succubus"] & set(var.VOTES.get(votee, ())) and var.ROLES["succubus"] & var.VOTES.voters():
                         voted_along = set()
                         for person, all_voters in var.VOTES.items():
                             if var.ROLES["succubus"] & set(all_voters):
@@ -2227,7 +2197,7 @@ def show_votes(cli, nick, chan, rest):
         if chan != nick and nick in pl:
             var.LAST_VOTES = datetime.now()
 
-        if not var.VOTES.values():
+        if not var.VOTES:
             msg = _nick + messages["no_votes"]
 
             if nick in pl:
@@ -2289,8 +2259,14 @@ def chk_traitor(cli):
                 var.TRAITOR_TURNED = True
                 cli.msg(botconfig.CHANNEL, messages["traitor_turn_channel"])
 
+@batch_modes
 def stop_game(cli, winner="", abort=False, additional_winners=None, log=True):
     chan = botconfig.CHANNEL
+    # modes held back by deaths that ended the game outside of a main del_player;
+    # their deadchat joins are moot now that the game is over
+    mass_mode(cli, var.HELD_CMODE, [])
+    del var.HELD_CMODE[:]
+    del var.HELD_DEADCHAT[:]
     if abort:
         cli.msg(chan, messages["role_attribution_failed"])
     if var.DAY_START_TIME:
@@ -2576,6 +2552,35 @@ def stop_game(cli, winner="", abort=False, additional_winners=None, log=True):
 
     return True
 
+def count_wolves():
+    """Return the players in wolfchat, along with the number of wolf cubs, real wolves and traitors.
+
+    This only needs the role sets rather than building ordered player lists with
+    list_players(). The sets are merged before counting, so that someone who is
+    briefly in two of them (while their role is being changed) counts once.
+
+    """
+    if var.RESTRICT_WOLFCHAT & var.RW_REM_NON_WOLVES:
+        if var.RESTRICT_WOLFCHAT & var.RW_TRAITOR_NON_WOLF:
+            wcroles = var.WOLF_ROLES
+        else:
+            wcroles = var.WOLF_ROLES | {"traitor"}
+    else:
+        wcroles = var.WOLFCHAT_ROLES
+    wolves = set()
+    realwolves = set()
+    for role in wcroles | var.WOLF_ROLES:
+        if role in var.TEMPLATE_RESTRICTIONS:
+            continue
+        players = var.ROLES.get(role, ())
+        if role in wcroles:
+            wolves.update(players)
+        if role in var.WOLF_ROLES and role != "wolf cub":
+            realwolves.update(players)
+    lcubs = len(var.ROLES.get("wolf cub", ()))
+    ltraitors = len(var.ROLES.get("traitor", ()))
+    return wolves, lcubs, len(realwolves), ltraitors
+
 @proxy.impl
 def chk_win(cli, end_game=True, winner=None):
     """ Returns True if someone won """
@@ -2604,20 +2609,10 @@ def chk_win(cli, end_game=True, winner=None):
         if var.PHASE not in ("day", "night"):
             return False #some other thread already ended game probably
 
-        if var.RESTRICT_WOLFCHAT & var.RW_REM_NON_WOLVES:
-            if var.RESTRICT_WOLFCHAT & var.RW_TRAITOR_NON_WOLF:
-                wcroles = var.WOLF_ROLES
-            else:
-                wcroles = var.WOLF_ROLES | {"traitor"}
-        else:
-            wcroles = var.WOLFCHAT_ROLES
-        wolves = set(list_players(wcroles))
+        wolves, lcubs, lrealwolves, ltraitors = count_wolves()
         lwolves = len(wolves)
-        lcubs = len(var.ROLES.get("wolf cub", ()))
-        lrealwolves = len(list_players(var.WOLF_ROLES - {"wolf cub"}))
         lmonsters = len(var.ROLES.get("monster", ()))
         ldemoniacs = len(var.ROLES.get("demoniac", ()))
-        ltraitors = len(var.ROLES.get("traitor", ()))
         lpipers = len(var.ROLES.get("piper", ()))
         lsuccubi = len(var.ROLES.get("succubus", ()))
         lentranced = len(var.ENTRANCED - var.DEAD)
@@ -2682,18 +2677,8 @@ def chk_win_conditions(lpl, lwolves, lcubs, lrealwolves, lmonsters, ldemoniacs,
         elif lrealwolves == 0:
             chk_traitor(cli)
             # update variables for recursive call (this shouldn't happen when checking 'random' role attribution, where it would probably fail)
-            if var.RESTRICT_WOLFCHAT & var.RW_REM_NON_WOLVES:
-                if var.RESTRICT_WOLFCHAT & var.RW_TRAITOR_NON_WOLF:
-                    wcroles = var.WOLF_ROLES
-                else:
-                    wcroles = var.WOLF_ROLES | {"traitor"}
-            else:
-                wcroles = var.WOLFCHAT_ROLES
-            wolves = set(list_players(wcroles))
+            wolves, lcubs, lrealwolves, ltraitors = count_wolves()
             lwolves = len(wolves)
-            lcubs = len(var.ROLES.get("wolf cub", ()))
-            lrealwolves = len(list_players(var.WOLF_ROLES - {"wolf cub"}))
-            ltraitors = len(var.ROLES.get("traitor", ()))
             if var.PHASE == "day":
                 pl = set(list_players()) - (var.WOUNDED | var.CONSECRATING)
                 evt = Event("get_voters", {"voters": pl})
@@ -2745,15 +2730,51 @@ def chk_win_conditions(lpl, lwolves, lcubs, lrealwolves, lmonsters, ldemoniacs,
             stop_game(cli, winner, additional_winners=event.data["additional_winners"])
         return True
 
+class DeathChain:
+    """The deaths set off by one call to del_player.
+
+    Deaths caused by the ones being resolved (lovers, assassinations,
+    the mad scientist, and whatever the del_player event adds) are
+    resolved from an explicit stack instead of by calling del_player
+    recursively, still depth first: a death is resolved up to the next
+    death it causes, which then goes first. Players are taken out of
+    the game as soon as their death is asked for, so nothing can pick
+    them again, and nobody is resolved twice.
+
+    """
+
+    def __init__(self, main, deadlist, ismain):
+        self.main = main
+        self.deadlist = deadlist
+        self.ismain = ismain
+        self.caused = [] # (nick, nickrole, nicktpls, kwargs) taken out since the last step
+        self.stack = [] # (the same, resolve_death generator) of the deaths being resolved
+        self.ret = True # what finish_death said about main
+        self.seen = set() # everyone taken out
+        self.gone = set(deadlist) # the deadlist, and everyone taken out
+        self.cmode = []
+        self.deadchat = []
+
+    def refresh_pl(self, old_pl):
+        return [p for p in old_pl if p not in self.gone]
+
+_death_chain = None
+
 @handle_error
-def del_player(cli, nick, forced_death=False, devoice=True, end_game=True, death_triggers=True, killer_role="", deadlist=[], original="", cmode=[], deadchat=[], ismain=True):
+@batch_modes
+def del_player(cli, nick, forced_death=False, devoice=True, end_game=True, death_triggers=True, killer_role="", deadlist=None, original="", ismain=True):
     """
     Returns: False if one side won.
     arg: forced_death = True when lynched
+
+    While deaths are being resolved, calls with ismain=False only take
+    the player out; the call that started the chain resolves the rest of
+    their death before going on with the one that caused it.
+    The mode changes and deadchat joins of the whole chain are sent at
+    the end, at once.
     """
 
-    def refresh_pl(old_pl):
-        return [p for p in list_players() if p in old_pl]
+    global _death_chain
 
     t = time.time()  #  time
 
@@ -2764,472 +2785,607 @@ def del_player(cli, nick, forced_death=False, devoice=True, end_game=True, death
         if not var.GAME_ID or var.GAME_ID > t:
             #  either game ended, or a new game has started.
             return False
-        ret = True
-        pl = list_players()
-        for dead in deadlist:
-            if dead in pl:
-                pl.remove(dead)
-        if nick != None and (nick == original or nick in pl):
-            nickrole = get_role(nick)
-            nicktpls = get_templates(nick)
-            var.ROLES[nickrole].remove(nick)
-            for t in nicktpls:
-                var.ROLES[t].remove(nick)
-            if nick in var.BITTEN_ROLES:
-                del var.BITTEN_ROLES[nick]
-            if nick in var.CHARMED:
-                var.CHARMED.remove(nick)
-            if nick in pl:
-                pl.remove(nick)
-            # handle roles that trigger on death
-            # clone happens regardless of death_triggers being true or not
-            if var.PHASE in var.GAME_PHASES:
-                clones = copy.copy(var.ROLES["clone"])
-                for clone in clones:
-                    if clone in var.CLONED and clone not in deadlist:
-                        target = var.CLONED[clone]
-                        if nick == target and clone in var.CLONED:
-                            # clone is cloning nick, so clone becomes nick's role
-                            # clone does NOT get any of nick's templates (gunner/assassin/etc.)
-                            del var.CLONED[clone]
-                            var.ROLES["clone"].remove(clone)
-                            if nickrole == "amnesiac":
-                                # clone gets the amnesiac's real role
-                                sayrole = var.AMNESIAC_ROLES[nick]
-                                var.FINAL_ROLES[clone] = sayrole
-                                var.ROLES[sayrole].add(clone)
+
+        kwargs = {"forced_death": forced_death, "devoice": devoice, "end_game": end_game,
+                  "death_triggers": death_triggers, "killer_role": killer_role, "original": original}
+        if not ismain and _death_chain is not None:
+            take_out(cli, _death_chain, nick, kwargs)
+            return True
+
+        outer = _death_chain
+        chain = _death_chain = DeathChain(nick, deadlist if deadlist is not None else [], ismain)
+        try:
+            take_out(cli, chain, nick, kwargs)
+            while True:
+                # the deaths caused since the last step go first, depth first like
+                # when they were resolved by calling del_player from inside of it
+                for entry in reversed(chain.caused):
+                    chain.stack.append((entry, resolve_death(cli, chain, *entry[:3], **entry[3])))
+                del chain.caused[:]
+                if not chain.stack:
+                    break
+                entry, steps = chain.stack[-1]
+                done = step_death(steps)
+                if done is None: # it raised, and was logged
+                    chain.stack.pop()
+                elif not done:
+                    chain.stack.pop()
+                    dying, nickrole, nicktpls, kw = entry
+                    ret = finish_death(cli, chain, dying, nickrole, nicktpls, kw)
+                    if dying == nick:
+                        chain.ret = ret
+        finally:
+            _death_chain = outer
+
+        return finish_deaths(cli, chain)
+
+@handle_error
+def take_out(cli, chain, nick, kwargs):
+    """Take nick out of the game straight away and queue the rest of their death on chain.
+
+    This is what a recursive call to del_player did before going on
+    with the death triggers, so that everything that runs in the
+    meantime already sees nick as dead.
+    """
+    if nick is None or nick in chain.seen:
+        return
+    if nick != kwargs["original"] and (nick not in list_players() or nick in chain.deadlist):
+        return
+    nickrole = get_role(nick)
+    nicktpls = get_templates(nick)
+    var.ROLES[nickrole].remove(nick)
+    for t in nicktpls:
+        var.ROLES[t].remove(nick)
+    var.PLAYER_NICKS.remove(nick)
+    if nick in var.BITTEN_ROLES:
+        del var.BITTEN_ROLES[nick]
+    if nick in var.CHARMED:
+        var.CHARMED.remove(nick)
+    var.LOVERS.died(nick)
+    # handle roles that trigger on death
+    # clone happens regardless of death_triggers being true or not
+    if var.PHASE in var.GAME_PHASES:
+        clones = copy.copy(var.ROLES["clone"])
+        for clone in clones:
+            if clone in var.CLONED and clone not in chain.gone:
+                target = var.CLONED[clone]
+                if nick == target and clone in var.CLONED:
+                    # clone is cloning nick, so clone becomes nick's role
+                    # clone does NOT get any of nick's templates (gunner/assassin/etc.)
+                    del var.CLONED[clone]
+                    var.ROLES["clone"].remove(clone)
+                    if nickrole == "amnesiac":
+                        # clone gets the amnesiac's real role
+                        sayrole = var.AMNESIAC_ROLES[nick]
+                        var.FINAL_ROLES[clone] = sayrole
+                        var.ROLES[sayrole].add(clone)
+                    else:
+                        var.ROLES[nickrole].add(clone)
+                        var.FINAL_ROLES[clone] = nickrole
+                        sayrole = nickrole
+                    debuglog("{0} (clone) CLONE DEAD PLAYER: {1} ({2})".format(clone, target, sayrole))
+                    if sayrole in var.HIDDEN_VILLAGERS:
+                        sayrole = "villager"
+                    elif sayrole in var.HIDDEN_ROLES:
+                        sayrole = var.DEFAULT_ROLE
+                    an = "n" if sayrole.startswith(("a", "e", "i", "o", "u")) else ""
+                    pm(cli, clone, messages["clone_turn"].format(an, sayrole))
+                    # if a clone is cloning a clone, clone who the old clone cloned
+                    if nickrole == "clone" and nick in var.CLONED:
+                        if var.CLONED[nick] == clone:
+                            pm(cli, clone, messages["forever_aclone"].format(nick))
+                        else:
+                            var.CLONED[clone] = var.CLONED[nick]
+                            pm(cli, clone, messages["clone_success"].format(var.CLONED[clone]))
+                            debuglog("{0} (clone) CLONE: {1} ({2})".format(clone, var.CLONED[clone], get_role(var.CLONED[clone])))
+                    elif nickrole in var.WOLFCHAT_ROLES:
+                        wolves = list_players(var.WOLFCHAT_ROLES)
+                        wolves.remove(clone) # remove self from list
+                        for wolf in wolves:
+                            pm(cli, wolf, messages["clone_wolf"].format(clone, nick))
+                        if var.PHASE == "day":
+                            random.shuffle(wolves)
+                            for i, wolf in enumerate(wolves):
+                                wolfrole = get_role(wolf)
+                                wevt = Event("wolflist", {"tags": set()})
+                                wevt.dispatch(cli, var, wolf, clone)
+                                tags = " ".join(wevt.data["tags"])
+                                if tags:
+                                    tags += " "
+                                wolves[i] = "\u0002{0}\u0002 ({1}{2})".format(wolf, tags, wolfrole)
+
+                            if len(wolves):
+                                pm(cli, clone, "Wolves: " + ", ".join(wolves))
                             else:
-                                var.ROLES[nickrole].add(clone)
-                                var.FINAL_ROLES[clone] = nickrole
-                                sayrole = nickrole
-                            debuglog("{0} (clone) CLONE DEAD PLAYER: {1} ({2})".format(clone, target, sayrole))
-                            if sayrole in var.HIDDEN_VILLAGERS:
-                                sayrole = "villager"
-                            elif sayrole in var.HIDDEN_ROLES:
-                                sayrole = var.DEFAULT_ROLE
-                            an = "n" if sayrole.startswith(("a", "e", "i", "o", "u")) else ""
-                            pm(cli, clone, messages["clone_turn"].format(an, sayrole))
-                            # if a clone is cloning a clone, clone who the old clone cloned
-                            if nickrole == "clone" and nick in var.CLONED:
-                                if var.CLONED[nick] == clone:
-                                    pm(cli, clone, messages["forever_aclone"].format(nick))
-                                else:
-                                    var.CLONED[clone] = var.CLONED[nick]
-                                    pm(cli, clone, messages["clone_success"].format(var.CLONED[clone]))
-                                    debuglog("{0} (clone) CLONE: {1} ({2})".format(clone, var.CLONED[clone], get_role(var.CLONED[clone])))
-                            elif nickrole in var.WOLFCHAT_ROLES:
-                                wolves = list_players(var.WOLFCHAT_ROLES)
-                                wolves.remove(clone) # remove self from list
-                                for wolf in wolves:
-                                    pm(cli, wolf, messages["clone_wolf"].format(clone, nick))
-                                if var.PHASE == "day":
-                                    random.shuffle(wolves)
-                                    for i, wolf in enumerate(wolves):
-                                        wolfrole = get_role(wolf)
-                                        wevt = Event("wolflist", {"tags": set()})
-                                        wevt.dispatch(cli, var, wolf, clone)
-                                        tags = " ".join(wevt.data["tags"])
-                                        if tags:
-                                            tags += " "
-                                        wolves[i] = "\u0002{0}\u0002 ({1}{2})".format(wolf, tags, wolfrole)
-
-                                    if len(wolves):
-                                        pm(cli, clone, "Wolves: " + ", ".join(wolves))
-                                    else:
-                                        pm(cli, clone, messages["no_other_wolves"])
-                            elif nickrole == "turncoat":
-                                var.TURNCOATS[clone] = ("none", -1)
-
-                if nickrole == "clone" and nick in var.CLONED:
-                    del var.CLONED[nick]
-
-            if death_triggers and var.PHASE in var.GAME_PHASES:
-                if nick in var.LOVERS:
-                    others = var.LOVERS[nick].copy()
-                    var.LOVERS[nick].clear()
-                    for other in others:
-                        if other not in pl:
-                            continue # already died somehow
-                        if nick not in var.LOVERS[other]:
-                            continue
-                        var.LOVERS[other].remove(nick)
+                                pm(cli, clone, messages["no_other_wolves"])
+                    elif nickrole == "turncoat":
+                        var.TURNCOATS[clone] = ("none", -1)
+
+        if nickrole == "clone" and nick in var.CLONED:
+            del var.CLONED[nick]
+    chain.caused.append((nick, nickrole, nicktpls, kwargs))
+    chain.seen.add(nick)
+    chain.gone.add(nick)
+
+def resolve_death(cli, chain, nick, nickrole, nicktpls, forced_death, devoice, end_game, death_triggers, killer_role, original):
+    """Set off what the death of nick triggers.
+
+    This is a generator, which stops after every death it causes, so
+    that del_player can resolve that one first, the way a recursive
+    call used to.
+    """
+    refresh_pl = chain.refresh_pl
+    deadlist = chain.deadlist
+    pl = [p for p in list_players() if p not in chain.gone]
+    ismain = chain.ismain and nick == chain.main
+    if death_triggers and var.PHASE in var.GAME_PHASES:
+        if nick in var.LOVERS:
+            others = list(var.LOVERS[nick])
+            var.LOVERS.clear(nick)
+            for other in others:
+                if other not in pl:
+                    continue # already died somehow
+                if nick not in var.LOVERS[other]:
+                    continue
+                var.LOVERS.discard(other, nick)
+                if var.ROLE_REVEAL in ("on", "team"):
+                    role = get_reveal_role(other)
+                    an = "n" if role.startswith(("a", "e", "i", "o", "u")) else ""
+                    message = messages["lover_suicide"].format(other, an, role)
+                else:
+                    message = messages["lover_suicide_no_reveal"].format(other)
+                cli.msg(botconfig.CHANNEL, message)
+                debuglog("{0} ({1}) LOVE SUICIDE: {2} ({3})".format(other, get_role(other), nick, nickrole))
+                del_player(cli, other, True, end_game = False, killer_role = killer_role, deadlist = deadlist, original = original, ismain = False)
+                yield # let it be resolved before going on
+                pl = refresh_pl(pl)
+        if "assassin" in nicktpls:
+            if nick in var.TARGETED:
+                target = var.TARGETED[nick]
+                del var.TARGETED[nick]
+                if target is not None and target in pl:
+                    prots = deque(var.ACTIVE_PROTECTIONS[target])
+                    aevt = Event("assassinate", {"pl": pl},
+                        del_player=del_player,
+                        deadlist=deadlist,
+                        original=original,
+                        refresh_pl=refresh_pl,
+                        message_prefix="assassin_fail_")
+                    while len(prots) > 0:
+                        # FA bypasses all protection (TODO: split off)
+                        # when split instead of setting prots to [] will need to stop_propagation but NOT prevent_default
+                        if nickrole == "fallen angel":
+                            prots = []
+                            break
+                        # an event can read the current active protection and cancel the totem
+                        # if it cancels, it is responsible for removing the protection from var.ACTIVE_PROTECTIONS
+                        # so that it cannot be used again (if the protection is meant to be usable once-only)
+                        if not aevt.dispatch(cli, var, nick, target, prots[0]):
+                            pl = aevt.data["pl"]
+                            break
+                        prots.popleft()
+                    if len(prots) == 0:
                         if var.ROLE_REVEAL in ("on", "team"):
-                            role = get_reveal_role(other)
+                            role = get_reveal_role(target)
                             an = "n" if role.startswith(("a", "e", "i", "o", "u")) else ""
-                            message = messages["lover_suicide"].format(other, an, role)
+                            message = messages["assassin_success"].format(nick, target, an, role)
                         else:
-                            message = messages["lover_suicide_no_reveal"].format(other)
+                            message = messages["assassin_success_no_reveal"].format(nick, target)
                         cli.msg(botconfig.CHANNEL, message)
-                        debuglog("{0} ({1}) LOVE SUICIDE: {2} ({3})".format(other, get_role(other), nick, nickrole))
-                        del_player(cli, other, True, end_game = False, killer_role = killer_role, deadlist = deadlist, original = original, ismain = False)
+                        debuglog("{0} ({1}) ASSASSINATE: {2} ({3})".format(nick, nickrole, target, get_role(target)))
+                        del_player(cli, target, True, end_game = False, killer_role = nickrole, deadlist = deadlist, original = original, ismain = False)
+                        yield # let it be resolved before going on
                         pl = refresh_pl(pl)
-                if "assassin" in nicktpls:
-                    if nick in var.TARGETED:
-                        target = var.TARGETED[nick]
-                        del var.TARGETED[nick]
-                        if target is not None and target in pl:
-                            prots = deque(var.ACTIVE_PROTECTIONS[target])
-                            aevt = Event("assassinate", {"pl": pl},
-                                del_player=del_player,
-                                deadlist=deadlist,
-                                original=original,
-                                refresh_pl=refresh_pl,
-                                message_prefix="assassin_fail_")
-                            while len(prots) > 0:
-                                # FA bypasses all protection (TODO: split off)
-                                # when split instead of setting prots to [] will need to stop_propagation but NOT prevent_default
-                                if nickrole == "fallen angel":
-                                    prots = []
-                                    break
-                                # an event can read the current active protection and cancel the totem
-                                # if it cancels, it is responsible for removing the protection from var.ACTIVE_PROTECTIONS
-                                # so that it cannot be used again (if the protection is meant to be usable once-only)
-                                if not aevt.dispatch(cli, var, nick, target, prots[0]):
-                                    pl = aevt.data["pl"]
-                                    break
-                                prots.popleft()
-                            if len(prots) == 0:
-                                if var.ROLE_REVEAL in ("on", "team"):
-                                    role = get_reveal_role(target)
-                                    an = "n" if role.startswith(("a", "e", "i", "o", "u")) else ""
-                                    message = messages["assassin_success"].format(nick, target, an, role)
-                                else:
-                                    message = messages["assassin_success_no_reveal"].format(nick, target)
-                                cli.msg(botconfig.CHANNEL, message)
-                                debuglog("{0} ({1}) ASSASSINATE: {2} ({3})".format(nick, nickrole, target, get_role(target)))
-                                del_player(cli, target, True, end_game = False, killer_role = nickrole, deadlist = deadlist, original = original, ismain = False)
-                                pl = refresh_pl(pl)
-                if nickrole == "time lord":
-                    if "DAY_TIME_LIMIT" not in var.ORIGINAL_SETTINGS:
-                        var.ORIGINAL_SETTINGS["DAY_TIME_LIMIT"] = var.DAY_TIME_LIMIT
-                    if "DAY_TIME_WARN" not in var.ORIGINAL_SETTINGS:
-                        var.ORIGINAL_SETTINGS["DAY_TIME_WARN"] = var.DAY_TIME_WARN
-                    if "SHORT_DAY_LIMIT" not in var.ORIGINAL_SETTINGS:
-                        var.ORIGINAL_SETTINGS["SHORT_DAY_LIMIT"] = var.SHORT_DAY_LIMIT
-                    if "SHORT_DAY_WARN" not in var.ORIGINAL_SETTINGS:
-                        var.ORIGINAL_SETTINGS["SHORT_DAY_WARN"] = var.SHORT_DAY_WARN
-                    if "NIGHT_TIME_LIMIT" not in var.ORIGINAL_SETTINGS:
-                        var.ORIGINAL_SETTINGS["NIGHT_TIME_LIMIT"] = var.NIGHT_TIME_LIMIT
-                    if "NIGHT_TIME_WARN" not in var.ORIGINAL_SETTINGS:
-                        var.ORIGINAL_SETTINGS["NIGHT_TIME_WARN"] = var.NIGHT_TIME_WARN
-                    var.DAY_TIME_LIMIT = var.TIME_LORD_DAY_LIMIT
-                    var.DAY_TIME_WARN = var.TIME_LORD_DAY_WARN
-                    var.SHORT_DAY_LIMIT = var.TIME_LORD_DAY_LIMIT
-                    var.SHORT_DAY_WARN = var.TIME_LORD_DAY_WARN
-                    var.NIGHT_TIME_LIMIT = var.TIME_LORD_NIGHT_LIMIT
-                    var.NIGHT_TIME_WARN = var.TIME_LORD_NIGHT_WARN
-                    cli.msg(botconfig.CHANNEL, messages["time_lord_dead"].format(var.TIME_LORD_DAY_LIMIT, var.TIME_LORD_NIGHT_LIMIT))
-                    if var.GAMEPHASE == "day" and timeleft_internal("day") > var.DAY_TIME_LIMIT and var.DAY_TIME_LIMIT > 0:
-                        if "day" in var.TIMERS:
-                            var.TIMERS["day"][0].cancel()
-                        t = threading.Timer(var.DAY_TIME_LIMIT, hurry_up, [cli, var.DAY_ID, True])
-                        var.TIMERS["day"] = (t, time.time(), var.DAY_TIME_LIMIT)
-                        t.daemon = True
-                        t.start()
-                        # Don't duplicate warnings, e.g. only set the warn timer if a warning was not already given
-                        if "day_warn" in var.TIMERS and var.TIMERS["day_warn"][0].isAlive():
-                            var.TIMERS["day_warn"][0].cancel()
-                            t = threading.Timer(var.DAY_TIME_WARN, hurry_up, [cli, var.DAY_ID, False])
-                            var.TIMERS["day_warn"] = (t, time.time(), var.DAY_TIME_WARN)
-                            t.daemon = True
-                            t.start()
-                    elif var.GAMEPHASE == "night" and timeleft_internal("night") > var.NIGHT_TIME_LIMIT and var.NIGHT_TIME_LIMIT > 0:
-                        if "night" in var.TIMERS:
-                            var.TIMERS["night"][0].cancel()
-                        t = threading.Timer(var.NIGHT_TIME_LIMIT, hurry_up, [cli, var.NIGHT_ID, True])
-                        var.TIMERS["night"] = (t, time.time(), var.NIGHT_TIME_LIMIT)
-                        t.daemon = True
-                        t.start()
-                        # Don't duplicate warnings, e.g. only set the warn timer if a warning was not already given
-                        if "night_warn" in var.TIMERS and var.TIMERS["night_warn"][0].isAlive():
-                            var.TIMERS["night_warn"][0].cancel()
-                            t = threading.Timer(var.NIGHT_TIME_WARN, hurry_up, [cli, var.NIGHT_ID, False])
-                            var.TIMERS["night_warn"] = (t, time.time(), var.NIGHT_TIME_WARN)
-                            t.daemon = True
-                            t.start()
-
-                    debuglog(nick, "(time lord) TRIGGER")
-                if nickrole == "wolf cub":
-                    var.ANGRY_WOLVES = True
-                if nickrole in var.WOLF_ROLES:
-                    var.ALPHA_ENABLED = True
-
-                if nickrole == "mad scientist":
-                    # kills the 2 players adjacent to them in the original players listing (in order of !joining)
-                    # if those players are already dead, nothing happens
-                    index = var.ALL_PLAYERS.index(nick)
-                    targets = []
-                    target1 = var.ALL_PLAYERS[index - 1]
-                    target2 = var.ALL_PLAYERS[index + 1 if index < len(var.ALL_PLAYERS) - 1 else 0]
-                    if len(var.ALL_PLAYERS) >= var.MAD_SCIENTIST_SKIPS_DEAD_PLAYERS:
-                        # determine left player
-                        i = index
-                        while True:
-                            i -= 1
-                            if i < 0:
-                                i = len(var.ALL_PLAYERS) - 1
-                            if var.ALL_PLAYERS[i] in pl or var.ALL_PLAYERS[i] == nick:
-                                target1 = var.ALL_PLAYERS[i]
-                                break
-                        # determine right player
-                        i = index
-                        while True:
-                            i += 1
-                            if i >= len(var.ALL_PLAYERS):
-                                i = 0
-                            if var.ALL_PLAYERS[i] in pl or var.ALL_PLAYERS[i] == nick:
-                                target2 = var.ALL_PLAYERS[i]
-                                break
+        if nickrole == "time lord":
+            if "DAY_TIME_LIMIT" not in var.ORIGINAL_SETTINGS:
+                var.ORIGINAL_SETTINGS["DAY_TIME_LIMIT"] = var.DAY_TIME_LIMIT
+            if "DAY_TIME_WARN" not in var.ORIGINAL_SETTINGS:
+                var.ORIGINAL_SETTINGS["DAY_TIME_WARN"] = var.DAY_TIME_WARN
+            if "SHORT_DAY_LIMIT" not in var.ORIGINAL_SETTINGS:
+                var.ORIGINAL_SETTINGS["SHORT_DAY_LIMIT"] = var.SHORT_DAY_LIMIT
+            if "SHORT_DAY_WARN" not in var.ORIGINAL_SETTINGS:
+                var.ORIGINAL_SETTINGS["SHORT_DAY_WARN"] = var.SHORT_DAY_WARN
+            if "NIGHT_TIME_LIMIT" not in var.ORIGINAL_SETTINGS:
+                var.ORIGINAL_SETTINGS["NIGHT_TIME_LIMIT"] = var.NIGHT_TIME_LIMIT
+            if "NIGHT_TIME_WARN" not in var.ORIGINAL_SETTINGS:
+                var.ORIGINAL_SETTINGS["NIGHT_TIME_WARN"] = var.NIGHT_TIME_WARN
+            var.DAY_TIME_LIMIT = var.TIME_LORD_DAY_LIMIT
+            var.DAY_TIME_WARN = var.TIME_LORD_DAY_WARN
+            var.SHORT_DAY_LIMIT = var.TIME_LORD_DAY_LIMIT
+            var.SHORT_DAY_WARN = var.TIME_LORD_DAY_WARN
+            var.NIGHT_TIME_LIMIT = var.TIME_LORD_NIGHT_LIMIT
+            var.NIGHT_TIME_WARN = var.TIME_LORD_NIGHT_WARN
+            cli.msg(botconfig.CHANNEL, messages["time_lord_dead"].format(var.TIME_LORD_DAY_LIMIT, var.TIME_LORD_NIGHT_LIMIT))
+            if var.GAMEPHASE == "day" and timeleft_internal("day") > var.DAY_TIME_LIMIT and var.DAY_TIME_LIMIT > 0:
+                if "day" in var.TIMERS:
+                    var.TIMERS["day"].cancel()
+                var.TIMERS["day"] = timers.schedule(var.DAY_TIME_LIMIT, hurry_up, cli, var.DAY_ID, True)
+                # Don't duplicate warnings, e.g. only set the warn timer if a warning was not already given
+                if "day_warn" in var.TIMERS and var.TIMERS["day_warn"].is_alive():
+                    var.TIMERS["day_warn"].cancel()
+                    var.TIMERS["day_warn"] = timers.schedule(var.DAY_TIME_WARN, hurry_up, cli, var.DAY_ID, False)
+            elif var.GAMEPHASE == "night" and timeleft_internal("night") > var.NIGHT_TIME_LIMIT and var.NIGHT_TIME_LIMIT > 0:
+                if "night" in var.TIMERS:
+                    var.TIMERS["night"].cancel()
+                var.TIMERS["night"] = timers.schedule(var.NIGHT_TIME_LIMIT, hurry_up, cli, var.NIGHT_ID, True)
+                # Don't duplicate warnings, e.g. only set the warn timer if a warning was not already given
+                if "night_warn" in var.TIMERS and var.TIMERS["night_warn"].is_alive():
+                    var.TIMERS["night_warn"].cancel()
+                    var.TIMERS["night_warn"] = timers.schedule(var.NIGHT_TIME_WARN, hurry_up, cli, var.NIGHT_ID, False)
+
+            debuglog(nick, "(time lord) TRIGGER")
+        if nickrole == "wolf cub":
+            var.ANGRY_WOLVES = True
+        if nickrole in var.WOLF_ROLES:
+            var.ALPHA_ENABLED = True
+
+        if nickrole == "mad scientist":
+            # kills the 2 players adjacent to them in the original players listing (in order of !joining)
+            # if those players are already dead, nothing happens
+            index = var.ALL_PLAYERS.index(nick)
+            targets = []
+            target1 = var.ALL_PLAYERS[index - 1]
+            target2 = var.ALL_PLAYERS[index + 1 if index < len(var.ALL_PLAYERS) - 1 else 0]
+            if len(var.ALL_PLAYERS) >= var.MAD_SCIENTIST_SKIPS_DEAD_PLAYERS:
+                # determine left player
+                i = index
+                while True:
+                    i -= 1
+                    if i < 0:
+                        i = len(var.ALL_PLAYERS) - 1
+                    if var.ALL_PLAYERS[i] in pl or var.ALL_PLAYERS[i] == nick:
+                        target1 = var.ALL_PLAYERS[i]
+                        break
+                # determine right player
+                i = index
+                while True:
+                    i += 1
+                    if i >= len(var.ALL_PLAYERS):
+                        i = 0
+                    if var.ALL_PLAYERS[i] in pl or var.ALL_PLAYERS[i] == nick:
+                        target2 = var.ALL_PLAYERS[i]
+                        break
 
-                    # do not kill blessed players, they had a premonition to step out of the way before the chemicals hit
-                    if target1 in var.ROLES["blessed villager"]:
-                        target1 = None
-                    if target2 in var.ROLES["blessed villager"]:
-                        target2 = None
-
-                    if target1 in pl:
-                        if target2 in pl and target1 != target2:
-                            if var.ROLE_REVEAL in ("on", "team"):
-                                r1 = get_reveal_role(target1)
-                                an1 = "n" if r1.startswith(("a", "e", "i", "o", "u")) else ""
-                                r2 = get_reveal_role(target2)
-                                an2 = "n" if r2.startswith(("a", "e", "i", "o", "u")) else ""
-                                tmsg = messages["mad_scientist_kill"].format(nick, target1, an1, r1, target2, an2, r2)
-                            else:
-                                tmsg = messages["mad_scientist_kill_no_reveal"].format(nick, target1, target2)
-                            cli.msg(botconfig.CHANNEL, tmsg)
-                            debuglog(nick, "(mad scientist) KILL: {0} ({1}) - {2} ({3})".format(target1, get_role(target1), target2, get_role(target2)))
-                            deadlist1 = copy.copy(deadlist)
-                            deadlist1.append(target2)
-                            deadlist2 = copy.copy(deadlist)
-                            deadlist2.append(target1)
-                            del_player(cli, target1, True, end_game = False, killer_role = "mad scientist", deadlist = deadlist1, original = original, ismain = False)
-                            del_player(cli, target2, True, end_game = False, killer_role = "mad scientist", deadlist = deadlist2, original = original, ismain = False)
-                            pl = refresh_pl(pl)
-                        else:
-                            if var.ROLE_REVEAL in ("on", "team"):
-                                r1 = get_reveal_role(target1)
-                                an1 = "n" if r1.startswith(("a", "e", "i", "o", "u")) else ""
-                                tmsg = messages["mad_scientist_kill_single"].format(nick, target1, an1, r1)
-                            else:
-                                tmsg = messages["mad_scientist_kill_single_no_reveal"].format(nick, target1)
-                            cli.msg(botconfig.CHANNEL, tmsg)
-                            debuglog(nick, "(mad scientist) KILL: {0} ({1})".format(target1, get_role(target1)))
-                            del_player(cli, target1, True, end_game = False, killer_role = "mad scientist", deadlist = deadlist, original = original, ismain = False)
-                            pl = refresh_pl(pl)
+            # do not kill blessed players, they had a premonition to step out of the way before the chemicals hit
+            if target1 in var.ROLES["blessed villager"]:
+                target1 = None
+            if target2 in var.ROLES["blessed villager"]:
+                target2 = None
+
+            if target1 in pl:
+                if target2 in pl and target1 != target2:
+                    if var.ROLE_REVEAL in ("on", "team"):
+                        r1 = get_reveal_role(target1)
+                        an1 = "n" if r1.startswith(("a", "e", "i", "o", "u")) else ""
+                        r2 = get_reveal_role(target2)
+                        an2 = "n" if r2.startswith(("a", "e", "i", "o", "u")) else ""
+                        tmsg = messages["mad_scientist_kill"].format(nick, target1, an1, r1, target2, an2, r2)
                     else:
-                        if target2 in pl:
-                            if var.ROLE_REVEAL in ("on", "team"):
-                                r2 = get_reveal_role(target2)
-                                an2 = "n" if r2.startswith(("a", "e", "i", "o", "u")) else ""
-                                tmsg = messages["mad_scientist_kill_single"].format(nick, target2, an2, r2)
-                            else:
-                                tmsg = messages["mad_scientist_kill_single_no_reveal"].format(nick, target2)
-                            cli.msg(botconfig.CHANNEL, tmsg)
-                            debuglog(nick, "(mad scientist) KILL: {0} ({1})".format(target2, get_role(target2)))
-                            del_player(cli, target2, True, end_game = False, killer_role = "mad scientist", deadlist = deadlist, original = original, ismain = False)
-                            pl = refresh_pl(pl)
-                        else:
-                            tmsg = messages["mad_scientist_fail"].format(nick)
-                            cli.msg(botconfig.CHANNEL, tmsg)
-                            debuglog(nick, "(mad scientist) KILL FAIL")
-
-            pl = refresh_pl(pl)
-            # i herd u liek parameters
-            evt_death_triggers = death_triggers and var.PHASE in var.GAME_PHASES
-            event = Event("del_player", {"pl": pl},
-                    forced_death=forced_death, end_game=end_game,
-                    deadlist=deadlist, original=original, killer_role=killer_role,
-                    ismain=ismain, refresh_pl=refresh_pl, del_player=del_player)
-            event.dispatch(cli, var, nick, nickrole, nicktpls, evt_death_triggers)
-
-            if devoice and (var.PHASE != "night" or not var.DEVOICE_DURING_NIGHT):
-                cmode.append(("-v", nick))
-            if nick in var.USERS:
-                host = var.USERS[nick]["host"].lower()
-                acc = irc_lower(var.USERS[nick]["account"])
-                if acc not in var.DEADCHAT_PREFS_ACCS and host not in var.DEADCHAT_PREFS:
-                    deadchat.append(nick)
-            # devoice all players that died as a result, if we are in the original del_player
-            if ismain:
-                mass_mode(cli, cmode, [])
-                del cmode[:]
-            if var.PHASE == "join":
-                if nick in var.GAMEMODE_VOTES:
-                    del var.GAMEMODE_VOTES[nick]
+                        tmsg = messages["mad_scientist_kill_no_reveal"].format(nick, target1, target2)
+                    cli.msg(botconfig.CHANNEL, tmsg)
+                    debuglog(nick, "(mad scientist) KILL: {0} ({1}) - {2} ({3})".format(target1, get_role(target1), target2, get_role(target2)))
+                    del_player(cli, target1, True, end_game = False, killer_role = "mad scientist", deadlist = deadlist, original = original, ismain = False)
+                    yield # let it be resolved before going on
+                    del_player(cli, target2, True, end_game = False, killer_role = "mad scientist", deadlist = deadlist, original = original, ismain = False)
+                    yield # let it be resolved before going on
+                    pl = refresh_pl(pl)
+                else:
+                    if var.ROLE_REVEAL in ("on", "team"):
+                        r1 = get_reveal_role(target1)
+                        an1 = "n" if r1.startswith(("a", "e", "i", "o", "u")) else ""
+                        tmsg = messages["mad_scientist_kill_single"].format(nick, target1, an1, r1)
+                    else:
+                        tmsg = messages["mad_scientist_kill_single_no_reveal"].format(nick, target1)
+                    cli.msg(botconfig.CHANNEL, tmsg)
+                    debuglog(nick, "(mad scientist) KILL: {0} ({1})".format(target1, get_role(target1)))
+                    del_player(cli, target1, True, end_game = False, killer_role = "mad scientist", deadlist = deadlist, original = original, ismain = False)
+                    yield # let it be resolved before going on
+                    pl = refresh_pl(pl)
+            else:
+                if target2 in pl:
+                    if var.ROLE_REVEAL in ("on", "team"):
+                        r2 = get_reveal_role(target2)
+                        an2 = "n" if r2.startswith(("a", "e", "i", "o", "u")) else ""
+                        tmsg = messages["mad_scientist_kill_single"].format(nick, target2, an2, r2)
+                    else:
+                        tmsg = messages["mad_scientist_kill_single_no_reveal"].format(nick, target2)
+                    cli.msg(botconfig.CHANNEL, tmsg)
+                    debuglog(nick, "(mad scientist) KILL: {0} ({1})".format(target2, get_role(target2)))
+                    del_player(cli, target2, True, end_game = False, killer_role = "mad scientist", deadlist = deadlist, original = original, ismain = False)
+                    yield # let it be resolved before going on
+                    pl = refresh_pl(pl)
+                else:
+                    tmsg = messages["mad_scientist_fail"].format(nick)
+                    cli.msg(botconfig.CHANNEL, tmsg)
+                    debuglog(nick, "(mad scientist) KILL FAIL")
+
+    pl = refresh_pl(pl)
+    # i herd u liek parameters
+    evt_death_triggers = death_triggers and var.PHASE in var.GAME_PHASES
+    event = Event("del_player", {"pl": pl},
+            forced_death=forced_death, end_game=end_game,
+            deadlist=deadlist, original=original, killer_role=killer_role,
+            ismain=ismain, refresh_pl=refresh_pl, del_player=del_player)
+    event.dispatch(cli, var, nick, nickrole, nicktpls, evt_death_triggers)
+    yield # the deaths the listeners caused
+
+    if devoice and (var.PHASE != "night" or not var.DEVOICE_DURING_NIGHT):
+        chain.cmode.append(("-v", nick))
+    if nick in var.USERS:
+        host = var.USERS[nick]["host"].lower()
+        acc = irc_lower(var.USERS[nick]["account"])
+        if acc not in var.DEADCHAT_PREFS_ACCS and host not in var.DEADCHAT_PREFS:
+            chain.deadchat.append(nick)
+    if var.PHASE != "join":
+        var.DEAD.add(nick)
 
-                with var.WARNING_LOCK:
-                    var.START_VOTES.discard(nick)
+@handle_error
+def step_death(steps):
+    """Resolve a death up to the next death it causes. Return False once it is over."""
+    try:
+        next(steps)
+    except StopIteration:
+        return False
+    return True
 
-                # Died during the joining process as a person
-                if var.AUTO_TOGGLE_MODES and nick in var.USERS and var.USERS[nick]["moded"]:
-                    for newmode in var.USERS[nick]["moded"]:
-                        cmode.append(("+"+newmode, nick))
-                    var.USERS[nick]["modes"].update(var.USERS[nick]["moded"])
-                    var.USERS[nick]["moded"] = set()
-                var.ALL_PLAYERS.remove(nick)
-                ret = not chk_win(cli)
-            else:
-                # Died during the game, so quiet!
-                if var.QUIET_DEAD_PLAYERS and not is_fake_nick(nick):
-                    cmode.append(("+{0}".format(var.QUIET_MODE), var.QUIET_PREFIX+nick+"!*@*"))
-                var.DEAD.add(nick)
-                ret = not chk_win(cli, end_game)
-            # only join to deadchat if the game isn't about to end
-            if ismain:
-                if ret:
-                    join_deadchat(cli, *deadchat)
-                del deadchat[:]
-            if var.PHASE in var.GAME_PHASES:
-                # remove the player from variables if they're in there
-                if ret:
-                    for x in (var.OBSERVED, var.HVISITED, var.TARGETED, var.LASTHEXED):
-                        for k in list(x):
-                            if nick in (k, x[k]):
-                                del x[k]
-                    if nick in var.DISCONNECTED:
-                        del var.DISCONNECTED[nick]
-                if nickrole == "succubus" and not var.ROLES["succubus"]:
-                    while var.ENTRANCED:
-                        entranced = var.ENTRANCED.pop()
-                        pm(cli, entranced, messages["entranced_revert_win"])
-                    var.ENTRANCED_DYING.clear() # for good measure
-            if var.PHASE == "night":
-                # remove players from night variables
-                # the dicts are handled above, these are the lists of who has acted which is used to determine whether night should end
-                # if these aren't cleared properly night may end prematurely
-                for x in (var.PASSED, var.HEXED, var.MATCHMAKERS, var.CURSED, var.CHARMERS):
-                    x.discard(nick)
-            if var.PHASE == "day" and not forced_death and ret:  # didn't die from lynching
-                var.VOTES.pop(nick, None)  #  Delete other people's votes on the player
-                for k in list(var.VOTES.keys()):
-                    if nick in var.VOTES[k]:
-                        var.VOTES[k].remove(nick)
-                        if not var.VOTES[k]:  # no more votes on that person
-                            del var.VOTES[k]
-                        break # can only vote once
-
-                var.NO_LYNCH.discard(nick)
-                var.WOUNDED.discard(nick)
-                var.CONSECRATING.discard(nick)
-                # note: PHASE = "day" and GAMEPHASE = "night" during transition_day;
-                # we only want to induce a lynch if it's actually day
-                if var.GAMEPHASE == "day":
-                    chk_decision(cli)
-            elif var.PHASE == "night" and ret:
-                chk_nightdone(cli)
+@handle_error
+def finish_death(cli, chain, nick, nickrole, nicktpls, kw):
+    """Check for a win and tidy up after nick died. Return False if one side won."""
+    ismain = chain.ismain and nick == chain.main
+    # devoice all players that died as a result, if we are in the original del_player
+    if ismain:
+        mass_mode(cli, var.HELD_CMODE + chain.cmode, [])
+        del var.HELD_CMODE[:]
+        del chain.cmode[:]
+    if var.PHASE == "join":
+        if nick in var.GAMEMODE_VOTES:
+            del var.GAMEMODE_VOTES[nick]
 
-        return ret
+        with var.WARNING_LOCK:
+            var.START_VOTES.discard(nick)
+
+        # Died during the joining process as a person
+        if var.AUTO_TOGGLE_MODES and nick in var.USERS and var.USERS[nick]["moded"]:
+            for newmode in var.USERS[nick]["moded"]:
+                chain.cmode.append(("+"+newmode, nick))
+            var.USERS[nick]["modes"].update(var.USERS[nick]["moded"])
+            var.USERS[nick]["moded"] = set()
+        var.ALL_PLAYERS.remove(nick)
+        ret = not chk_win(cli)
+    else:
+        # Died during the game, so quiet!
+        if var.QUIET_DEAD_PLAYERS and not is_fake_nick(nick):
+            chain.cmode.append(("+{0}".format(var.QUIET_MODE), var.QUIET_PREFIX+nick+"!*@*"))
+        ret = not chk_win(cli, kw["end_game"])
+    # only join to deadchat if the game isn't about to end
+    if ismain:
+        if ret:
+            join_deadchat(cli, *(var.HELD_DEADCHAT + chain.deadchat))
+        del var.HELD_DEADCHAT[:]
+        del chain.deadchat[:]
+    if var.PHASE in var.GAME_PHASES:
+        # remove the player from variables if they're in there
+        if ret:
+            for x in (var.OBSERVED, var.HVISITED, var.TARGETED, var.LASTHEXED):
+                for k in list(x):
+                    if nick in (k, x[k]):
+                        del x[k]
+            if nick in var.DISCONNECTED:
+                del var.DISCONNECTED[nick]
+        if nickrole == "succubus" and not var.ROLES["succubus"]:
+            while var.ENTRANCED:
+                entranced = var.ENTRANCED.pop()
+                pm(cli, entranced, messages["entranced_revert_win"])
+            var.ENTRANCED_DYING.clear() # for good measure
+    if var.PHASE == "night":
+        # remove players from night variables
+        # the dicts are handled above, these are the lists of who has acted which is used to determine whether night should end
+        # if these aren't cleared properly night may end prematurely
+        for x in (var.PASSED, var.HEXED, var.MATCHMAKERS, var.CURSED, var.CHARMERS):
+            x.discard(nick)
+    if var.PHASE == "day" and not kw["forced_death"] and ret:  # didn't die from lynching
+        var.VOTES.remove_player(nick)  #  Delete the player's vote and other people's votes on them
+
+        var.NO_LYNCH.discard(nick)
+        var.WOUNDED.discard(nick)
+        var.CONSECRATING.discard(nick)
+        # note: PHASE = "day" and GAMEPHASE = "night" during transition_day;
+        # we only want to induce a lynch if it's actually day
+        if var.GAMEPHASE == "day":
+            chk_decision(cli)
+    elif var.PHASE == "night" and ret:
+        chk_nightdone(cli)
+    return ret
+
+def finish_deaths(cli, chain):
+    """Send or hold back what is left of the modes of chain. Return what del_player should."""
+    ret = chain.ret
+    if chain.ismain:
+        # the quiets and modes given back above, unless the game just ended
+        if ret:
+            mass_mode(cli, chain.cmode, [])
+    else:
+        # leave them for the next main del_player to send
+        var.HELD_CMODE.extend(chain.cmode)
+        var.HELD_DEADCHAT.extend(chain.deadchat)
+    return ret
+
+def idle_deadline(nick):
+    """Return when nick should next be looked at by the idle checker."""
+    lst = var.LAST_SAID_TIME.get(nick, var.GAME_START_TIME)
+    if var.WARN_IDLE_TIME and nick not in var.IDLE_WARNED:
+        return lst + timedelta(seconds=var.WARN_IDLE_TIME)
+    if var.PM_WARN_IDLE_TIME and nick not in var.IDLE_WARNED_PM:
+        return lst + timedelta(seconds=var.PM_WARN_IDLE_TIME)
+    if var.KILL_IDLE_TIME:
+        return lst + timedelta(seconds=var.KILL_IDLE_TIME)
+    return None
+
+def dced_deadline(nick):
+    """Return when a disconnected player runs out of grace time."""
+    acc, hostmask, timeofdc, what = var.DISCONNECTED[nick]
+    if what in ("quit", "badnick"):
+        return timeofdc + timedelta(seconds=var.QUIT_GRACE_TIME)
+    if what == "part":
+        return timeofdc + timedelta(seconds=var.PART_GRACE_TIME)
+    if what == "account":
+        return timeofdc + timedelta(seconds=var.ACC_GRACE_TIME)
+    return None
+
+def queue_reaper(cli, deadline, nick, what):
+    # var.IDLE_QUEUE is a heap of (deadline, nick, what), where what is either "idle" or "dced"
+    # entries are only checked once their deadline comes up, so chatting does not need to touch the heap
+    if deadline is None:
+        return
+    with var.GRAVEYARD_LOCK:
+        heapq.heappush(var.IDLE_QUEUE, (deadline, nick, what))
+        if var.IDLE_QUEUE[0][1:] == (nick, what):
+            arm_reaper(cli)
+
+def arm_reaper(cli):
+    if botconfig.DEBUG_MODE and var.DISABLE_DEBUG_MODE_REAPER:
+        return
+    with var.GRAVEYARD_LOCK:
+        if var.REAPER_TIMER is not None:
+            var.REAPER_TIMER.cancel()
+            var.REAPER_TIMER = None
+        if var.IDLE_QUEUE:
+            delay = (var.IDLE_QUEUE[0][0] - datetime.now()).total_seconds()
+            var.REAPER_TIMER = timers.schedule(max(delay, 0), reaper, cli, var.GAME_ID)
+
+def queue_idlers(cli):
+    # (re)build the idle deadlines of every player, keeping pending disconnects
+    with var.GRAVEYARD_LOCK:
+        var.IDLE_QUEUE = [x for x in var.IDLE_QUEUE if x[2] != "idle"]
+        for nick in list_players():
+            if not is_fake_nick(nick):
+                deadline = idle_deadline(nick)
+                if deadline is not None:
+                    var.IDLE_QUEUE.append((deadline, nick, "idle"))
+        heapq.heapify(var.IDLE_QUEUE)
+        arm_reaper(cli)
+
+@proxy.impl
+def track_idle(cli, nick):
+    if var.PHASE in ("day", "night") and not is_fake_nick(nick):
+        queue_reaper(cli, idle_deadline(nick), nick, "idle")
 
 @handle_error
 def reaper(cli, gameid):
     # check to see if idlers need to be killed.
-    var.IDLE_WARNED    = set()
-    var.IDLE_WARNED_PM = set()
+    # run by the scheduler when the earliest deadline in var.IDLE_QUEUE is reached
     chan = botconfig.CHANNEL
 
-    last_day_id = var.DAY_COUNT
-    num_night_iters = 0
+    with var.GRAVEYARD_LOCK:
+        # Terminate reaper when game ends
+        if gameid != var.GAME_ID or var.PHASE not in ("day", "night"):
+            return
+        var.REAPER_TIMER = None
 
-    while gameid == var.GAME_ID:
-        skip = False
-        with var.GRAVEYARD_LOCK:
-            # Terminate reaper when game ends
-            if var.PHASE not in ("day", "night"):
-                return
-            if var.DEVOICE_DURING_NIGHT:
-                if var.PHASE == "night":
-                    # don't count nighttime towards idling
-                    # this doesn't do an exact count, but is good enough
-                    num_night_iters += 1
-                    skip = True
-                elif var.PHASE == "day" and var.DAY_COUNT != last_day_id:
-                    last_day_id = var.DAY_COUNT
-                    num_night_iters += 1
-                    for nick in var.LAST_SAID_TIME:
-                        var.LAST_SAID_TIME[nick] += timedelta(seconds=10*num_night_iters)
-                    num_night_iters = 0
-
-
-            if not skip and (var.WARN_IDLE_TIME or var.PM_WARN_IDLE_TIME or var.KILL_IDLE_TIME):  # only if enabled
-                to_warn    = []
-                to_warn_pm = []
-                to_kill    = []
-                for nick in list_players():
-                    if is_fake_nick(nick):
-                        continue
-                    lst = var.LAST_SAID_TIME.get(nick, var.GAME_START_TIME)
-                    tdiff = datetime.now() - lst
-                    if var.WARN_IDLE_TIME and (tdiff > timedelta(seconds=var.WARN_IDLE_TIME) and
-                                            nick not in var.IDLE_WARNED):
-                        to_warn.append(nick)
-                        var.IDLE_WARNED.add(nick)
-                        var.LAST_SAID_TIME[nick] = (datetime.now() -
-                            timedelta(seconds=var.WARN_IDLE_TIME))  # Give them a chance
-                    elif var.PM_WARN_IDLE_TIME and (tdiff > timedelta(seconds=var.PM_WARN_IDLE_TIME) and
-                                            nick not in var.IDLE_WARNED_PM):
-                        to_warn_pm.append(nick)
-                        var.IDLE_WARNED_PM.add(nick)
-                        var.LAST_SAID_TIME[nick] = (datetime.now() -
-                            timedelta(seconds=var.PM_WARN_IDLE_TIME))
-                    elif var.KILL_IDLE_TIME and (tdiff > timedelta(seconds=var.KILL_IDLE_TIME) and
-                                            (not var.WARN_IDLE_TIME or nick in var.IDLE_WARNED) and
-                                            (not var.PM_WARN_IDLE_TIME or nick in var.IDLE_WARNED_PM)):
-                        to_kill.append(nick)
-                    elif (tdiff < timedelta(seconds=var.WARN_IDLE_TIME) and
-                                            (nick in var.IDLE_WARNED or nick in var.IDLE_WARNED_PM)):
-                        var.IDLE_WARNED.discard(nick)  # player saved themselves from death
-                        var.IDLE_WARNED_PM.discard(nick)
-                for nck in to_kill:
-                    if nck not in list_players():
-                        continue
-                    if var.ROLE_REVEAL in ("on", "team"):
-                        cli.msg(chan, messages["idle_death"].format(nck, get_reveal_role(nck)))
-                    else:
-                        cli.msg(chan, (messages["idle_death_no_reveal"]).format(nck))
-                    for r,rlist in var.ORIGINAL_ROLES.items():
-                        if nck in rlist:
-                            var.ORIGINAL_ROLES[r].remove(nck)
-                            var.ORIGINAL_ROLES[r].add("(dced)"+nck)
-                    add_warning(cli, nck, var.IDLE_PENALTY, botconfig.NICK, messages["idle_warning"], expires=var.IDLE_EXPIRY)
-                    del_player(cli, nck, end_game = False, death_triggers = False)
-                chk_win(cli)
-                pl = list_players()
-                x = [a for a in to_warn if a in pl]
-                if x:
-                    cli.msg(chan, messages["channel_idle_warning"].format(", ".join(x)))
-                msg_targets = [p for p in to_warn_pm if p in pl]
-                mass_privmsg(cli, msg_targets, messages["player_idle_warning"].format(chan), privmsg=True)
-            for dcedplayer in list(var.DISCONNECTED.keys()):
-                acc, hostmask, timeofdc, what = var.DISCONNECTED[dcedplayer]
-                if what in ("quit", "badnick") and (datetime.now() - timeofdc) > timedelta(seconds=var.QUIT_GRACE_TIME):
-                    if get_role(dcedplayer) != "person" and var.ROLE_REVEAL in ("on", "team"):
-                        cli.msg(chan, messages["quit_death"].format(dcedplayer, get_reveal_role(dcedplayer)))
-                    else:
-                        cli.msg(chan, messages["quit_death_no_reveal"].format(dcedplayer))
-                    if var.PHASE != "join":
-                        add_warning(cli, dcedplayer, var.PART_PENALTY, botconfig.NICK, messages["quit_warning"], expires=var.PART_EXPIRY)
-                    if not del_player(cli, dcedplayer, devoice = False, death_triggers = False):
-                        return
-                elif what == "part" and (datetime.now() - timeofdc) > timedelta(seconds=var.PART_GRACE_TIME):
-                    if get_role(dcedplayer) != "person" and var.ROLE_REVEAL in ("on", "team"):
-                        cli.msg(chan, messages["part_death"].format(dcedplayer, get_reveal_role(dcedplayer)))
-                    else:
-                        cli.msg(chan, messages["part_death_no_reveal"].format(dcedplayer))
-                    if var.PHASE != "join":
-                        add_warning(cli, dcedplayer, var.PART_PENALTY, botconfig.NICK, messages["part_warning"], expires=var.PART_EXPIRY)
-                    if not del_player(cli, dcedplayer, devoice = False, death_triggers = False):
-                        return
-                elif what == "account" and (datetime.now() - timeofdc) > timedelta(seconds=var.ACC_GRACE_TIME):
-                    if get_role(dcedplayer) != "person" and var.ROLE_REVEAL in ("on", "team"):
-                        cli.msg(chan, messages["account_death"].format(dcedplayer, get_reveal_role(dcedplayer)))
-                    else:
-                        cli.msg(chan, messages["account_death_no_reveal"].format(dcedplayer))
-                    if var.PHASE != "join":
-                        add_warning(cli, dcedplayer, var.ACC_PENALTY, botconfig.NICK, messages["acc_warning"], expires=var.ACC_EXPIRY)
-                    if not del_player(cli, dcedplayer, devoice = False, death_triggers = False):
-                        return
-        time.sleep(10)
+        now = datetime.now()
+        pl = set(list_players())
+        to_warn    = []
+        to_warn_pm = []
+        to_kill    = []
+        to_dced    = []
+        while var.IDLE_QUEUE and var.IDLE_QUEUE[0][0] <= now:
+            _, nick, what = heapq.heappop(var.IDLE_QUEUE)
+            if what == "dced":
+                if nick in var.DISCONNECTED and nick not in to_dced:
+                    deadline = dced_deadline(nick)
+                    if deadline is not None and deadline <= now:
+                        to_dced.append(nick)
+                continue
+
+            if nick not in pl or nick in to_kill:
+                continue
+            if var.DEVOICE_DURING_NIGHT and var.PHASE == "night":
+                # don't count nighttime towards idling, transition_day queues everyone again
+                continue
+
+            tdiff = now - var.LAST_SAID_TIME.get(nick, var.GAME_START_TIME)
+            if (tdiff < timedelta(seconds=var.WARN_IDLE_TIME) and
+                    (nick in var.IDLE_WARNED or nick in var.IDLE_WARNED_PM)):
+                var.IDLE_WARNED.discard(nick)  # player saved themselves from death
+                var.IDLE_WARNED_PM.discard(nick)
+
+            deadline = idle_deadline(nick)
+            if deadline is None:
+                continue
+            if deadline <= now:
+                if var.WARN_IDLE_TIME and nick not in var.IDLE_WARNED:
+                    to_warn.append(nick)
+                    var.IDLE_WARNED.add(nick)
+                    var.LAST_SAID_TIME[nick] = (now -
+                        timedelta(seconds=var.WARN_IDLE_TIME))  # Give them a chance
+                elif var.PM_WARN_IDLE_TIME and nick not in var.IDLE_WARNED_PM:
+                    to_warn_pm.append(nick)
+                    var.IDLE_WARNED_PM.add(nick)
+                    var.LAST_SAID_TIME[nick] = (now -
+                        timedelta(seconds=var.PM_WARN_IDLE_TIME))
+                else:
+                    to_kill.append(nick)
+                    continue
+                deadline = idle_deadline(nick)
+                if deadline is None:
+                    continue
+            heapq.heappush(var.IDLE_QUEUE, (deadline, nick, "idle"))
+
+        if to_kill or to_warn or to_warn_pm:
+            for nck in to_kill:
+                if nck not in list_players():
+                    continue
+                if var.ROLE_REVEAL in ("on", "team"):
+                    cli.msg(chan, messages["idle_death"].format(nck, get_reveal_role(nck)))
+                else:
+                    cli.msg(chan, (messages["idle_death_no_reveal"]).format(nck))
+                for r,rlist in var.ORIGINAL_ROLES.items():
+                    if nck in rlist:
+                        var.ORIGINAL_ROLES[r].remove(nck)
+                        var.ORIGINAL_ROLES[r].add("(dced)"+nck)
+                add_warning(cli, nck, var.IDLE_PENALTY, botconfig.NICK, messages["idle_warning"], expires=var.IDLE_EXPIRY)
+                del_player(cli, nck, end_game = False, death_triggers = False)
+            chk_win(cli)
+            pl = list_players()
+            x = [a for a in to_warn if a in pl]
+            if x:
+                cli.msg(chan, messages["channel_idle_warning"].format(", ".join(x)))
+            msg_targets = [p for p in to_warn_pm if p in pl]
+            mass_privmsg(cli, msg_targets, messages["player_idle_warning"].format(chan), privmsg=True)
+        for dcedplayer in to_dced:
+            if dcedplayer not in var.DISCONNECTED:
+                continue
+            acc, hostmask, timeofdc, what = var.DISCONNECTED[dcedplayer]
+            if what in ("quit", "badnick"):
+                if get_role(dcedplayer) != "person" and var.ROLE_REVEAL in ("on", "team"):
+                    cli.msg(chan, messages["quit_death"].format(dcedplayer, get_reveal_role(dcedplayer)))
+                else:
+                    cli.msg(chan, messages["quit_death_no_reveal"].format(dcedplayer))
+                if var.PHASE != "join":
+                    add_warning(cli, dcedplayer, var.PART_PENALTY, botconfig.NICK, messages["quit_warning"], expires=var.PART_EXPIRY)
+                if not del_player(cli, dcedplayer, devoice = False, death_triggers = False):
+                    return
+            elif what == "part":
+                if get_role(dcedplayer) != "person" and var.ROLE_REVEAL in ("on", "team"):
+                    cli.msg(chan, messages["part_death"].format(dcedplayer, get_reveal_role(dcedplayer)))
+                else:
+                    cli.msg(chan, messages["part_death_no_reveal"].format(dcedplayer))
+                if var.PHASE != "join":
+                    add_warning(cli, dcedplayer, var.PART_PENALTY, botconfig.NICK, messages["part_warning"], expires=var.PART_EXPIRY)
+                if not del_player(cli, dcedplayer, devoice = False, death_triggers = False):
+                    return
+            elif what == "account":
+                if get_role(dcedplayer) != "person" and var.ROLE_REVEAL in ("on", "team"):
+                    cli.msg(chan, messages["account_death"].format(dcedplayer, get_reveal_role(dcedplayer)))
+                else:
+                    cli.msg(chan, messages["account_death_no_reveal"].format(dcedplayer))
+                if var.PHASE != "join":
+                    add_warning(cli, dcedplayer, var.ACC_PENALTY, botconfig.NICK, messages["acc_warning"], expires=var.ACC_EXPIRY)
+                if not del_player(cli, dcedplayer, devoice = False, death_triggers = False):
+                    return
+
+        if gameid == var.GAME_ID and var.PHASE in ("day", "night"):
+            arm_reaper(cli)
 
 
 
@@ -3240,6 +3396,8 @@ def update_last_said(cli, nick, chan, rest):
 
     if var.PHASE not in ("join", "none"):
         var.LAST_SAID_TIME[nick] = datetime.now()
+        var.IDLE_WARNED.discard(nick)
+        var.IDLE_WARNED_PM.discard(nick)
 
     fullstring = "".join(rest)
 
@@ -3254,6 +3412,7 @@ def on_join(cli, raw_nick, chan, acc="*", rname=""):
         var.USERS[nick]["ident"] = ident
         var.USERS[nick]["host"] = host
         var.USERS[nick]["account"] = acc
+        var.USERS[nick]["away"] = False # with away-notify, an AWAY follows if they still are
         if not var.USERS[nick]["inchan"]:
             # Will be True if the user joined the main channel, else False
             var.USERS[nick]["inchan"] = (chan == botconfig.CHANNEL)
@@ -3297,18 +3456,14 @@ def goat(cli, nick, chan, rest):
         cli.notice(nick, messages["goat_fail"])
         return
 
-    ul = list(var.USERS.keys())
-    ull = [x.lower() for x in ul]
-
     rest = re.split(" +",rest)[0]
     if not rest:
         cli.notice(nick, messages["not_enough_parameters"])
 
-    victim, _ = complete_match(rest.lower(), ull)
+    victim = get_nick(cli, rest)
     if not victim:
         cli.notice(nick, messages["goat_target_not_in_channel"].format(rest))
         return
-    victim = ul[ull.index(victim)]
 
     goatact = random.choice(messages["goat_actions"])
 
@@ -3321,8 +3476,7 @@ def goat(cli, nick, chan, rest):
 def fgoat(cli, nick, chan, rest):
     """Forces a goat to interact with anyone or anything, without limitations."""
     nick_ = rest.split(' ')[0].strip()
-    ul = list(var.USERS.keys())
-    if nick_.lower() in (x.lower() for x in ul):
+    if nick_ in var.USERS:
         togoat = nick_
     else:
         togoat = rest
@@ -3391,6 +3545,8 @@ def rename_player(cli, prefix, nick):
 
         # ALL_PLAYERS needs to keep its ordering for purposes of mad scientist
         var.ALL_PLAYERS[var.ALL_PLAYERS.index(prefix)] = nick
+        if prefix in var.PLAYER_NICKS:
+            var.PLAYER_NICKS.rename(prefix, nick)
 
         if var.PHASE in var.GAME_PHASES:
             for k,v in var.ORIGINAL_ROLES.items():
@@ -3417,6 +3573,8 @@ def rename_player(cli, prefix, nick):
                         c = nick
                     kvp2.append((c,d))
                 b[3].update(kvp2)
+                if prefix in b[3].keys():
+                    del b[3][prefix]
                 kvp.append((a,b))
             var.PRAYED.update(kvp)
             if prefix in var.PRAYED.keys():
@@ -3439,20 +3597,13 @@ def rename_player(cli, prefix, nick):
                 if prefix in dictvar.keys():
                     dictvar[nick] = dictvar.pop(prefix)
             # Looks like {'6': {'jacob3'}, 'jacob3': {'6'}}
-            for dictvar in (var.LOVERS, var.ORIGINAL_LOVERS):
-                kvp = []
-                for a,b in dictvar.items():
-                    nl = set()
-                    for n in b:
-                        if n == prefix:
-                            n = nick
-                        nl.add(n)
-                    if a == prefix:
-                        a = nick
-                    kvp.append((a,nl))
-                dictvar.update(kvp)
-                if prefix in dictvar.keys():
-                    del dictvar[prefix]
+            var.LOVERS.rename(prefix, nick)
+            if prefix in var.ORIGINAL_LOVERS:
+                var.ORIGINAL_LOVERS[nick] = var.ORIGINAL_LOVERS.pop(prefix)
+            for b in var.ORIGINAL_LOVERS.values():
+                if prefix in b:
+                    b.remove(prefix)
+                    b.add(nick)
             for idx, tup in enumerate(var.EXCHANGED_ROLES):
                 a, b = tup
                 if a == prefix:
@@ -3477,18 +3628,14 @@ def rename_player(cli, prefix, nick):
                 if prefix in getattr(var, "IDLE_WARNED_PM", ()):
                     var.IDLE_WARNED_PM.remove(prefix)
                     var.IDLE_WARNED_PM.add(nick)
+                track_idle(cli, nick)
 
         if var.PHASE == "day":
             for setvar in (var.WOUNDED, var.INVESTIGATED):
                 if prefix in setvar:
                     setvar.remove(prefix)
                     setvar.add(nick)
-            if prefix in var.VOTES:
-                var.VOTES[nick] = var.VOTES.pop(prefix)
-            for v in var.VOTES.values():
-                if prefix in v:
-                    v.remove(prefix)
-                    v.append(nick)
+            var.VOTES.rename(prefix, nick)
 
         if var.PHASE == "join":
             if prefix in var.GAMEMODE_VOTES:
@@ -3616,6 +3763,7 @@ def leave(cli, what, nick, why=""):
         del_player(cli, nick, death_triggers = False)
     else:
         var.DISCONNECTED[nick] = (acc, ident + "@" + host, datetime.now(), what)
+        queue_reaper(cli, dced_deadline(nick), nick, "dced")
 
 #Functions decorated with hook do not parse the nick by default
 hook("part")(lambda cli, nick, *rest: leave(cli, "part", nick, rest[0]))
@@ -3701,25 +3849,17 @@ def begin_day(cli):
     var.DAY_ID = time.time()
     if var.DAY_TIME_WARN > 0:
         if var.STARTED_DAY_PLAYERS <= var.SHORT_DAY_PLAYERS:
-            t1 = threading.Timer(var.SHORT_DAY_WARN, hurry_up, [cli, var.DAY_ID, False])
             l = var.SHORT_DAY_WARN
         else:
-            t1 = threading.Timer(var.DAY_TIME_WARN, hurry_up, [cli, var.DAY_ID, False])
             l = var.DAY_TIME_WARN
-        var.TIMERS["day_warn"] = (t1, var.DAY_ID, l)
-        t1.daemon = True
-        t1.start()
+        var.TIMERS["day_warn"] = timers.schedule(l, hurry_up, cli, var.DAY_ID, False)
 
     if var.DAY_TIME_LIMIT > 0:  # Time limit enabled
         if var.STARTED_DAY_PLAYERS <= var.SHORT_DAY_PLAYERS:
-            t2 = threading.Timer(var.SHORT_DAY_LIMIT, hurry_up, [cli, var.DAY_ID, True])
             l = var.SHORT_DAY_LIMIT
         else:
-            t2 = threading.Timer(var.DAY_TIME_LIMIT, hurry_up, [cli, var.DAY_ID, True])
             l = var.DAY_TIME_LIMIT
-        var.TIMERS["day"] = (t2, var.DAY_ID, l)
-        t2.daemon = True
-        t2.start()
+        var.TIMERS["day"] = timers.schedule(l, hurry_up, cli, var.DAY_ID, True)
 
     if var.DEVOICE_DURING_NIGHT:
         modes = []
@@ -3742,7 +3882,52 @@ def night_warn(cli, gameid):
 
     cli.msg(botconfig.CHANNEL, (messages["twilight_warning"]))
 
+class NightResult:
+    """What the night comes down to, handed from one stage of transition_day to the next.
+
+    The night is resolved in stages, each a function taking the result
+    of the ones before it:
+
+    night_actions      act on the choices players left open (random clone
+                       targets and such), and tell people what they learned
+    night_kills        collect the kills and protections through the
+                       transition_day event
+    night_protections  apply the fallen angels and alpha wolf bites to them
+    night_resolve      work out who dies, and write the sunrise announcement
+    night_bitten       turn the bitten players into wolves
+    night_emit         send every private message of the stages above and
+                       the announcement, all at once
+    night_deaths       kill off the dead; del_player announces whatever
+                       their deaths set off
+
+    Everything pm() and mass_privmsg() send during the stages before
+    night_emit is held back in pms, role modules included.
+
+    """
+
+    __slots__ = ("victims", "victims_set", "killers", "bywolves", "onlybywolves", "protected",
+                 "bitten", "numkills", "fallenkills", "brokentotem", "new_wolf",
+                 "message", "novictmsg", "dead", "pms")
+
+    def __init__(self):
+        self.victims = [] # in the order their deaths are resolved, after night_resolve
+        self.victims_set = set()
+        self.killers = defaultdict(list)
+        self.bywolves = set()
+        self.onlybywolves = set()
+        self.protected = {}
+        self.bitten = []
+        self.numkills = {} # populated at priority 3 of transition_day
+        self.fallenkills = set()
+        self.brokentotem = set()
+        self.new_wolf = False # set to True if we play chilling howl message due to a bitten person turning
+        self.message = [] # the sunrise announcement
+        self.novictmsg = True
+        self.dead = []
+        self.pms = [] # (target, message) pairs held back until night_emit
+
 @handle_error
+@batch_modes
 def transition_day(cli, gameid=0):
     if gameid:
         if gameid != var.NIGHT_ID:
@@ -3757,10 +3942,48 @@ def transition_day(cli, gameid=0):
     var.DAY_COUNT += 1
     var.FIRST_DAY = (var.DAY_COUNT == 1)
     var.DAY_START_TIME = datetime.now()
-    var.VOTES = {}
+    var.VOTES = VoteLedger()
 
-    chan = botconfig.CHANNEL
+    night = NightResult()
+    with hold_privmsgs(night.pms):
+        night_actions(cli)
+
+    if var.START_WITH_DAY and var.FIRST_DAY:
+        # TODO: need to message everyone their roles and give a short thing saying "it's daytime"
+        # but this is good enough for now to prevent it from crashing
+        batch_privmsg(cli, night.pms)
+        begin_day(cli)
+        return
 
+    td = var.DAY_START_TIME - var.NIGHT_START_TIME
+    var.NIGHT_START_TIME = None
+    var.NIGHT_TIMEDELTA += td
+    if var.DEVOICE_DURING_NIGHT:
+        # don't count nighttime towards idling
+        with var.GRAVEYARD_LOCK:
+            for nick in var.LAST_SAID_TIME:
+                var.LAST_SAID_TIME[nick] += td
+            queue_idlers(cli)
+    min, sec = td.seconds // 60, td.seconds % 60
+    night.message.append(messages["sunrise"].format(min, sec))
+
+    with hold_privmsgs(night.pms):
+        night_kills(cli, night)
+        night_protections(cli, night)
+        night_resolve(cli, night)
+        night_bitten(cli, night)
+    night_emit(cli, night)
+    night_deaths(cli, night)
+
+    event_end = Event("transition_day_end", {"begin_day": begin_day})
+    event_end.dispatch(cli, var)
+
+    if chk_win(cli):  # if after the last person is killed, one side wins, then actually end the game here
+        return
+
+    event_end.data["begin_day"](cli)
+
+def night_actions(cli):
     event_begin = Event("transition_day_begin", {})
     event_begin.dispatch(cli, var)
 
@@ -3830,7 +4053,7 @@ def transition_day(cli, gameid=0):
 
     var.CHARMED.update(var.TOBECHARMED)
     var.TOBECHARMED.clear()
-    
+
     for crow, target in iter(var.OBSERVED.items()):
         if crow not in var.ROLES["werecrow"]:
             continue
@@ -3843,17 +4066,7 @@ def transition_day(cli, gameid=0):
         else:
             pm(cli, crow, messages["werecrow_failure"].format(target))
 
-    if var.START_WITH_DAY and var.FIRST_DAY:
-        # TODO: need to message everyone their roles and give a short thing saying "it's daytime"
-        # but this is good enough for now to prevent it from crashing
-        begin_day(cli)
-        return
-
-    td = var.DAY_START_TIME - var.NIGHT_START_TIME
-    var.NIGHT_START_TIME = None
-    var.NIGHT_TIMEDELTA += td
-    min, sec = td.seconds // 60, td.seconds % 60
-
+def night_kills(cli, night):
     # this keeps track of the protections active on each nick, stored in var since del_player needs to access it for sake of assassin
     var.ACTIVE_PROTECTIONS = defaultdict(list)
 
@@ -3868,48 +4081,49 @@ def transition_day(cli, gameid=0):
     #     fixing killers dict priority again (in case step 4 or 5 added to it)
     # Actually killing off the victims happens in transition_day_resolve
     evt = Event("transition_day", {
-        "victims": [],
-        "killers": defaultdict(list),
-        "bywolves": set(),
-        "onlybywolves": set(),
-        "protected": {},
-        "bitten": [],
-        "numkills": {} # populated at priority 3
+        "victims": night.victims,
+        "killers": night.killers,
+        "bywolves": night.bywolves,
+        "onlybywolves": night.onlybywolves,
+        "protected": night.protected,
+        "bitten": night.bitten,
+        "numkills": night.numkills
         })
     evt.dispatch(cli, var)
-    victims = evt.data["victims"]
-    killers = evt.data["killers"]
-    bywolves = evt.data["bywolves"]
-    onlybywolves = evt.data["onlybywolves"]
-    protected = evt.data["protected"]
-    bitten = evt.data["bitten"]
-    numkills = evt.data["numkills"]
+    night.victims = evt.data["victims"]
+    night.killers = evt.data["killers"]
+    night.bywolves = evt.data["bywolves"]
+    night.onlybywolves = evt.data["onlybywolves"]
+    night.protected = evt.data["protected"]
+    night.bitten = evt.data["bitten"]
+    night.numkills = evt.data["numkills"]
 
     for v in var.ENTRANCED_DYING:
         var.DYING.add(v)
 
     for player in var.DYING:
-        victims.append(player)
-        onlybywolves.discard(player)
+        night.victims.append(player)
+        night.onlybywolves.discard(player)
 
     # remove duplicates
-    victims_set = set(victims)
-    vappend = []
+    night.victims_set = set(night.victims)
 
     # Logic out stacked kills and protections. If we get down to 1 kill remaining that is valid and the victim is in bywolves,
     # we re-add them to onlybywolves to indicate that the other kill attempts were guarded against (and the wolf kill is what went through)
     # If protections >= kills, we keep track of which protection message to show (prot totem > GA > bodyguard > blessing)
     # TODO: split out adding people back to onlybywolves as part of splitting off FA
-    pl = list_players()
-    for v in pl:
-        if v in victims_set:
+    for v in list_players():
+        if v in night.victims_set:
             if v in var.DYING:
                 continue # dying by themselves, not killed by wolves
-            if numkills[v] == 1 and v in bywolves:
-                onlybywolves.add(v)
+            if night.numkills[v] == 1 and v in night.bywolves:
+                night.onlybywolves.add(v)
+
+def night_protections(cli, night):
+    victims, victims_set = night.victims, night.victims_set
+    killers, protected = night.killers, night.protected
+    bywolves, onlybywolves = night.bywolves, night.onlybywolves
 
-    fallenkills = set()
-    brokentotem = set()
     from src.roles.shaman import havetotem
     from src.roles import angel
     if len(var.ROLES["fallen angel"]) > 0:
@@ -3921,7 +4135,7 @@ def transition_day(cli, gameid=0):
                             del protected[g]
                         bywolves.add(g)
                         victims.append(g)
-                        fallenkills.add(g)
+                        night.fallenkills.add(g)
                         if g not in victims_set:
                             victims_set.add(g)
                             onlybywolves.add(g)
@@ -3931,7 +4145,7 @@ def transition_day(cli, gameid=0):
                             del protected[g]
                         bywolves.add(g)
                         victims.append(g)
-                        fallenkills.add(g)
+                        night.fallenkills.add(g)
                         if g not in victims_set:
                             victims_set.add(g)
                             onlybywolves.add(g)
@@ -3939,7 +4153,7 @@ def transition_day(cli, gameid=0):
                 # story-wise it gets demolished at night by the FA
                 while p in havetotem:
                     havetotem.remove(p)
-                    brokentotem.add(p)
+                    night.brokentotem.add(p)
                 if p in protected:
                     del protected[p]
                 if p in var.ACTIVE_PROTECTIONS:
@@ -3948,8 +4162,6 @@ def transition_day(cli, gameid=0):
                 # this is important as there may otherwise be no killers if every kill was blocked
                 killers[p].append(random.choice(list(var.ROLES["fallen angel"])))
 
-    # set to True if we play chilling howl message due to a bitten person turning
-    new_wolf = False
     if var.ALPHA_ENABLED: # check for bites
         for (alpha, target) in var.BITE_PREFERENCES.items():
             # bite is now separate but some people may try to double up still, if bitten person is
@@ -3999,8 +4211,8 @@ def transition_day(cli, gameid=0):
                 victims_set.add(target)
                 bywolves.add(target)
             elif got_bit:
-                new_wolf = True
-                bitten.append(target)
+                night.new_wolf = True
+                night.bitten.append(target)
             else:
                 # bite failed due to some other reason (namely harlot)
                 var.ALPHA_WOLVES.remove(alpha)
@@ -4012,7 +4224,14 @@ def transition_day(cli, gameid=0):
 
 
     var.BITE_PREFERENCES = {}
+
+def night_resolve(cli, night):
+    victims_set = night.victims_set
+    bywolves = night.bywolves
+
+    from src.roles import angel
     victims = []
+    vappend = []
     # Ensures that special events play for bodyguard and harlot-visiting-victim so that kill can
     # be correctly attributed to wolves (for vengeful ghost lover), and that any gunner events
     # can play. Harlot visiting wolf doesn't play special events if they die via other means since
@@ -4045,12 +4264,13 @@ def transition_day(cli, gameid=0):
             elif v in var.ROLES["harlot"] and var.HVISITED.get(v) not in vappend:
                 vappend.remove(v)
                 victims.append(v)
+    night.victims = victims
 
     # If FA is killing through a guard, let them as well as the victim know so they don't
     # try to report the extra kills as a bug
     fallenmsg = set()
     if len(var.ROLES["fallen angel"]) > 0:
-        for v in fallenkills:
+        for v in night.fallenkills:
             t = angel.GUARDED.get(v)
             if v not in fallenmsg:
                 fallenmsg.add(v)
@@ -4064,7 +4284,7 @@ def transition_day(cli, gameid=0):
         # Also message GAs that don't die and their victims
         for g in var.ROLES["guardian angel"]:
             v = angel.GUARDED.get(g)
-            if v in bywolves and g not in fallenkills:
+            if v in bywolves and g not in night.fallenkills:
                 if g not in fallenmsg:
                     fallenmsg.add(g)
                     if g != v:
@@ -4094,30 +4314,26 @@ def transition_day(cli, gameid=0):
                 var.TARGETED[ass] = target
                 pm(cli, ass, messages["assassin_random"].format(target))
 
-    message = [messages["sunrise"].format(min, sec)]
-
     # This needs to go down here since having them be their night value matters above
     var.ANGRY_WOLVES = False
     var.DISEASED_WOLVES = False
     var.ALPHA_ENABLED = False
 
-    dead = []
     vlist = copy.copy(victims)
-    novictmsg = True
-    if new_wolf:
-        message.append(messages["new_wolf"])
+    if night.new_wolf:
+        night.message.append(messages["new_wolf"])
         var.EXTRA_WOLVES += 1
-        novictmsg = False
+        night.novictmsg = False
 
     revt = Event("transition_day_resolve", {
-        "message": message,
-        "novictmsg": novictmsg,
-        "dead": dead,
+        "message": night.message,
+        "novictmsg": night.novictmsg,
+        "dead": night.dead,
         "bywolves": bywolves,
-        "onlybywolves": onlybywolves,
-        "killers": killers,
-        "protected": protected,
-        "bitten": bitten
+        "onlybywolves": night.onlybywolves,
+        "killers": night.killers,
+        "protected": night.protected,
+        "bitten": night.bitten
         })
     # transition_day_resolve priorities:
     # 1: target not home
@@ -4203,14 +4419,14 @@ def transition_day(cli, gameid=0):
         "bitten": revt.data["bitten"]
         })
     revt2.dispatch(cli, var, victims)
-    message = revt2.data["message"]
-    novictmsg = revt2.data["novictmsg"]
-    dead = revt2.data["dead"]
-    bywolves = revt2.data["bywolves"]
-    onlybywolves = revt2.data["onlybywolves"]
-    killers = revt2.data["killers"]
-    protected = revt2.data["protected"]
-    bitten = revt2.data["bitten"]
+    night.message = message = revt2.data["message"]
+    night.novictmsg = revt2.data["novictmsg"]
+    night.dead = dead = revt2.data["dead"]
+    night.bywolves = bywolves = revt2.data["bywolves"]
+    night.onlybywolves = onlybywolves = revt2.data["onlybywolves"]
+    night.killers = revt2.data["killers"]
+    night.protected = revt2.data["protected"]
+    night.bitten = bitten = revt2.data["bitten"]
     # handle separately so it always happens no matter how victim dies, and so that we can account for bitten victims as well
     for victim in victims + bitten:
         if victim in dead and victim in var.HVISITED.values() and (victim in bywolves or victim in bitten):  #  victim was visited by some harlot and victim was attacked by wolves
@@ -4224,7 +4440,7 @@ def transition_day(cli, gameid=0):
                     onlybywolves.add(hlt)
                     dead.append(hlt)
 
-    if novictmsg and len(dead) == 0:
+    if night.novictmsg and len(dead) == 0:
         message.append(random.choice(messages["no_victims"]) + messages["no_victims_append"])
 
     for harlot in var.ROLES["harlot"]:
@@ -4275,13 +4491,12 @@ def transition_day(cli, gameid=0):
                 pass # no wolves to give gun to (they were all killed during night or something)
             var.GUNNERS[victim] = 0  # just in case
 
-    cli.msg(chan, "\n".join(message))
-
-    for chump in bitten:
+def night_bitten(cli, night):
+    for chump in night.bitten:
         # turn all bitten people into wolves
         # short-circuit if they are already a wolf or are dying
         chumprole = get_role(chump)
-        if chump in dead or chumprole in var.WOLF_ROLES:
+        if chump in night.dead or chumprole in var.WOLF_ROLES:
             continue
 
         newrole = "wolf"
@@ -4311,10 +4526,18 @@ def transition_day(cli, gameid=0):
         var.FINAL_ROLES[chump] = newrole
         relay_wolfchat_command(cli, chump, messages["wolfchat_new_member"].format(chump, newrole), var.WOLF_ROLES, is_wolf_command=True, is_kill_command=True)
 
+def night_emit(cli, night):
+    for brokentotem in night.brokentotem:
+        night.message.append(messages["totem_broken"].format(brokentotem))
+    # targets getting the same message share a line
+    batch_privmsg(cli, night.pms)
+    cli.msg(botconfig.CHANNEL, "\n".join(night.message))
+
+def night_deaths(cli, night):
     killer_role = {}
-    for deadperson in dead:
-        if deadperson in killers:
-            killer = killers[deadperson][0]
+    for deadperson in night.dead:
+        if deadperson in night.killers:
+            killer = night.killers[deadperson][0]
             if killer == "@wolves":
                 killer_role[deadperson] = "wolf"
             else:
@@ -4323,24 +4546,11 @@ def transition_day(cli, gameid=0):
             # no killers, so assume suicide
             killer_role[deadperson] = get_role(deadperson)
 
-    for deadperson in dead:
+    for deadperson in night.dead:
         # check if they have already been killed since del_player could do chain reactions and we want
         # to avoid sending duplicate messages.
         if deadperson in list_players():
-            del_player(cli, deadperson, end_game=False, killer_role=killer_role[deadperson], deadlist=dead, original=deadperson)
-
-    message = []
-    for brokentotem in brokentotem:
-        message.append(messages["totem_broken"].format(brokentotem))
-    cli.msg(chan, "\n".join(message))
-
-    event_end = Event("transition_day_end", {"begin_day": begin_day})
-    event_end.dispatch(cli, var)
-
-    if chk_win(cli):  # if after the last person is killed, one side wins, then actually end the game here
-        return
-
-    event_end.data["begin_day"](cli)
+            del_player(cli, deadperson, end_game=False, killer_role=killer_role[deadperson], deadlist=night.dead, original=deadperson)
 
 @proxy.impl
 def chk_nightdone(cli):
@@ -4396,7 +4606,7 @@ def chk_nightdone(cli):
                     return
 
         for x, t in var.TIMERS.items():
-            t[0].cancel()
+            t.cancel()
 
         var.TIMERS = {}
         if var.PHASE == "night":  # Double check
@@ -4424,12 +4634,7 @@ def no_lynch(cli, nick, chan, rest):
         elif nick in var.CONSECRATING:
             pm(cli, nick, messages["consecrating_no_vote"])
             return
-        candidates = var.VOTES.keys()
-        for voter in list(candidates):
-            if nick in var.VOTES[voter]:
-                var.VOTES[voter].remove(nick)
-                if not var.VOTES[voter]:
-                    del var.VOTES[voter]
+        var.VOTES.retract(nick)
         var.NO_LYNCH.add(nick)
         cli.msg(chan, messages["player_abstain"].format(nick))
 
@@ -4477,20 +4682,7 @@ def lynch(cli, nick, chan, rest):
 
     var.NO_LYNCH.discard(nick)
 
-    lcandidates = list(var.VOTES.keys())
-    for voters in lcandidates:  # remove previous vote
-        if voters == voted and nick in var.VOTES[voters]:
-            break
-        if nick in var.VOTES[voters]:
-            var.VOTES[voters].remove(nick)
-            if not var.VOTES.get(voters) and voters != voted:
-                del var.VOTES[voters]
-            break
-
-    if voted not in var.VOTES.keys():
-        var.VOTES[voted] = []
-    if nick not in var.VOTES[voted]:
-        var.VOTES[voted].append(nick)
+    if var.VOTES.vote(nick, voted): # also removes any previous vote
         cli.msg(chan, (messages["player_vote"]).format(nick, voted))
 
     var.LAST_VOTES = None # reset
@@ -4753,7 +4945,7 @@ def retract(cli, nick, chan, rest):
                     cli.msg(chan, messages["start_retract"].format(nick))
 
                     if len(var.START_VOTES) < 1:
-                        var.TIMERS['start_votes'][0].cancel()
+                        var.TIMERS['start_votes'].cancel()
                         del var.TIMERS['start_votes']
             return
 
@@ -4765,15 +4957,9 @@ def retract(cli, nick, chan, rest):
         var.LAST_VOTES = None # reset
         return
 
-    candidates = var.VOTES.keys()
-    for voter in list(candidates):
-        if nick in var.VOTES[voter]:
-            var.VOTES[voter].remove(nick)
-            if not var.VOTES[voter]:
-                del var.VOTES[voter]
-            cli.msg(chan, messages["retracted_vote"].format(nick))
-            var.LAST_VOTES = None # reset
-            break
+    if var.VOTES.retract(nick) is not None:
+        cli.msg(chan, messages["retracted_vote"].format(nick))
+        var.LAST_VOTES = None # reset
     else:
         cli.notice(nick, messages["pending_vote"])
 
@@ -4843,13 +5029,7 @@ def shoot(cli, nick, chan, rest):
         else:
             cli.msg(chan, messages["gunner_victim_injured"].format(victim))
             var.WOUNDED.add(victim)
-            lcandidates = list(var.VOTES.keys())
-            for cand in lcandidates:  # remove previous vote
-                if victim in var.VOTES[cand]:
-                    var.VOTES[cand].remove(victim)
-                    if not var.VOTES.get(cand):
-                        del var.VOTES[cand]
-                    break
+            var.VOTES.retract(victim) # remove previous vote
             chk_decision(cli)
             chk_win(cli)
     elif rand <= chances[0] + chances[1]:
@@ -5336,18 +5516,15 @@ def choose(cli, nick, chan, rest, sendmsg=True):
         return
 
     var.MATCHMAKERS.add(nick)
-    if victim in var.LOVERS:
-        var.LOVERS[victim].add(victim2)
+    var.LOVERS.link(victim, victim2)
+    if victim in var.ORIGINAL_LOVERS:
         var.ORIGINAL_LOVERS[victim].add(victim2)
     else:
-        var.LOVERS[victim] = {victim2}
         var.ORIGINAL_LOVERS[victim] = {victim2}
 
-    if victim2 in var.LOVERS:
-        var.LOVERS[victim2].add(victim)
+    if victim2 in var.ORIGINAL_LOVERS:
         var.ORIGINAL_LOVERS[victim2].add(victim)
     else:
-        var.LOVERS[victim2] = {victim}
         var.ORIGINAL_LOVERS[victim2] = {victim}
 
     if sendmsg:
@@ -5655,9 +5832,9 @@ def getfeatures(cli, nick, *rest):
         if r.startswith("CHANMODES="):
             chans = r[10:].split(",")
             var.LISTMODES, var.MODES_ALLSET, var.MODES_ONLYSET, var.MODES_NOSET = chans
-        if r.startswith("MODES="):
+        if r == "MODES" or r.startswith("MODES="):
             try:
-                var.MODELIMIT = int(r[6:])
+                var.MODELIMIT = int(r[6:]) if r[6:] else None # no value means no limit
             except ValueError:
                 pass
         if r.startswith("STATUSMSG="):
@@ -5670,6 +5847,9 @@ def getfeatures(cli, nick, *rest):
                 errlog("Unsupported case mapping: {0!r}; falling back to rfc1459.".format(var.CASEMAPPING))
                 var.CASEMAPPING = "rfc1459"
 
+            var.USERS.rehash()
+            var.PLAYER_NICKS.rehash()
+
 @cmd("", chan=False, pm=True)
 def relay(cli, nick, chan, rest):
     """Wolfchat and Deadchat"""
@@ -5677,12 +5857,7 @@ def relay(cli, nick, chan, rest):
         cli.notice(nick, rest)
         return
     if rest == "\u0001VERSION\u0001":
-        try:
-            ans = subprocess.check_output(["git", "log", "-n", "1", "--pretty=format:%h"])
-            reply = "\u0001VERSION lykos {0}, Python {1} -- https://github.com/lykoss/lykos\u0001".format(str(ans.decode()), platform.python_version())
-        except (OSError, subprocess.CalledProcessError):
-            reply = "\u0001VERSION lykos, Python {0} -- https://github.com/lykoss/lykos\u0001".format(platform.python_version())
-        cli.notice(nick, reply)
+        cli.notice(nick, "\u0001VERSION {0} -- https://github.com/lykoss/lykos\u0001".format(version.version_string()))
         return
     elif rest == "\u0001TIME\u0001":
         cli.notice(nick, "\u0001TIME {0}\u0001".format(time.strftime('%a, %d %b %Y %T %z', time.localtime())))
@@ -5698,44 +5873,54 @@ def relay(cli, nick, chan, rest):
     if rest.startswith(botconfig.CMD_CHAR):
         return
 
-    badguys = list_players(var.WOLFCHAT_ROLES)
-    wolves = list_players(var.WOLF_ROLES)
-
     if nick not in pl and var.ENABLE_DEADCHAT and nick in var.DEADCHAT_PLAYERS:
         to_msg = var.DEADCHAT_PLAYERS - {nick}
+        spectators = var.SPECTATING_DEADCHAT
+        chat = "deadchat"
+    else:
+        to_msg = wolfchat_recipients(nick)
+        if to_msg is None:
+            return
+        spectators = var.SPECTATING_WOLFCHAT
+        chat = "wolfchat"
 
-        if rest.startswith("\u0001ACTION"):
-            rest = rest[7:-1]
-            mass_privmsg(cli, to_msg, "* \u0002{0}\u0002{1}".format(nick, rest))
-            mass_privmsg(cli, var.SPECTATING_DEADCHAT, "* [deadchat] \u0002{0}\u0002{1}".format(nick, rest))
-        else:
-            mass_privmsg(cli, to_msg, "\u0002{0}\u0002 says: {1}".format(nick, rest))
-            mass_privmsg(cli, var.SPECTATING_DEADCHAT, "[deadchat] \u0002{0}\u0002 says: {1}".format(nick, rest))
-
-    elif nick in badguys and len(badguys) > 1:
+    if rest.startswith("\u0001ACTION"):
+        rest = rest[7:-1]
+        msg = "* \u0002{0}\u0002{1}".format(nick, rest)
+        spec_msg = "* [{0}] \u0002{1}\u0002{2}".format(chat, nick, rest)
+    else:
+        msg = "\u0002{0}\u0002 says: {1}".format(nick, rest)
+        spec_msg = "[{0}] \u0002{1}\u0002 says: {2}".format(chat, nick, rest)
+
+    batch_privmsg(cli, [(target, msg) for target in to_msg] + [(target, spec_msg) for target in spectators])
+
+def wolfchat_recipients(nick):
+    """Return who should see what nick says in wolfchat, or None if nick can't talk in it right now."""
+    # only the living are in var.ROLES, so the role sets are all that needs looking at
+    badguys = set()
+    for role in var.WOLFCHAT_ROLES:
+        badguys.update(var.ROLES.get(role, ()))
+    if nick not in badguys or len(badguys) == 1:
+        return None
+
+    if var.PHASE == "night" and var.RESTRICT_WOLFCHAT & var.RW_DISABLE_NIGHT:
+        return None
+    elif var.PHASE == "day" and var.RESTRICT_WOLFCHAT & var.RW_DISABLE_DAY:
+        return None
+
+    if var.RESTRICT_WOLFCHAT & (var.RW_WOLVES_ONLY_CHAT | var.RW_REM_NON_WOLVES):
+        wolves = set(var.WOLF_ROLES)
         # handle wolfchat toggles
         if not var.RESTRICT_WOLFCHAT & var.RW_TRAITOR_NON_WOLF:
-            wolves.extend(var.ROLES["traitor"])
-        if var.PHASE == "night" and var.RESTRICT_WOLFCHAT & var.RW_DISABLE_NIGHT:
-            return
-        elif var.PHASE == "day" and var.RESTRICT_WOLFCHAT & var.RW_DISABLE_DAY:
-            return
-        elif nick not in wolves and var.RESTRICT_WOLFCHAT & var.RW_WOLVES_ONLY_CHAT:
-            return
-        elif nick not in wolves and var.RESTRICT_WOLFCHAT & var.RW_REM_NON_WOLVES:
-            return
+            wolves.add("traitor")
+        if not any(nick in var.ROLES.get(role, ()) for role in wolves):
+            return None
 
-        badguys.remove(nick)
-        to_msg = set(badguys) & var.PLAYERS.keys()
-        if rest.startswith("\u0001ACTION"):
-            rest = rest[7:-1]
-            mass_privmsg(cli, to_msg, "* \u0002{0}\u0002{1}".format(nick, rest))
-            mass_privmsg(cli, var.SPECTATING_WOLFCHAT, "* [wolfchat] \u0002{0}\u0002{1}".format(nick, rest))
-        else:
-            mass_privmsg(cli, to_msg, "\u0002{0}\u0002 says: {1}".format(nick, rest))
-            mass_privmsg(cli, var.SPECTATING_WOLFCHAT, "[wolfchat] \u0002{0}\u0002 says: {1}".format(nick, rest))
+    badguys.discard(nick)
+    return badguys & var.PLAYERS.keys()
 
 @handle_error
+@batch_modes
 def transition_night(cli):
     if var.PHASE == "night":
         return
@@ -5756,7 +5941,7 @@ def transition_night(cli):
         mass_mode(cli, modes, [])
 
     for x, tmr in var.TIMERS.items():  # cancel daytime timer
-        tmr[0].cancel()
+        tmr.cancel()
     var.TIMERS = {}
 
     # Reset nighttime variables
@@ -5787,16 +5972,10 @@ def transition_night(cli):
 
     if var.NIGHT_TIME_LIMIT > 0:
         var.NIGHT_ID = time.time()
-        t = threading.Timer(var.NIGHT_TIME_LIMIT, transition_day, [cli, var.NIGHT_ID])
-        var.TIMERS["night"] = (t, var.NIGHT_ID, var.NIGHT_TIME_LIMIT)
-        t.daemon = True
-        t.start()
+        var.TIMERS["night"] = timers.schedule(var.NIGHT_TIME_LIMIT, transition_day, cli, var.NIGHT_ID)
 
     if var.NIGHT_TIME_WARN > 0:
-        t2 = threading.Timer(var.NIGHT_TIME_WARN, night_warn, [cli, var.NIGHT_ID])
-        var.TIMERS["night_warn"] = (t2, var.NIGHT_ID, var.NIGHT_TIME_WARN)
-        t2.daemon = True
-        t2.start()
+        var.TIMERS["night_warn"] = timers.schedule(var.NIGHT_TIME_WARN, night_warn, cli, var.NIGHT_ID)
 
     # convert amnesiac
     if var.NIGHT_COUNT == var.AMNESIAC_NIGHTS:
@@ -6117,6 +6296,7 @@ def start_cmd(cli, nick, chan, rest):
     """Starts a game of Werewolf."""
     start(cli, nick, chan)
 
+@batch_modes
 def start(cli, nick, chan, forced = False, restart = ""):
     if (not forced and var.LAST_START and nick in var.LAST_START and
             var.LAST_START[nick][0] + timedelta(seconds=var.START_RATE_LIMIT) >
@@ -6188,10 +6368,7 @@ def start(cli, nick, chan, forced = False, restart = ""):
 
                     # If this was the first vote
                     if len(var.START_VOTES) == 1:
-                        t = threading.Timer(60, expire_start_votes, (cli, chan))
-                        var.TIMERS["start_votes"] = (t, time.time(), 60)
-                        t.daemon = True
-                        t.start()
+                        var.TIMERS["start_votes"] = timers.schedule(60, expire_start_votes, cli, chan)
                     return
 
         if not var.FGAMED:
@@ -6218,14 +6395,12 @@ def start(cli, nick, chan, forced = False, restart = ""):
     event = Event("role_attribution", {"addroles": addroles})
     if event.dispatch(cli, chk_win_conditions, var, villagers):
         addroles = event.data["addroles"]
-        for index in range(len(var.ROLE_INDEX) - 1, -1, -1):
-            if var.ROLE_INDEX[index] <= len(villagers):
-                for role, num in var.ROLE_GUIDE.items(): # allow event to override some roles
-                    addroles[role] = addroles.get(role, num[index])
-                break
-        else:
+        roles = var.ROLE_TABLE.roles(len(villagers))
+        if roles is None:
             cli.msg(chan, messages["no_settings_defined"].format(nick, len(villagers)))
             return
+        for role, num in roles.items(): # allow event to override some roles
+            addroles[role] = addroles.get(role, num)
 
     if var.ORIGINAL_SETTINGS and not restart:  # Custom settings
         need_reset = True
@@ -6305,26 +6480,25 @@ def start(cli, nick, chan, forced = False, restart = ""):
     var.SPECTATING_WOLFCHAT = set()
     var.SPECTATING_DEADCHAT = set()
 
+    # Shuffle the players once and deal them out to the roles in turn;
+    # whoever is left over after that gets the default role
+    random.shuffle(villagers)
+    dealt = 0
     for role, count in addroles.items():
         if role in var.TEMPLATE_RESTRICTIONS.keys():
             var.ROLES[role] = [None] * count
             continue # We deal with those later, see below
-        selected = random.sample(villagers, count)
-        var.ROLES[role] = set(selected)
-        for x in selected:
-            villagers.remove(x)
+        var.ROLES[role] = set(villagers[dealt:dealt+count])
+        dealt += count
 
-    for v in villagers:
-        var.ROLES[var.DEFAULT_ROLE].add(v)
+    var.ROLES[var.DEFAULT_ROLE].update(villagers[dealt:])
 
-    # Now for the templates
+    # Now for the templates; who can get which one only depends on the main roles, so look those up once
+    main_roles = {p: role for role, players in var.ROLES.items() if role not in var.TEMPLATE_RESTRICTIONS for p in players}
     for template, restrictions in var.TEMPLATE_RESTRICTIONS.items():
         if template == "sharpshooter":
             continue # sharpshooter gets applied specially
-        possible = pl[:]
-        for cannotbe in list_players(restrictions):
-            if cannotbe in possible:
-                possible.remove(cannotbe)
+        possible = [p for p in pl if main_roles[p] not in restrictions]
         if len(possible) < len(var.ROLES[template]):
             cli.msg(chan, messages["not_enough_targets"].format(template))
             if var.ORIGINAL_SETTINGS:
@@ -6341,13 +6515,13 @@ def start(cli, nick, chan, forced = False, restart = ""):
         var.ROLES[template] = set(random.sample(possible, len(var.ROLES[template])))
 
     # Handle gunner
-    cannot_be_sharpshooter = list_players(var.TEMPLATE_RESTRICTIONS["sharpshooter"])
+    cannot_be_sharpshooter = var.TEMPLATE_RESTRICTIONS["sharpshooter"]
     gunner_list = copy.copy(var.ROLES["gunner"])
     num_sharpshooters = 0
     for gunner in gunner_list:
         if gunner in var.ROLES["village drunk"]:
             var.GUNNERS[gunner] = (var.DRUNK_SHOTS_MULTIPLIER * math.ceil(var.SHOTS_MULTIPLIER * len(pl)))
-        elif num_sharpshooters < addroles["sharpshooter"] and gunner not in cannot_be_sharpshooter and random.random() <= var.SHARPSHOOTER_CHANCE:
+        elif num_sharpshooters < addroles["sharpshooter"] and main_roles[gunner] not in cannot_be_sharpshooter and random.random() <= var.SHARPSHOOTER_CHANCE:
             var.GUNNERS[gunner] = math.ceil(var.SHARPSHOOTER_MULTIPLIER * len(pl))
             var.ROLES["gunner"].remove(gunner)
             var.ROLES["sharpshooter"].append(gunner)
@@ -6367,7 +6541,7 @@ def start(cli, nick, chan, forced = False, restart = ""):
     with var.WARNING_LOCK: # cancel timers
         for name in ("join", "join_pinger", "start_votes"):
             if name in var.TIMERS:
-                var.TIMERS[name][0].cancel()
+                var.TIMERS[name].cancel()
                 del var.TIMERS[name]
 
     var.LAST_STATS = None
@@ -6414,7 +6588,7 @@ def start(cli, nick, chan, forced = False, restart = ""):
             options = ""
 
         cli.msg(chan, messages["welcome"].format(", ".join(pl), gamemode, options))
-        cli.mode(chan, "+m")
+        mass_mode(cli, [], ["+m"])
 
     var.ORIGINAL_ROLES = copy.deepcopy(var.ROLES)  # Make a copy
 
@@ -6471,11 +6645,8 @@ def start(cli, nick, chan, forced = False, restart = ""):
 
     decrement_stasis()
 
-    if not botconfig.DEBUG_MODE or not var.DISABLE_DEBUG_MODE_REAPER:
-        # DEATH TO IDLERS!
-        reapertimer = threading.Thread(None, reaper, args=(cli,var.GAME_ID))
-        reapertimer.daemon = True
-        reapertimer.start()
+    # DEATH TO IDLERS!
+    queue_idlers(cli)
 
 @hook("error")
 def on_error(cli, pfx, msg):
@@ -6953,32 +7124,29 @@ def timeleft(cli, nick, chan, rest):
     reply(cli, nick, chan, msg)
 
 def timeleft_internal(phase):
-    return int((var.TIMERS[phase][1] + var.TIMERS[phase][2]) - time.time()) if phase in var.TIMERS else -1
+    return int(var.TIMERS[phase].remaining()) if phase in var.TIMERS else -1
 
 @cmd("roles", pm=True)
 def listroles(cli, nick, chan, rest):
     """Displays which roles are enabled at a certain number of players."""
 
-    old = defaultdict(int)
     msg = []
     index = 0
     lpl = len(list_players()) + len(var.DEAD)
-    roleindex = var.ROLE_INDEX
-    roleguide = var.ROLE_GUIDE
+    table = var.ROLE_TABLE
     gamemode = var.CURRENT_GAMEMODE.name
     if gamemode == "villagergame":
         gamemode = "default"
-        roleindex = var.CURRENT_GAMEMODE.fake_index
-        roleguide = var.CURRENT_GAMEMODE.fake_guide
+        table = var.ROLE_TABLES["default"]
 
     rest = re.split(" +", rest.strip(), 1)
 
     #message if this game mode has been disabled
-    if (not rest[0] or rest[0].isdigit()) and not hasattr(var.CURRENT_GAMEMODE, "ROLE_GUIDE"):
+    if (not rest[0] or rest[0].isdigit()) and not hasattr(var.CURRENT_GAMEMODE, "ROLE_TABLE"):
         msg.append("{0}: There {1} \u0002{2}\u0002 playing. {3}roles is disabled for the {4} game mode.".format(nick,
                    "is" if lpl == 1 else "are", lpl, botconfig.CMD_CHAR, gamemode))
         rest = []
-        roleindex = {}
+        table = None
     #prepend player count if called without any arguments
     elif not rest[0] and lpl > 0:
         msg.append("{0}: There {1} \u0002{2}\u0002 playing.".format(nick, "is" if lpl == 1 else "are", lpl))
@@ -6992,53 +7160,24 @@ def listroles(cli, nick, chan, rest):
         if gamemode not in var.GAME_MODES.keys():
             gamemode, _ = complete_match(rest[0], var.GAME_MODES.keys() - ["roles", "villagergame"] - var.DISABLED_GAMEMODES)
         validMode = gamemode in var.GAME_MODES.keys() and gamemode != "roles" and gamemode != "villagergame" and gamemode not in var.DISABLED_GAMEMODES
-        if validMode and hasattr(var.GAME_MODES[gamemode][0](), "ROLE_GUIDE"):
-            mode = var.GAME_MODES[gamemode][0]()
-            if hasattr(mode, "ROLE_INDEX") and hasattr(mode, "ROLE_GUIDE"):
-                roleindex = mode.ROLE_INDEX
-                roleguide = mode.ROLE_GUIDE
-            elif gamemode == "default" and "ROLE_INDEX" in var.ORIGINAL_SETTINGS and "ROLE_GUIDE" in var.ORIGINAL_SETTINGS:
-                roleindex = var.ORIGINAL_SETTINGS["ROLE_INDEX"]
-                roleguide = var.ORIGINAL_SETTINGS["ROLE_GUIDE"]
+        if validMode and gamemode in var.ROLE_TABLES:
+            table = var.ROLE_TABLES[gamemode]
             rest.pop(0)
         else:
-            if validMode and not hasattr(var.GAME_MODES[gamemode][0](), "ROLE_GUIDE"):
+            if validMode:
                 msg.append("{0}: {1}roles is disabled for the {2} game mode.".format(nick, botconfig.CMD_CHAR, gamemode))
             else:
                 msg.append("{0}: {1} is not a valid game mode.".format(nick, rest[0]))
             rest = []
-            roleindex = {}
+            table = None
 
     #number of players to print the game mode for
     if rest and rest[0].isdigit():
         index = int(rest[0])
-        for i in range(len(roleindex)-1, -1, -1):
-            if roleindex[i] <= index:
-                index = roleindex[i]
-                break
 
-    #special ordering
-    roleguide = [(role, roleguide[role]) for role in role_order()]
-    for i, num in enumerate(roleindex):
-        #getting the roles at a specific player count
-        if index:
-            if num < index:
-                continue
-            if num > index:
-                break
-        msg.append("{0}[{1}]{0}".format("\u0002" if num <= lpl else "", str(num)))
-        roles = []
-        for role, amount in roleguide:
-            direction = 1 if amount[i] > old[role] else -1
-            for j in range(old[role], amount[i], direction):
-                temp = "{0}{1}".format("-" if direction == -1 else "", role)
-                if direction == 1 and j+1 > 1:
-                    temp += "({0})".format(j+1)
-                elif j > 1:
-                    temp += "({0})".format(j)
-                roles.append(temp)
-            old[role] = amount[i]
-        msg.append(", ".join(roles))
+    if table is not None:
+        for num, text, bold in table.listing(index or None):
+            msg.append(bold if num <= lpl else text)
 
     if not msg:
         msg = ["No roles are defined for {0}p games.".format(index)]
@@ -7231,10 +7370,9 @@ def player_stats(cli, nick, chan, rest):
 
     # Find the player's account if possible
     luser = user.lower()
-    lusers = {k.lower(): v for k, v in var.USERS.items()}
-    if luser in lusers:
-        acc = irc_lower(lusers[luser]["account"])
-        hostmask = luser + "!" + irc_lower(lusers[luser]["ident"]) + "@" + lusers[luser]["host"].lower()
+    if user in var.USERS:
+        acc = var.USERS[user].laccount
+        hostmask = luser + "!" + var.USERS[user].hostmask
         if acc == "*" and var.ACCOUNTS_ONLY:
             if luser == nick.lower():
                 cli.notice(nick, messages["not_logged_in"])
@@ -7365,6 +7503,9 @@ def fpull(cli, nick, chan, rest):
             else:
                 pm(cli, nick, messages["process_exited"] % (command, cause, ret))
 
+    # the running code only changes on restart, but the version is what is on disk from now on
+    reply(cli, nick, chan, messages["fpull_version"].format(version.refresh() or "unknown"), private=True)
+
 @cmd("fsend", flag="F", pm=True)
 def fsend(cli, nick, chan, rest):
     """Forcibly send raw IRC commands to the server."""
@@ -7645,13 +7786,11 @@ if botconfig.DEBUG_MODE or botconfig.ALLOWED_NORMAL_MODE_COMMANDS:
             who = list_players()
         else:
             if not is_fake_nick(who):
-                ul = list(var.USERS.keys())
-                ull = [u.lower() for u in ul]
-                if who.lower() not in ull:
+                if who not in var.USERS:
                     cli.msg(chan, messages["invalid_target"])
                     return
                 else:
-                    who = [ul[ull.index(who.lower())]]
+                    who = [var.USERS.nick(who)]
             else:
                 who = [who]
         comm = rst.pop(0).lower().replace(botconfig.CMD_CHAR, "", 1)
@@ -7723,14 +7862,12 @@ if botconfig.DEBUG_MODE or botconfig.ALLOWED_NORMAL_MODE_COMMANDS:
             return
         who = rst.pop(0).strip()
         rol = " ".join(rst).strip()
-        ul = list(var.USERS.keys())
-        ull = [u.lower() for u in ul]
-        if who.lower() not in ull:
+        if who not in var.USERS:
             if not is_fake_nick(who):
                 cli.msg(chan, messages["invalid_target"])
                 return
         if not is_fake_nick(who):
-            who = ul[ull.index(who.lower())]
+            who = var.USERS.nick(who)
         if who == botconfig.NICK or not who:
             cli.msg(chan, messages["invalid_target"])
             return
@@ -7755,6 +7892,7 @@ if botconfig.DEBUG_MODE or botconfig.ALLOWED_NORMAL_MODE_COMMANDS:
                 if who not in pl:
                     var.ROLES[var.DEFAULT_ROLE].add(who)
                     var.ALL_PLAYERS.append(who)
+                    var.PLAYER_NICKS.add(who)
                     if not is_fake_nick(who):
                         cli.mode(chan, "+v", who)
                     cli.msg(chan, messages["template_default_role"].format(var.DEFAULT_ROLE))
@@ -7781,6 +7919,7 @@ if botconfig.DEBUG_MODE or botconfig.ALLOWED_NORMAL_MODE_COMMANDS:
                 var.ROLES[oldrole].remove(who)
             else:
                 var.ALL_PLAYERS.append(who)
+                var.PLAYER_NICKS.add(who)
             var.ROLES[rol].add(who)
             if who not in pl:
                 var.ORIGINAL_ROLES[rol].add(who)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+# End-to-end latency and throughput benchmark
+#
+# Starts the mock IRC server from tools/mockircd.py, fills the channel with
+# synthetic users and connects the bot to it through oyoyo's IRCClient,
+# exactly as wolfbot.py does, flood protection included. Then it measures:
+#
+#  - how long the bot takes from connecting to being opped and ready;
+#  - the time between a synthetic user sending a command and the bot's
+#    reply reaching the server, with the commands spaced out so that the
+#    flood protection does not kick in;
+#  - how many lines per second the bot sustains when a crowd of users
+#    send commands all at once.
+#
+# Usage: tools/ircbench.py [--users N] [--samples N] [--burst N] [--seed SEED] [--json]
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import mockircd
+import simulate
+
+CHANNEL = "#bench"
+NICK = "benchbot"
+TIMEOUT = 60 # seconds to wait for any single reply
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.loop = asyncio.new_event_loop()
+        self.server = mockircd.Server(CHANNEL)
+        self.results = concurrent.futures.Future()
+        self.done = False
+
+    def start_server(self):
+        """Start the server on its own thread. Return the port it listens on."""
+        started = concurrent.futures.Future()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            for i in range(self.args.users):
+                nick = "user{0:03}".format(i)
+                # a quarter of the users are not logged in
+                self.server.add_user(nick, account=nick if i % 4 else None)
+            port = self.loop.run_until_complete(self.server.start())
+            # set up before the bot connects, so that the line can't be missed
+            ready = self.server.wait_for(lambda line: line.command == "MODE" and line.params[1:] == ["q"])
+            task = self.loop.create_task(self.measure(ready))
+            task.add_done_callback(self.finish)
+            started.set_result(port)
+            self.loop.run_forever()
+
+        threading.Thread(target=run, name="mockircd", daemon=True).start()
+        return started.result()
+
+    def finish(self, task):
+        self.done = True
+        if task.exception() is not None:
+            self.results.set_exception(task.exception())
+        else:
+            self.results.set_result(task.result())
+        # wake the bot up so that it notices
+        self.server.ping()
+
+    def run_bot(self, port):
+        """Connect the bot and process lines until the measurements are done.
+        This has to run on the main thread, since the bot installs signal handlers."""
+        simulate.install_config(HOST="127.0.0.1", PORT=port, NICK=NICK, IDENT=NICK, REALNAME=NICK,
+                                CHANNEL=CHANNEL, PASS="benchmark", SASL_AUTHENTICATION=True,
+                                ALLOWED_NORMAL_MODE_COMMANDS=[])
+        sys.path.insert(0, simulate.ROOT)
+        sys.argv = sys.argv[:1]
+
+        from src import logger
+        logger.utf8stdout = open(os.devnull, "w")
+
+        from oyoyo.client import IRCClient
+        import botconfig
+        import src
+        from src import handler
+
+        cli = IRCClient(
+                          {"privmsg": handler.on_privmsg,
+                           "notice": lambda a, b, c, d: handler.on_privmsg(a, b, c, d, True),
+                           "": handler.unhandled},
+                         host=botconfig.HOST,
+                         port=botconfig.PORT,
+                         authname=botconfig.USERNAME,
+                         password=botconfig.PASS,
+                         nickname=botconfig.NICK,
+                         ident=botconfig.IDENT,
+                         real_name=botconfig.REALNAME,
+                         sasl_auth=botconfig.SASL_AUTHENTICATION,
+                         server_pass=botconfig.SERVER_PASS,
+                         use_ssl=botconfig.USE_SSL,
+                         connect_cb=handler.connect_callback,
+                         stream_handler=lambda output, level=None: None,
+        )
+        self.connected = time.perf_counter()
+        for _ in cli.connect():
+            if self.done:
+                cli._end = 1 # let the client hang up by itself
+        return self.results.result()
+
+    def reply_to(self, nick, target):
+        """Wait for the bot to send something to target, in reply to nick."""
+        def predicate(line):
+            if line.command not in ("PRIVMSG", "NOTICE"):
+                return False
+            targets = line.params[0].split(",")
+            return target in targets and (target != CHANNEL or nick in line.params[-1])
+        return self.server.wait_for(predicate)
+
+    async def command(self, nick, target, text):
+        """Send a command as nick and return how long the reply took."""
+        reply = self.reply_to(nick, nick if target == NICK else CHANNEL)
+        start = time.perf_counter()
+        self.server.privmsg(nick, target, text)
+        line = await asyncio.wait_for(reply, TIMEOUT)
+        return line.time - start
+
+    async def measure(self, ready):
+        results = {}
+        line = await asyncio.wait_for(ready, TIMEOUT)
+        results["connect"] = line.time - self.connected
+
+        users = list(self.server.users)
+        latencies = {"pm": [], "channel": []}
+        for i in range(self.args.samples):
+            nick = self.server.users[self.rng.choice(users)].nick
+            if i % 2:
+                latencies["channel"].append(await self.command(nick, CHANNEL, "!coin"))
+            else:
+                latencies["pm"].append(await self.command(nick, NICK, "coin"))
+            # stay well under the flood limit, so that this only measures the bot
+            await asyncio.sleep(self.args.interval)
+        results["latency"] = latencies
+
+        # let the flood protection fill back up, then hit the bot with everything at once
+        await asyncio.sleep(self.args.cooldown)
+        crowd = [self.server.users[nick].nick for nick in self.rng.sample(users, min(self.args.burst, len(users)))]
+        received = self.server.received
+        replies = [self.reply_to(nick, nick) for nick in crowd]
+        start = time.perf_counter()
+        for nick in crowd:
+            self.server.privmsg(nick, NICK, "coin")
+        first = await asyncio.wait_for(asyncio.gather(*replies), TIMEOUT + len(crowd))
+        # every reply is two lines; wait for the second half as well
+        deadline = time.perf_counter() + TIMEOUT
+        while self.server.received - received < 2 * len(crowd) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        results["burst"] = {
+            "commands": len(crowd),
+            "lines": self.server.received - received,
+            "seconds": elapsed,
+            "first_reply": min(line.time for line in first) - start,
+            "last_reply": max(line.time for line in first) - start,
+        }
+        return results
+
+def summarize(times):
+    if not times:
+        return "no samples"
+    return "{0:>3} samples, median {1:7.2f} ms, mean {2:7.2f} ms, max {3:7.2f} ms".format(
+        len(times), statistics.median(times) * 1000, statistics.mean(times) * 1000, max(times) * 1000)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure command latency and line throughput against a mock IRC server.")
+    parser.add_argument("--users", type=int, default=300, help="number of synthetic users in the channel")
+    parser.add_argument("--samples", type=int, default=20, help="number of latency samples")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between latency samples")
+    parser.add_argument("--burst", type=int, default=50, help="number of users sending a command at once")
+    parser.add_argument("--cooldown", type=float, default=15.0, help="seconds to wait before the burst")
+    parser.add_argument("--seed", default="0", help="seed for picking the users")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    bench = Benchmark(args)
+    port = bench.start_server()
+    with tempfile.TemporaryDirectory(prefix="lykos-bench-") as tmpdir:
+        os.chdir(tmpdir)
+        results = bench.run_bot(port)
+        os.chdir(simulate.ROOT)
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+
+    burst = results["burst"]
+    print("connected and opped in {0:.2f} ms with {1} users".format(results["connect"] * 1000, args.users))
+    print("pm command:      " + summarize(results["latency"]["pm"]))
+    print("channel command: " + summarize(results["latency"]["channel"]))
+    print("burst of {0} commands: {1} lines in {2:.2f} s ({3:.2f} lines/s), first reply after {4:.2f} ms, last after {5:.2f} s".format(
+          burst["commands"], burst["lines"], burst["seconds"], burst["lines"] / burst["seconds"],
+          burst["first_reply"] * 1000, burst["last_reply"]))
+
+if __name__ == "__main__":
+    main()
+
+# vim: set sw=4 expandtab:
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+
+# Mock IRC server
+#
+# A stand-in for an ircd that listens on the loopback interface only. It
+# speaks just enough of the protocol for the bot to connect and play:
+# capability negotiation (account-notify, away-notify, extended-join,
+# multi-prefix and sasl), SASL PLAIN, WHO with WHOX fields, NAMES, channel
+# modes including the ban and quiet lists, and account and away changes.
+#
+# One real client (the bot) is expected to connect. Everybody else is a
+# synthetic user living inside the server, driven through the Server
+# methods; tools/ircbench.py uses them to measure latency and throughput.
+# Run on its own, it fills the channel with synthetic users and waits for
+# a bot to be pointed at it.
+#
+# Usage: tools/mockircd.py [--port PORT] [--channel CHANNEL] [--users N]
+
+import argparse
+import asyncio
+import base64
+import time
+
+SERVER_NAME = "irc.mock"
+CAPABILITIES = ("account-notify", "away-notify", "extended-join", "multi-prefix", "sasl")
+ISUPPORT = ("CHANTYPES=#", "EXCEPTS", "INVEX", "CHANMODES=eIbq,k,flj,CFLMPQScgimnprstz",
+            "CHANLIMIT=#:120", "PREFIX=(ov)@+", "MAXLIST=bqeI:100", "MODES=4",
+            "NETWORK=mock", "STATUSMSG=@+", "CASEMAPPING=rfc1459", "NICKLEN=16",
+            "CHANNELLEN=50", "TOPICLEN=390", "WHOX",
+            "TARGMAX=NAMES:1,LIST:1,KICK:1,WHOIS:1,PRIVMSG:4,NOTICE:4,ACCEPT:,MONITOR:")
+PREFIXES = (("o", "@"), ("v", "+"))
+LIST_MODES = {"b": ("367", "368", "End of Channel Ban List"),
+              "q": ("728", "729", "End of Channel Quiet List")}
+NAMES_PER_LINE = 40
+
+class Line:
+    """A parsed line, as sent by the client."""
+    __slots__ = ("command", "params", "time")
+
+    def __init__(self, raw):
+        self.time = time.perf_counter()
+        if " :" in raw:
+            raw, trailing = raw.split(" :", 1)
+            params = raw.split()
+            params.append(trailing)
+        else:
+            params = raw.split()
+        self.command = params.pop(0).upper() if params else ""
+        self.params = params
+
+    def __repr__(self):
+        return "Line({0!r}, {1!r})".format(self.command, self.params)
+
+class User:
+    __slots__ = ("nick", "ident", "host", "realname", "account", "modes", "away")
+
+    def __init__(self, nick, ident=None, host=None, realname=None, account=None):
+        self.nick = nick
+        self.ident = ident or "~" + nick.lower()
+        self.host = host or "mock/user/" + nick.lower()
+        self.realname = realname or nick
+        self.account = account # None when logged out
+        self.modes = set() # channel status modes
+        self.away = False
+
+    @property
+    def hostmask(self):
+        return "{0}!{1}@{2}".format(self.nick, self.ident, self.host)
+
+    def prefix(self, multi=True):
+        prefixes = "".join(char for mode, char in PREFIXES if mode in self.modes)
+        return prefixes if multi else prefixes[:1]
+
+class Server:
+    def __init__(self, channel):
+        self.channel = channel
+        self.users = {} # lowercased nick -> synthetic User
+        self.lists = {mode: [] for mode in LIST_MODES} # mode -> [(mask, setter, timestamp)]
+        self.bot = None # User for the connected client
+        self.in_channel = False
+        self.caps = set()
+        self.cap_negotiating = False
+        self.registered = False
+        self.writer = None
+        self.received = 0 # lines received from the client
+        self._waiters = []
+
+    async def start(self, port=0):
+        """Start listening. Return the port number."""
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", port)
+        return self._server.sockets[0].getsockname()[1]
+
+    def wait_for(self, predicate):
+        """Return a future resolved with the first line from the client
+        that matches predicate."""
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.append((predicate, future))
+        return future
+
+    # Synthetic users
+
+    def add_user(self, nick, **kwargs):
+        user = User(nick, **kwargs)
+        self.users[nick.lower()] = user
+        self._to_channel(user, "JOIN", self._join_params(user))
+        return user
+
+    def remove_user(self, nick, reason=""):
+        user = self.users.pop(nick.lower())
+        self._to_channel(user, "QUIT", [reason])
+
+    def part(self, nick, reason=""):
+        user = self.users.pop(nick.lower())
+        self._to_channel(user, "PART", [self.channel, reason])
+
+    def change_nick(self, nick, new):
+        user = self.users.pop(nick.lower())
+        old = user.hostmask
+        user.nick = new
+        self.users[new.lower()] = user
+        self._to_channel(old, "NICK", [new])
+
+    def set_account(self, nick, account):
+        user = self.users[nick.lower()]
+        user.account = account
+        if "account-notify" in self.caps:
+            self._to_channel(user, "ACCOUNT", [account or "*"])
+
+    def set_away(self, nick, message=None):
+        user = self.users[nick.lower()]
+        user.away = bool(message)
+        if "away-notify" in self.caps:
+            self._to_channel(user, "AWAY", [message] if message else [])
+
+    def ping(self):
+        self._send(SERVER_NAME, "PING", [SERVER_NAME])
+
+    def privmsg(self, nick, target, text):
+        self._send(self.users[nick.lower()].hostmask, "PRIVMSG", [target, text])
+
+    def notice(self, nick, target, text):
+        self._send(self.users[nick.lower()].hostmask, "NOTICE", [target, text])
+
+    # Connection handling
+
+    async def _handle(self, reader, writer):
+        if self.writer is not None:
+            writer.write(b"ERROR :Only one client at a time\r\n")
+            writer.close()
+            return
+        self.writer = writer
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                line = Line(raw.decode("utf-8", "replace").rstrip("\r\n"))
+                if not line.command:
+                    continue
+                self.received += 1
+                handler = getattr(self, "on_" + line.command.lower(), None)
+                if handler is None:
+                    self._numeric("421", line.command, "Unknown command")
+                else:
+                    handler(*line.params)
+                for waiter in self._waiters[:]:
+                    predicate, future = waiter
+                    if future.done():
+                        self._waiters.remove(waiter)
+                    elif predicate(line):
+                        self._waiters.remove(waiter)
+                        future.set_result(line)
+        finally:
+            self.writer = None
+            self.bot = None
+            self.in_channel = False
+            self.registered = False
+            self.caps = set()
+            writer.close()
+
+    def _send(self, prefix, command, params):
+        if self.writer is None:
+            return
+        if isinstance(prefix, User):
+            prefix = prefix.hostmask
+        params = list(params)
+        if params and (not params[-1] or " " in params[-1] or params[-1].startswith(":")):
+            params[-1] = ":" + params[-1]
+        line = " ".join([":" + prefix, command] + params)
+        self.writer.write(line.encode("utf-8") + b"\r\n")
+
+    def _numeric(self, numeric, *params):
+        self._send(SERVER_NAME, numeric, (self.bot.nick if self.bot else "*",) + params)
+
+    def _to_channel(self, user, command, params):
+        if self.in_channel:
+            self._send(user, command, params)
+
+    def _join_params(self, user):
+        if "extended-join" in self.caps:
+            return [self.channel, user.account or "*", user.realname]
+        return [self.channel]
+
+    def _find(self, nick):
+        if self.bot is not None and nick.lower() == self.bot.nick.lower():
+            return self.bot
+        return self.users.get(nick.lower())
+
+    def _members(self):
+        if self.in_channel:
+            yield self.bot
+        yield from self.users.values()
+
+    def _register(self):
+        if self.registered or self.cap_negotiating or not self.bot or not self.bot.ident:
+            return
+        self.registered = True
+        nick = self.bot.nick
+        self._numeric("001", "Welcome to the mock network " + nick)
+        self._numeric("002", "Your host is {0}".format(SERVER_NAME))
+        self._numeric("003", "This server was created just now")
+        self._numeric("004", SERVER_NAME, "mockircd", "DQRSZagiloswz", "CFILPQTbcefgijklmnopqrstvz", "bkloveqjfI")
+        self._numeric("005", *ISUPPORT + ("are supported by this server",))
+        self._numeric("375", "- {0} Message of the Day -".format(SERVER_NAME))
+        self._numeric("372", "- This server is for benchmarking only.")
+        self._numeric("376", "End of /MOTD command.")
+
+    # Commands from the client
+
+    def on_cap(self, sub, *args):
+        sub = sub.upper()
+        if sub == "LS":
+            self.cap_negotiating = True
+            self._send(SERVER_NAME, "CAP", ["*", "LS", " ".join(CAPABILITIES)])
+        elif sub == "REQ":
+            wanted = args[-1].split()
+            if all(cap.lstrip("-") in CAPABILITIES for cap in wanted):
+                for cap in wanted:
+                    if cap.startswith("-"):
+                        self.caps.discard(cap[1:])
+                    else:
+                        self.caps.add(cap)
+                self._send(SERVER_NAME, "CAP", ["*", "ACK", args[-1]])
+            else:
+                self._send(SERVER_NAME, "CAP", ["*", "NAK", args[-1]])
+        elif sub == "LIST":
+            self._send(SERVER_NAME, "CAP", ["*", "LIST", " ".join(sorted(self.caps))])
+        elif sub == "END":
+            self.cap_negotiating = False
+            self._register()
+
+    def on_authenticate(self, data):
+        if data.upper() == "PLAIN":
+            self._send(SERVER_NAME, "AUTHENTICATE", ["+"])
+            return
+        try:
+            _, account, _ = base64.b64decode(data).decode("utf-8").split("\0")
+        except ValueError:
+            self._numeric("904", "SASL authentication failed")
+            return
+        self.bot.account = account
+        self._numeric("900", self.bot.hostmask, account, "You are now logged in as " + account)
+        self._numeric("903", "SASL authentication successful")
+
+    def on_pass(self, *args):
+        pass
+
+    def on_nick(self, nick):
+        if self.bot is None:
+            self.bot = User(nick)
+            self.bot.ident = ""
+            return
+        if self._find(nick) not in (None, self.bot):
+            self._numeric("433", nick, "Nickname is already in use.")
+            return
+        old = self.bot.hostmask
+        self.bot.nick = nick
+        if self.registered and old.split("!")[0] != nick:
+            self._send(old, "NICK", [nick])
+
+    def on_user(self, ident, _, __, realname):
+        self.bot.ident = ident
+        self.bot.host = "mock/bot/" + self.bot.nick.lower()
+        self.bot.realname = realname
+        self._register()
+
+    def on_ping(self, *args):
+        self._send(SERVER_NAME, "PONG", [SERVER_NAME] + list(args[-1:]))
+
+    def on_pong(self, *args):
+        pass
+
+    def on_join(self, channels, *keys):
+        for chan in channels.split(","):
+            if chan.lower() != self.channel.lower():
+                # other channels are empty; the bot is alone in them
+                self._send(self.bot, "JOIN", [chan] + self._join_params(self.bot)[1:])
+                continue
+            if self.in_channel:
+                continue
+            self.in_channel = True
+            self._send(self.bot, "JOIN", self._join_params(self.bot))
+            self.on_names(chan)
+
+    def on_part(self, chan, reason=""):
+        if chan.lower() == self.channel.lower() and self.in_channel:
+            self._send(self.bot, "PART", [chan, reason])
+            self.in_channel = False
+            self.bot.modes.clear()
+
+    def on_names(self, chan):
+        if chan.lower() == self.channel.lower():
+            multi = "multi-prefix" in self.caps
+            names = [user.prefix(multi) + user.nick for user in self._members()]
+            for i in range(0, len(names), NAMES_PER_LINE):
+                self._numeric("353", "=", self.channel, " ".join(names[i:i+NAMES_PER_LINE]))
+        self._numeric("366", chan, "End of /NAMES list.")
+
+    def on_who(self, mask, fields=""):
+        if mask.lower() == self.channel.lower():
+            users = list(self._members())
+        else:
+            user = self._find(mask)
+            users = [user] if user else []
+        for user in users:
+            flags = ("G" if user.away else "H") + user.prefix("multi-prefix" in self.caps)
+            if fields.startswith("%"):
+                # WHOX always answers in this order, whatever order the fields were asked in
+                values = {"c": self.channel, "u": user.ident, "h": user.host, "s": SERVER_NAME,
+                          "n": user.nick, "f": flags, "a": user.account or "0", "r": user.realname}
+                self._numeric("354", *[values[f] for f in "cuhsnfar" if f in fields])
+            else:
+                self._numeric("352", self.channel, user.ident, user.host, SERVER_NAME,
+                              user.nick, flags, "0 " + user.realname)
+        self._numeric("315", mask, "End of /WHO list.")
+
+    def on_mode(self, target, modes=None, *args):
+        if target.lower() != self.channel.lower():
+            if modes is not None and self.bot and target.lower() == self.bot.nick.lower():
+                self._send(self.bot, "MODE", [target, modes])
+            return
+        if modes is None:
+            self._numeric("324", self.channel, "+nt")
+            return
+        if modes.lstrip("+") in LIST_MODES and not args:
+            entry, end, text = LIST_MODES[modes.lstrip("+")]
+            for mask, setter, stamp in self.lists[modes.lstrip("+")]:
+                if entry == "728":
+                    self._numeric(entry, self.channel, "q", mask, setter, str(stamp))
+                else:
+                    self._numeric(entry, self.channel, mask, setter, str(stamp))
+            self._numeric(end, self.channel, text)
+            return
+        if "o" not in self.bot.modes:
+            self._numeric("482", self.channel, "You're not a channel operator")
+            return
+
+        args = list(args)
+        applied = []
+        applied_args = []
+        adding = True
+        for char in modes:
+            if char in "+-":
+                adding = char == "+"
+                continue
+            if char in "ov":
+                if not args:
+                    continue
+                user = self._find(args.pop(0))
+                if user is None:
+                    continue
+                (user.modes.add if adding else user.modes.discard)(char)
+                arg = user.nick
+            elif char in LIST_MODES:
+                if not args:
+                    continue
+                arg = args.pop(0)
+                entries = self.lists[char]
+                entries[:] = [e for e in entries if e[0] != arg]
+                if adding:
+                    entries.append((arg, self.bot.hostmask, int(time.time())))
+            else:
+                arg = None
+            applied.append(("+" if adding else "-") + char)
+            if arg is not None:
+                applied_args.append(arg)
+        if applied:
+            self._send(self.bot, "MODE", [self.channel, "".join(applied)] + applied_args)
+
+    def on_privmsg(self, target, text):
+        if target.lower() == "chanserv" and text.upper().startswith("OP"):
+            self.bot.modes.add("o")
+            self._send("ChanServ!ChanServ@services.", "MODE", [self.channel, "+o", self.bot.nick])
+        # messages for the channel or for synthetic users are only looked at through wait_for()
+
+    def on_notice(self, target, text):
+        pass
+
+    def on_kick(self, chan, nick, reason=""):
+        user = self.users.pop(nick.lower(), None)
+        if user is not None:
+            self._send(self.bot, "KICK", [self.channel, user.nick, reason])
+
+    def on_away(self, message=""):
+        self.bot.away = bool(message)
+
+    def on_quit(self, message=""):
+        self._send(SERVER_NAME, "ERROR", ["Closing Link: " + (message or "Client Quit")])
+        self.writer.close()
+
+async def _serve(args):
+    server = Server(args.channel)
+    for i in range(args.users):
+        nick = "user{0:03}".format(i)
+        server.add_user(nick, account=nick if i % 4 else None)
+    port = await server.start(args.port)
+    print("Listening on 127.0.0.1:{0} with {1} users in {2}".format(port, args.users, args.channel))
+    await asyncio.Event().wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock IRC server.")
+    parser.add_argument("--port", type=int, default=6667)
+    parser.add_argument("--channel", default="#mock")
+    parser.add_argument("--users", type=int, default=300, help="number of synthetic users in the channel")
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
+
+# vim: set sw=4 expandtab:
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+# Fuzz test and benchmark for the raw line parser
+#
+# Checks oyoyo.parse.parse_raw_irc_command against the previous split-based
+# parser, kept below as legacy_parse, on a large number of random lines,
+# then times both of them on a corpus of traffic.
+#
+# The two are expected to differ in a few ways, which the fuzzer avoids:
+#  - lines with IRCv3 message tags, which the old parser took for commands;
+#  - runs of spaces between parameters, which the old parser turned into
+#    empty parameters;
+#  - lines without any parameters, which made the old parser raise.
+#
+# Usage: tools/parsebench.py [--seed SEED] [--fuzz N] [--corpus FILE] [--lines N]
+#
+# The corpus is a file of raw lines, as received from the server (the debug
+# output of the bot can easily be turned into one). Without it, a corpus of
+# the same make-up as a busy game channel is generated.
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from oyoyo.ircevents import numeric_events
+from oyoyo.parse import parse_message, parse_raw_irc_command
+
+def legacy_parse(element):
+    parts = element.strip().split(bytes(" ", "utf_8"))
+    if parts[0].startswith(bytes(':', 'utf_8')):
+        prefix = parts[0][1:]
+        command = parts[1]
+        args = parts[2:]
+    else:
+        prefix = None
+        command = parts[0]
+        args = parts[1:]
+
+    if command.isdigit():
+        try:
+            command = numeric_events[command]
+        except KeyError:
+            pass
+    command = command.lower()
+    if isinstance(command, bytes): command = command.decode("utf_8")
+
+    if args[0].startswith(bytes(':', 'utf_8')):
+        args = [bytes(" ", "utf_8").join(args)[1:]]
+    else:
+        for idx, arg in enumerate(args):
+            if arg.startswith(bytes(':', 'utf_8')):
+                args = args[:idx] + [bytes(" ", 'utf_8').join(args[idx:])[1:]]
+                break
+
+    return (prefix, command, args)
+
+COMMANDS = [b"PRIVMSG", b"NOTICE", b"JOIN", b"PART", b"QUIT", b"MODE", b"NICK", b"KICK",
+            b"PING", b"ACCOUNT", b"CAP", b"AUTHENTICATE", b"privmsg", b"999", b"000"] + list(numeric_events)
+
+def random_word(rng, first_colon=False):
+    # anything but NUL, CR, LF and space; a middle parameter can't start with a colon
+    # other whitespace is left out too, since both parsers strip it from the ends of the line
+    while True:
+        word = bytes(rng.choice(range(1, 256)) for _ in range(rng.randint(1, 12)))
+        word = word.translate(None, b"\0\r\n \t\x0b\x0c")
+        if word and (first_colon or not word.startswith(b":")):
+            return word
+
+def random_line(rng):
+    parts = []
+    if rng.random() < 0.7:
+        parts.append(b":" + random_word(rng))
+    parts.append(rng.choice(COMMANDS))
+    for _ in range(rng.randint(1 if rng.random() < 0.5 else 0, 6)):
+        parts.append(random_word(rng))
+    if rng.random() < 0.6 or len(parts) < 2 + (parts[0][:1] == b":"):
+        trailing = b" ".join(random_word(rng, True) for _ in range(rng.randint(0, 5)))
+        parts.append(b":" + trailing)
+    line = b" ".join(parts)
+    return line + rng.choice([b"", b"\r", b"\r\n"])
+
+def fuzz(rng, count):
+    failures = 0
+    for _ in range(count):
+        line = random_line(rng)
+        expected = legacy_parse(line)
+        got = parse_raw_irc_command(line)
+        if got != expected:
+            failures += 1
+            if failures <= 10:
+                print("MISMATCH {0!r}:\n  legacy {1!r}\n  new    {2!r}".format(line, expected, got))
+    return failures
+
+def check_tags():
+    msg = parse_message(b"@time=2017-01-01T00:00:00.000Z;account=foo;+x=a\\sb\\:c\\\\ :nick!id@host PRIVMSG #chan :hi there\r\n")
+    assert msg.tags == {"time": "2017-01-01T00:00:00.000Z", "account": "foo", "+x": "a b;c\\"}, msg.tags
+    assert (msg.source, msg.command, msg.params) == ("nick!id@host", "privmsg", ["#chan", "hi there"])
+    msg = parse_message(b":srv   005  nick  A=1 B :are supported")
+    assert msg.params == ["nick", "A=1", "B", "are supported"], msg.params
+    assert msg.command == "featurelist"
+    msg = parse_message(b":n!i@h PRIVMSG #c :caf\xe9")
+    assert msg.params == ["#c", "caf\xe9"] and msg.encoding == "latin_1"
+    assert parse_message(b"PING").params == []
+
+def generate_corpus(rng, count):
+    nicks = ["user{0:03}".format(i).encode() for i in range(300)]
+    words = [b"!lynch", b"!vote", b"!join", b"hello", b"wolf", b"is", b"it", b"me?", b"lol",
+             b"\xc3\xa9t\xc3\xa9", b"no", b"the", b"seer", b"said", b"!stats", b"kill"]
+    lines = []
+    for _ in range(count):
+        nick = rng.choice(nicks)
+        source = b":" + nick + b"!~" + nick + b"@user/" + nick
+        roll = rng.random()
+        if roll < 0.7:
+            text = b" ".join(rng.choice(words) for _ in range(rng.randint(1, 14)))
+            lines.append(source + b" PRIVMSG #werewolf :" + text)
+        elif roll < 0.8:
+            lines.append(source + b" JOIN #werewolf " + nick + b" :realname")
+        elif roll < 0.85:
+            lines.append(source + b" PART #werewolf :bye")
+        elif roll < 0.9:
+            lines.append(source + b" QUIT :Quit: leaving")
+        elif roll < 0.95:
+            lines.append(b":irc.server 354 bot ~" + nick + b" user/" + nick + b" irc.server " + nick + b" H " + nick)
+        else:
+            lines.append(b":ChanServ!ChanServ@services. MODE #werewolf +v-v " + nick + b" " + rng.choice(nicks))
+    return [line + b"\r" for line in lines]
+
+def bench(name, func, corpus, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in corpus:
+            func(line)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print("{0:<40} {1:8.0f} ns/line".format(name, best / len(corpus) * 1e9))
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz test and benchmark the IRC line parser.")
+    parser.add_argument("--seed", default="0")
+    parser.add_argument("--fuzz", type=int, default=100000, help="number of random lines to compare")
+    parser.add_argument("--corpus", help="file of raw lines to time the parsers on")
+    parser.add_argument("--lines", type=int, default=100000, help="size of the generated corpus")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    check_tags()
+    failures = fuzz(rng, args.fuzz)
+    print("fuzz: {0} lines, {1} mismatches".format(args.fuzz, failures))
+
+    if args.corpus:
+        with open(args.corpus, "rb") as f:
+            corpus = [line for line in f.read().split(b"\n") if line.strip()]
+    else:
+        corpus = generate_corpus(rng, args.lines)
+    tagged = [b"@time=2017-01-01T00:00:00.000Z;account=acc " + line for line in corpus]
+
+    legacy = bench("legacy parser", legacy_parse, corpus)
+    new = bench("parse_raw_irc_command", parse_raw_irc_command, corpus)
+    bench("parse_message", parse_message, corpus)
+    bench("parse_message, decoding params", lambda line: parse_message(line).params, corpus)
+    bench("parse_message, tagged lines", parse_message, tagged)
+    print("speedup over the legacy parser: {0:.2f}x".format(legacy / new))
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
+
+# vim: set sw=4 expandtab:
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+
+# Headless game simulator and throughput benchmark
+#
+# Plays complete games in every registered game mode without connecting to
+# a server: the bot is fed the same parsed lines oyoyo would hand to the
+# handler, and a stub client records what would have been sent back.
+# Players are bots that pick their actions at random, from a seed, so two
+# runs with the same seed play exactly the same games.
+#
+# Usage: tools/simulate.py [--seed SEED] [--games N] [--mode MODE ...] [--json]
+#        tools/simulate.py --save-outcomes FILE | --compare FILE [--games N] [--mode MODE ...]
+#
+# With --save-outcomes, the games of every seed in COMPARE_SEEDS are played
+# and who won each of them, and who survived, is written to FILE. Run it on
+# a baseline checkout, then run --compare with the same file on the change
+# to be checked: it plays the same games and lists those that ended
+# differently, exiting with status 1 if there are any.
+#
+# The bot runs in normal mode (only !fgame is enabled from the debug
+# commands), inside a temporary directory so that the database and the
+# logs of the real bot are left alone.
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import types
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NICK = "simbot"
+CHANNEL = "#sim"
+SERVER = "irc.sim"
+OPERATOR = "simop"
+POOL_SIZE = 30 # how many users are in the channel; games take as many as they need
+MAX_PHASES = 60 # games still running after this many days and nights are stopped
+
+# actions that never move the game forward, so the players don't bother with them
+PASSIVE_COMMANDS = {"pass", "retract"}
+
+ERROR_MESSAGE = b":An error has occurred and has been logged."
+
+# arguments to !fgame; the roles mode has no roles at all unless it is told some
+MODE_ARGS = {
+    "roles": "wolf:1,seer:1,harlot:1,gunner:1", # fits the 4 players it needs at least
+}
+
+# seeds played by --save-outcomes and --compare
+COMPARE_SEEDS = ("1", "2", "3", "4")
+
+CONFIG = {
+    "HOST": "localhost",
+    "PORT": 6667,
+    "USE_SSL": False,
+    "NICK": NICK,
+    "IDENT": NICK,
+    "REALNAME": NICK,
+    "USERNAME": "",
+    "PASS": "",
+    "SASL_AUTHENTICATION": False,
+    "CHANNEL": CHANNEL,
+    "CMD_CHAR": "!",
+    "SERVER_PASS": "",
+    "OWNERS": (),
+    "OWNERS_ACCOUNTS": (OPERATOR,),
+    "ALLOWED_NORMAL_MODE_COMMANDS": ["fgame"],
+    "OWNERS_ONLY_COMMANDS": [],
+    "ALT_CHANNELS": "",
+    "ALLOWED_ALT_CHANNELS_COMMANDS": [],
+    "DEV_CHANNEL": "",
+    "PASTEBIN_ERRORS": False,
+    "LOG_CHANNEL": "",
+    "IGNORE_HIDDEN_COMMANDS": True,
+    "ALLOW_NOTICE_COMMANDS": False,
+    "ALLOW_PRIVATE_NOTICE_COMMANDS": True,
+    "CHANGING_HOST_QUIT_MESSAGE": "Changing host",
+    "USE_UTC": True,
+    "TIMESTAMP_FORMAT": "[%Y-%m-%d %H:%M:%S{tzoffset}]",
+    "DEBUG_MODE": False,
+    "VERBOSE_MODE": False,
+}
+
+ISUPPORT = ("CHANTYPES=#", "PREFIX=(ov)@+", "CHANMODES=eIbq,k,flj,CFLMPQScgimnprstz",
+            "MODES=4", "STATUSMSG=@+", "CASEMAPPING=rfc1459",
+            "TARGMAX=NAMES:1,LIST:1,KICK:1,WHOIS:1,PRIVMSG:4,NOTICE:4,ACCEPT:,MONITOR:")
+
+def install_config(**overrides):
+    """Make the simulator settings importable as botconfig."""
+    botconfig = types.ModuleType("botconfig")
+    botconfig.__dict__.update(CONFIG)
+    botconfig.__dict__.update(overrides)
+    sys.modules["botconfig"] = botconfig
+
+def hostmask(nick):
+    return "{0}!~{0}@sim/{0}".format(nick)
+
+class Simulator:
+    def __init__(self):
+        # deferred until the config is in place, since importing src reads it
+        from src import logger
+
+        # the audit log and friends print to stdout, which would drown out the report
+        logger.utf8stdout = open(os.devnull, "w")
+
+        from oyoyo.client import IRCClient
+        from src import decorators, events, handler, timers
+        from src.utilities import get_role, list_players
+        import src.settings as var
+
+        class SimClient(IRCClient):
+            """Client that counts outgoing lines instead of sending them."""
+
+            def __init__(self):
+                super().__init__({}, nickname=NICK, ident=NICK, hostmask="sim/" + NICK,
+                                 stream_handler=lambda output, level=None: None)
+                self.lines = Counter()
+                self.bytes = 0
+                self.errors = 0
+
+            def send(self, *args, **kwargs):
+                encoding = kwargs.get("encoding") or "utf_8"
+                msg = b" ".join(arg.encode(encoding) if isinstance(arg, str) else arg
+                                for arg in args if arg is not None)
+                self.lines[msg.split(b" ", 1)[0].decode("ascii", "replace").upper()] += 1
+                self.bytes += len(msg) + 2
+                if msg.endswith(ERROR_MESSAGE):
+                    self.errors += 1
+
+        self.var = var
+        self.handler = handler
+        self.timers = timers
+        self.get_role = get_role
+        self.list_players = list_players
+        self.cli = SimClient()
+        self.pool = ["sim{0:02}".format(i) for i in range(1, POOL_SIZE + 1)]
+        self.transitions = defaultdict(list) # (old phase, new phase) -> [seconds]
+        self.night_cmds, self.day_cmds = self.role_commands(decorators.COMMANDS)
+        # the players draw from their own generator, so that a change in how often
+        # the bot itself calls random doesn't make them play differently
+        self.rng = random.Random()
+        self.outcome = None # (winner, survivors) of the game being played
+        events.add_listener("player_win", self.on_player_win, 10)
+
+    def on_player_win(self, evt, cli, var, nick, role, winner, survived):
+        if self.outcome is None:
+            self.outcome = (winner, [])
+        if survived:
+            self.outcome[1].append(nick)
+
+    @staticmethod
+    def role_commands(commands):
+        night = defaultdict(list)
+        day = defaultdict(list)
+        seen = set()
+        for fns in commands.values():
+            for fn in fns:
+                if fn in seen or not fn.roles or fn.name in PASSIVE_COMMANDS:
+                    continue
+                seen.add(fn)
+                for phase, table in (("night", night), ("day", day)):
+                    if phase not in fn.phases:
+                        continue
+                    for role in fn.roles:
+                        if fn.name not in table[role]:
+                            table[role].append(fn.name)
+        return night, day
+
+    def state(self):
+        var = self.var
+        return (var.PHASE, getattr(var, "DAY_COUNT", 0), getattr(var, "NIGHT_COUNT", 0))
+
+    def settle(self):
+        # timers are not simulated; the players (or the operator) always
+        # cause the phase changes that they would have caused
+        self.timers.cancel_all()
+
+    def feed(self, prefix, command, *args):
+        """Pass a line from the server to the bot."""
+        self.handler.unhandled(self.cli, prefix, command, *args)
+
+    def message(self, nick, target, msg):
+        before = self.state()
+        start = time.perf_counter()
+        self.handler.on_privmsg(self.cli, hostmask(nick), target, msg)
+        elapsed = time.perf_counter() - start
+        after = self.state()
+        if after != before:
+            self.transitions[(before[0], after[0])].append(elapsed)
+        self.settle()
+
+    def say(self, nick, msg):
+        self.message(nick, CHANNEL, msg)
+
+    def tell(self, nick, msg):
+        self.message(nick, NICK, msg)
+
+    def connect(self):
+        """Go through the same steps as after connecting to a server."""
+        self.handler.connect_callback(self.cli)
+        self.feed(SERVER, "featurelist", NICK, *ISUPPORT + ("are supported by this server",))
+        self.feed(SERVER, "endofmotd", NICK, "End of /MOTD command.")
+        self.feed(hostmask(NICK), "join", CHANNEL, "*", NICK)
+        self.feed(SERVER, "whospcrpl", NICK, "~" + NICK, "sim/" + NICK, SERVER, NICK, "H", "0")
+        for nick in [OPERATOR] + self.pool:
+            self.feed(SERVER, "whospcrpl", NICK, "~" + nick, "sim/" + nick, SERVER, nick, "H", nick)
+        self.feed(SERVER, "endofwho", NICK, CHANNEL, "End of /WHO list.")
+        self.feed("ChanServ!ChanServ@services.", "mode", CHANNEL, "+o", NICK)
+        self.feed(SERVER, "quietlistend", NICK, CHANNEL, "q", "End of Channel Quiet List")
+        self.feed(SERVER, "endofbanlist", NICK, CHANNEL, "End of Channel Ban List")
+
+    def targets(self, nick, count=2):
+        others = [p for p in self.list_players() if p != nick]
+        return self.rng.sample(others, min(count, len(others)))
+
+    def play(self, mode):
+        """Play one game of the given mode. Return the number of phases played,
+        or None if the game could not be started."""
+        var = self.var
+        minp, maxp = var.GAME_MODES[mode][1:3]
+        players = self.rng.sample(self.pool, self.rng.randint(minp, min(maxp, POOL_SIZE)))
+        self.outcome = None
+        for nick in players:
+            self.say(nick, "!join")
+        if mode in MODE_ARGS:
+            self.say(OPERATOR, "!fgame {0}={1}".format(mode, MODE_ARGS[mode]))
+        else:
+            self.say(OPERATOR, "!fgame " + mode)
+        if var.FGAMED:
+            self.say(OPERATOR, "!fstart")
+        if var.PHASE not in ("day", "night"):
+            if var.PHASE == "join":
+                self.say(OPERATOR, "!fstop")
+            return None
+
+        phases = 0
+        while var.PHASE in ("day", "night"):
+            if phases == MAX_PHASES:
+                self.say(OPERATOR, "!fstop")
+                break
+            phases += 1
+            if var.PHASE == "night":
+                self.play_night()
+            else:
+                self.play_day()
+        return phases
+
+    def play_night(self):
+        state = self.state()
+        for nick in self.list_players():
+            if nick not in self.list_players():
+                continue
+            for command in self.night_cmds.get(self.get_role(nick), ()):
+                self.tell(nick, " ".join([command] + self.targets(nick)))
+                if self.state() != state:
+                    return
+        # someone could not act, or has nothing to act on
+        self.say(OPERATOR, "!fday")
+
+    def play_day(self):
+        state = self.state()
+        var = self.var
+        for nick in self.list_players():
+            if nick not in self.list_players():
+                continue # shot earlier on
+            for command in self.day_cmds.get(self.get_role(nick), ()):
+                if self.rng.random() < 0.5:
+                    self.tell(nick, " ".join([command] + self.targets(nick, 1)))
+            if var.GUNNERS.get(nick) and self.rng.random() < 0.2:
+                self.say(nick, " ".join(["!shoot"] + self.targets(nick, 1)))
+            if self.state() != state:
+                return
+
+        # most of the village piles on one player, so that days usually end by a lynch
+        pl = self.list_players()
+        suspect = self.rng.choice(pl)
+        for nick in pl:
+            if nick not in self.list_players():
+                continue
+            votee = suspect if self.rng.random() < 0.75 else self.rng.choice(pl)
+            if votee != nick:
+                self.say(nick, "!lynch " + votee)
+            if self.state() != state:
+                return
+        self.say(OPERATOR, "!fnight")
+
+def run(sim, modes, games, seed):
+    results = {}
+    for mode in modes:
+        lines = sim.cli.lines.copy()
+        errors = sim.cli.errors
+        outcomes = []
+        played = 0
+        phases = 0
+        start = time.perf_counter()
+        for index in range(games):
+            # seed each game on its own, so that results don't depend on which modes are run
+            random.seed("{0}:{1}:{2}".format(seed, mode, index))
+            sim.rng.seed("{0}:{1}:{2}:players".format(seed, mode, index))
+            count = sim.play(mode)
+            if count is not None:
+                played += 1
+                phases += count
+            # games stopped after MAX_PHASES, or not started at all, have no winner
+            winner, survivors = sim.outcome or (None, [])
+            outcomes.append([winner, sorted(survivors)])
+        elapsed = time.perf_counter() - start
+        results[mode] = {
+            "games": played,
+            "skipped": games - played,
+            "phases": phases,
+            "seconds": elapsed,
+            "lines": dict(sim.cli.lines - lines),
+            "errors": sim.cli.errors - errors,
+            "outcomes": outcomes,
+        }
+    return results
+
+def compare(baseline, outcomes):
+    """Print the games whose outcome differs from the baseline. Return how many there are."""
+    differences = 0
+    for seed, modes in sorted(outcomes.items()):
+        for mode, games in sorted(modes.items()):
+            expected = baseline.get(seed, {}).get(mode)
+            if expected is None:
+                print("seed {0}, {1}: not in the baseline".format(seed, mode))
+                differences += 1
+                continue
+            for index, (old, new) in enumerate(zip(expected, games)):
+                if old != new:
+                    differences += 1
+                    print("seed {0}, {1} game {2}: {3} won, {4} survived; was {5} won, {6} survived".format(
+                        seed, mode, index, new[0], ", ".join(new[1]) or "nobody",
+                        old[0], ", ".join(old[1]) or "nobody"))
+            if len(expected) != len(games):
+                differences += 1
+                print("seed {0}, {1}: {2} games played, {3} in the baseline".format(
+                    seed, mode, len(games), len(expected)))
+    return differences
+
+def report(sim, results, elapsed):
+    print("{0:<16} {1:>6} {2:>7} {3:>9} {4:>11} {5:>7}".format(
+        "mode", "games", "phases", "games/s", "lines/game", "errors"))
+    for mode, res in results.items():
+        rate = res["games"] / res["seconds"] if res["seconds"] else 0
+        per_game = sum(res["lines"].values()) / res["games"] if res["games"] else 0
+        print("{0:<16} {1:>6} {2:>7} {3:>9.2f} {4:>11.1f} {5:>7}{6}".format(
+            mode, res["games"], res["phases"], rate, per_game, res["errors"],
+            "  ({0} skipped)".format(res["skipped"]) if res["skipped"] else ""))
+
+    print()
+    print("{0:<16} {1:>6} {2:>9} {3:>9}".format("transition", "count", "mean ms", "max ms"))
+    for (old, new), times in sorted(sim.transitions.items()):
+        print("{0:<16} {1:>6} {2:>9.3f} {3:>9.3f}".format(
+            "{0} -> {1}".format(old, new), len(times),
+            sum(times) / len(times) * 1000, max(times) * 1000))
+
+    print()
+    total = sum(res["games"] for res in results.values())
+    print("{0} games in {1:.2f}s ({2:.2f} games/s)".format(total, elapsed, total / elapsed if elapsed else 0))
+    print("sent {0} lines, {1} bytes: {2}".format(sum(sim.cli.lines.values()), sim.cli.bytes,
+          ", ".join("{0} {1}".format(cmd, num) for cmd, num in sim.cli.lines.most_common())))
+
+def main():
+    parser = argparse.ArgumentParser(description="Play simulated games and report how fast they ran.")
+    parser.add_argument("--seed", default="0", help="seed for the random players and the game itself")
+    parser.add_argument("--games", type=int, default=10, help="number of games to play in each mode")
+    parser.add_argument("--mode", action="append", dest="modes", metavar="MODE",
+                        help="game mode to play (may be given more than once; default: all of them)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--save-outcomes", metavar="FILE",
+                       help="play the seeds in COMPARE_SEEDS and save how every game ended to FILE")
+    group.add_argument("--compare", metavar="FILE",
+                       help="play the seeds in COMPARE_SEEDS and list the games that ended differently than in FILE")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    outcomes_file = args.save_outcomes and os.path.abspath(args.save_outcomes)
+
+    # sets are iterated all over the bot, so string hashing has to be fixed too;
+    # set literals are stored in the bytecode in the order of the hashing they
+    # were compiled with, so keep our own bytecode rather than what is lying around
+    if os.environ.get("PYTHONHASHSEED") != "0":
+        os.environ["PYTHONHASHSEED"] = "0"
+        os.environ["PYTHONPYCACHEPREFIX"] = os.path.join(tempfile.gettempdir(), "lykos-sim-pycache")
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    sys.path.insert(0, ROOT)
+    sys.argv = sys.argv[:1] # src parses the command line for --debug and friends
+    install_config()
+
+    with tempfile.TemporaryDirectory(prefix="lykos-sim-") as tmpdir:
+        os.chdir(tmpdir)
+        sim = Simulator()
+        var = sim.var
+        modes = args.modes or sorted(var.GAME_MODES.keys() - var.DISABLED_GAMEMODES)
+        for mode in modes:
+            if mode not in var.GAME_MODES:
+                parser.error("unknown game mode: " + mode)
+
+        random.seed(args.seed)
+        sim.connect()
+        if args.save_outcomes or args.compare:
+            outcomes = {}
+            for seed in COMPARE_SEEDS:
+                results = run(sim, modes, args.games, seed)
+                outcomes[seed] = {mode: res["outcomes"] for mode, res in results.items()}
+            os.chdir(ROOT)
+            if args.save_outcomes:
+                with open(outcomes_file, "w") as f:
+                    json.dump(outcomes, f, indent=2, sort_keys=True)
+                return
+            differences = compare(baseline, outcomes)
+            total = sum(len(games) for modes in outcomes.values() for games in modes.values())
+            print("{0} of {1} games ended differently".format(differences, total))
+            sys.exit(1 if differences else 0)
+
+        start = time.perf_counter()
+        results = run(sim, modes, args.games, args.seed)
+        elapsed = time.perf_counter() - start
+        os.chdir(ROOT)
+
+    if args.json:
+        print(json.dumps({
+            "seed": args.seed,
+            "seconds": elapsed,
+            "modes": results,
+            "transitions": {"{0} -> {1}".format(*k): v for k, v in sorted(sim.transitions.items())},
+            "lines": dict(sim.cli.lines),
+            "bytes": sim.cli.bytes,
+        }, indent=2, sort_keys=True))
+    else:
+        report(sim, results, elapsed)
+
+if __name__ == "__main__":
+    main()
+
+# vim: set sw=4 expandtab: